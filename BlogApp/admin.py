@@ -1,17 +1,20 @@
 from django.contrib import admin
-from .models import BlogPost, Comment, Like, SavedPost, ContactMessage, Category, Tag, AboutPage, ContactPage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import BlogPost, Comment, Like, SavedPost, ContactMessage, Category, Tag, AboutPage, ContactPage, Job
+from .search import search_posts
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'post_count', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'post_count', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
 
@@ -22,7 +25,7 @@ class BlogPostAdmin(admin.ModelAdmin):
     list_filter = ['is_published', 'is_featured', 'category', 'created_at']
     search_fields = ['title', 'content']
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ['created_at', 'updated_at', 'published_at', 'view_count']
+    readonly_fields = ['created_at', 'updated_at', 'published_at', 'view_count', 'like_count', 'comment_count', 'word_count', 'reading_time']
     filter_horizontal = ['tags']
     
     fieldsets = (
@@ -36,11 +39,15 @@ class BlogPostAdmin(admin.ModelAdmin):
             'fields': ('is_published', 'is_featured')
         }),
         ('Statistics', {
-            'fields': ('view_count', 'created_at', 'updated_at', 'published_at'),
+            'fields': ('view_count', 'like_count', 'comment_count', 'word_count', 'reading_time', 'created_at', 'updated_at', 'published_at'),
             'classes': ('collapse',)
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains over every post body
+        return search_posts(queryset, search_term), False
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -172,3 +179,38 @@ class ContactPageAdmin(admin.ModelAdmin):
             return redirect(reverse('admin:BlogApp_contactpage_change', args=[obj.pk]))
         return super().changelist_view(request, extra_context)
 
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'dedup_key', 'last_error']
+    readonly_fields = ['locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected failed jobs now')
+    def retry_now(self, request, queryset):
+        failed = queryset.filter(status=Job.FAILED)
+        selected = failed.count()
+        retry = {'status': Job.QUEUED, 'attempts': 0, 'run_at': timezone.now(), 'finished_at': None}
+        updated = failed.filter(dedup_key__isnull=True).update(**retry)
+
+        # At most one job per dedup key may wait: keys that already have one are
+        # left alone, as jobs.enqueue() merges them, and the newest failure wins
+        waiting = Job.objects.filter(status=Job.QUEUED, dedup_key__isnull=False).values('dedup_key')
+        latest = {}
+        keyed = failed.filter(dedup_key__isnull=False).exclude(dedup_key__in=waiting)
+        for pk, key in keyed.values_list('pk', 'dedup_key'):
+            latest[key] = max(pk, latest.get(key, pk))
+        for pk in latest.values():
+            try:
+                with transaction.atomic():
+                    updated += Job.objects.filter(pk=pk, status=Job.FAILED).update(**retry)
+            except IntegrityError:
+                # The same work was queued meanwhile
+                pass
+
+        message = f'{updated} jobs queued again.'
+        if selected > updated:
+            message += f' {selected - updated} skipped: the same work is already queued.'
+        self.message_user(request, message)
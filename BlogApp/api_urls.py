@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .api_views import (
     BlogPostViewSet, CommentViewSet,
-    categories_list, tags_list, stats, contact, dashboard_stats,
+    categories_list, tags_list, stats, contact, dashboard_stats, dashboard_timeseries, dashboard_compression,
     login_view, logout_view, current_user, get_csrf_token
 )
 
@@ -17,6 +17,8 @@ urlpatterns = [
     path('stats/', stats, name='api-stats'),
     path('contact/', contact, name='api-contact'),
     path('dashboard/stats/', dashboard_stats, name='api-dashboard-stats'),
+    path('dashboard/timeseries/', dashboard_timeseries, name='api-dashboard-timeseries'),
+    path('dashboard/compression/', dashboard_compression, name='api-dashboard-compression'),
     # Authentication endpoints
     path('auth/csrf/', get_csrf_token, name='api-csrf'),
     path('auth/login/', login_view, name='api-login'),
@@ -2,8 +2,9 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q, Count, Sum
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
@@ -13,10 +14,19 @@ from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 from django.middleware.csrf import get_token
 from django.utils.decorators import method_decorator
 
+from . import conditional, likes
+from .compression import compression_stats
 from .models import BlogPost, Comment, Like, SavedPost, Category, Tag, ContactMessage
+from .pagination import InvalidCursor, paginate_keyset
+from .related import RELATED_POSTS_STORED, related_posts
+from .search import search_posts
+from .stats import get_site_stats
+from .timeseries import TimeSeriesError, monthly_post_stats, parse_range, time_series
+from .views import COMMENTS_PAGE_SIZE
+from .visitors import ensure_visitor_id, get_visitor_id, should_count_view
 from .serializers import (
     BlogPostListSerializer, BlogPostDetailSerializer,
-    CommentSerializer, CommentCreateSerializer,
+    CommentSerializer, CommentListSerializer, CommentCreateSerializer,
     LikeSerializer, SavedPostSerializer,
     CategorySerializer, TagSerializer, ContactMessageSerializer
 )
@@ -28,6 +38,93 @@ class BlogPostPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class BlogPostCursorPagination(BasePagination):
+    """Keyset pagination for /api/posts/, no COUNT query"""
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.page = paginate_keyset(
+                queryset,
+                request.query_params.get(self.cursor_query_param),
+                self.get_page_size(request),
+            )
+        except InvalidCursor as exc:
+            raise NotFound(str(exc))
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CommentCursorPagination(BlogPostCursorPagination):
+    """Keyset pagination for the comments of one post, newest first"""
+    # The detail page renders the first page and hands its cursor to this API
+    page_size = COMMENTS_PAGE_SIZE
+
+
+# Serializer fields computed from model columns
+COMPUTED_FIELD_COLUMNS = {
+    'cover_image_srcset': ('cover_image', 'cover_image_variants'),
+    'cover_image_placeholder': ('cover_image', 'cover_image_variants'),
+}
+
+
+def narrow_post_queryset(queryset, fields):
+    """
+    Load only the columns and relations needed to serialize ``fields``.
+
+    The body is deferred unless ``content`` is requested; the stored
+    ``excerpt`` stands in for it in compact listings.
+    """
+    concrete = {field.name for field in BlogPost._meta.concrete_fields}
+    # Keys used for lookups, ordering and cursors are always loaded
+    load = {'id', 'slug', 'created_at'} | (set(fields) & concrete)
+    for name, columns in COMPUTED_FIELD_COLUMNS.items():
+        if name in fields:
+            load.update(columns)
+
+    queryset = queryset.select_related(None).prefetch_related(None)
+    related = [name for name in ('author', 'category') if name in fields]
+    if related:
+        queryset = queryset.select_related(*related)
+    if 'tags' in fields:
+        queryset = queryset.prefetch_related('tags')
+    return queryset.only(*load)
+
+
 class BlogPostViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing blog posts
@@ -40,6 +137,17 @@ class BlogPostViewSet(viewsets.ReadOnlyModelViewSet):
     lookup_field = 'slug'
     lookup_url_kwarg = 'slug'
 
+    @property
+    def paginator(self):
+        # Cursor pagination is opt-in: ?cursor=... or ?pagination=cursor
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if 'cursor' in params or params.get('pagination') == 'cursor':
+                self._paginator = BlogPostCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return BlogPostDetailSerializer
@@ -51,11 +159,7 @@ class BlogPostViewSet(viewsets.ReadOnlyModelViewSet):
         # Search
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(content__icontains=search) |
-                Q(tags__name__icontains=search)
-            ).distinct()
+            queryset = search_posts(queryset, search)
 
         # Filter by category
         category = self.request.query_params.get('category', None)
@@ -83,37 +187,90 @@ class BlogPostViewSet(viewsets.ReadOnlyModelViewSet):
         if featured == 'true':
             queryset = queryset.filter(is_featured=True)
 
+        # Sparse fieldsets: ?fields=title,slug or ?exclude=tags
+        if self.action == 'list':
+            fields = BlogPostListSerializer.selected_fields(self.request.query_params)
+            queryset = narrow_post_queryset(queryset, fields)
+
         return queryset
 
+    def _variant(self, request):
+        # Anything besides the data that changes the response body
+        return request.get_full_path(), request.accepted_media_type
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = conditional.post_list_validators(queryset, *self._variant(request))
+        not_modified = conditional.not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = super().list(request, *args, **kwargs)
+        return conditional.add_validators(response, etag, last_modified)
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        # Increment view count
-        if not (request.user.is_authenticated and request.user.is_staff):
+        visitor_id = get_visitor_id(request)
+        user_liked = bool(visitor_id) and Like.objects.filter(post=instance, session_id=visitor_id).exists()
+        user_saved = request.user.is_authenticated and SavedPost.objects.filter(
+            user=request.user, post=instance
+        ).exists()
+        # Validators come from the state before this view is counted
+        etag, last_modified = conditional.post_validators(
+            instance, user_liked, user_saved, *self._variant(request)
+        )
+
+        # Increment view count (a revalidated read is still a read, but each visitor counts once per window)
+        if not (request.user.is_authenticated and request.user.is_staff) and should_count_view(request, instance.pk):
             instance.increment_views()
-        
+
+        not_modified = conditional.not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
         serializer = self.get_serializer(instance, context={'request': request})
-        return Response(serializer.data)
+        return conditional.add_validators(Response(serializer.data), etag, last_modified)
 
-    @action(detail=True, methods=['post'], permission_classes=[AllowAny])
-    def like(self, request, slug=None):
-        """Like or unlike a post"""
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def related(self, request, slug=None):
+        """Precomputed related posts, best match first"""
         post = self.get_object()
+        posts = narrow_post_queryset(
+            related_posts(post, limit=RELATED_POSTS_STORED),
+            BlogPostListSerializer.selected_fields(request.query_params),
+        )
+        serializer = BlogPostListSerializer(posts, many=True, context={'request': request})
+        return Response(serializer.data)
 
-        if not request.session.session_key:
-            request.session.create()
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def comments(self, request, slug=None):
+        """Comments on a post, newest first, one cursor page at a time (staff also see pending ones)"""
+        post = get_object_or_404(BlogPost.objects.only('pk'), slug=slug, is_published=True)
+        comments = Comment.objects.filter(post=post)
+        if not (request.user.is_authenticated and request.user.is_staff):
+            comments = comments.filter(is_approved=True)
+        paginator = CommentCursorPagination()
+        page = paginator.paginate_queryset(comments, request, view=self)
+        serializer = CommentListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
-        session_id = request.session.session_key
-        like, created = Like.objects.get_or_create(post=post, session_id=session_id)
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[AllowAny])
+    def like(self, request, slug=None):
+        """PUT likes, DELETE unlikes (both idempotent), POST toggles"""
+        post = self.get_object()
 
-        if not created:
-            like.delete()
+        visitor_id = ensure_visitor_id(request)
+        if request.method == 'PUT':
+            _, like_count = likes.like(post.pk, visitor_id)
+            liked = True
+        elif request.method == 'DELETE':
+            _, like_count = likes.unlike(post.pk, visitor_id)
             liked = False
         else:
-            liked = True
+            liked, like_count = likes.toggle(post.pk, visitor_id)
 
         return Response({
             'liked': liked,
-            'like_count': post.get_like_count()
+            'like_count': like_count
         })
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
@@ -148,9 +305,10 @@ class CommentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = self.queryset
-        post_id = self.request.query_params.get('post', None)
-        if post_id:
-            queryset = queryset.filter(post_id=post_id)
+        # ?post= takes a post id or slug
+        post = self.request.query_params.get('post', None)
+        if post:
+            queryset = queryset.filter(post_id=post) if post.isdigit() else queryset.filter(post__slug=post)
         return queryset
 
     def create(self, request, *args, **kwargs):
@@ -167,40 +325,41 @@ class CommentViewSet(viewsets.ModelViewSet):
 @permission_classes([AllowAny])
 def categories_list(request):
     """Get all categories with post counts"""
-    categories = Category.objects.annotate(
-        post_count=Count('posts', filter=Q(posts__is_published=True))
-    ).filter(post_count__gt=0)
+    etag, last_modified = conditional.taxonomy_validators('categories', request.accepted_media_type)
+    not_modified = conditional.not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    categories = Category.objects.filter(post_count__gt=0)
     serializer = CategorySerializer(categories, many=True)
-    return Response(serializer.data)
+    return conditional.add_validators(Response(serializer.data), etag, last_modified)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def tags_list(request):
     """Get all tags with post counts"""
-    tags = Tag.objects.annotate(
-        post_count=Count('posts', filter=Q(posts__is_published=True))
-    ).filter(post_count__gt=0).order_by('-post_count')[:20]
+    etag, last_modified = conditional.taxonomy_validators('tags', request.accepted_media_type)
+    not_modified = conditional.not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    tags = Tag.objects.filter(post_count__gt=0).order_by('-post_count')[:20]
     serializer = TagSerializer(tags, many=True)
-    return Response(serializer.data)
+    return conditional.add_validators(Response(serializer.data), etag, last_modified)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def stats(request):
     """Get blog statistics"""
-    total_posts = BlogPost.objects.filter(is_published=True).count()
-    total_views = BlogPost.objects.filter(is_published=True).aggregate(
-        Sum('view_count')
-    )['view_count__sum'] or 0
-    total_likes = Like.objects.count()
-    total_comments = Comment.objects.filter(is_approved=True).count()
+    site_stats = get_site_stats()
 
     return Response({
-        'total_posts': total_posts,
-        'total_views': total_views,
-        'total_likes': total_likes,
-        'total_comments': total_comments,
+        'total_posts': site_stats['published_posts'],
+        'total_views': site_stats['total_views'],
+        'total_likes': site_stats['total_likes'],
+        'total_comments': site_stats['approved_comments'],
     })
 
 
@@ -303,43 +462,58 @@ def current_user(request):
 @permission_classes([IsAdminUser])
 def dashboard_stats(request):
     """Get dashboard statistics for admin"""
-    total_posts = BlogPost.objects.count()
-    published_posts = BlogPost.objects.filter(is_published=True).count()
-    draft_posts = BlogPost.objects.filter(is_published=False).count()
-    total_views = BlogPost.objects.filter(is_published=True).aggregate(
-        Sum('view_count')
-    )['view_count__sum'] or 0
-    total_likes = Like.objects.count()
-    total_comments = Comment.objects.count()
+    site_stats = get_site_stats()
 
     # Monthly stats
-    now = timezone.now()
-    monthly_stats = []
-    for i in range(6):
-        month_start = now.replace(day=1) - timedelta(days=30 * i)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        month_posts = BlogPost.objects.filter(
-            created_at__gte=month_start,
-            created_at__lte=month_end
-        ).count()
-        monthly_stats.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': month_posts
-        })
-    monthly_stats.reverse()
+    monthly_stats = monthly_post_stats()
 
     return Response({
-        'total_posts': total_posts,
-        'published_posts': published_posts,
-        'draft_posts': draft_posts,
-        'total_views': total_views,
-        'total_likes': total_likes,
-        'total_comments': total_comments,
+        'total_posts': site_stats['total_posts'],
+        'published_posts': site_stats['published_posts'],
+        'draft_posts': site_stats['draft_posts'],
+        'total_views': site_stats['total_views'],
+        'total_likes': site_stats['total_likes'],
+        'total_comments': site_stats['total_comments'],
         'monthly_stats': monthly_stats,
         'posts_by_status': {
-            'published': published_posts,
-            'drafts': draft_posts,
-            'featured': BlogPost.objects.filter(is_featured=True).count(),
+            'published': site_stats['published_posts'],
+            'drafts': site_stats['draft_posts'],
+            'featured': site_stats['featured_posts'],
         }
     })
 
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def dashboard_timeseries(request):
+    """
+    Counts per day/week/month for the dashboard charts.
+
+    Query params: metric=posts|comments|likes, bucket=day|week|month,
+    from=YYYY-MM-DD, to=YYYY-MM-DD (inclusive).
+    """
+    metric = request.query_params.get('metric', 'posts')
+    bucket = request.query_params.get('bucket', 'month')
+    try:
+        start, end = parse_range(
+            request.query_params.get('from'), request.query_params.get('to'), bucket
+        )
+        series = time_series(metric, bucket, start, end)
+    except TimeSeriesError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'metric': metric,
+        'bucket': bucket,
+        'from': start.date().isoformat(),
+        'to': (end - timedelta(microseconds=1)).date().isoformat(),
+        'results': series,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def dashboard_compression(request):
+    """Compression ratio and CPU time per endpoint for this worker process"""
+    return Response({'results': compression_stats()})
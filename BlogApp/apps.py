@@ -6,4 +6,7 @@ class BlogappConfig(AppConfig):
     name = 'BlogApp'
     verbose_name = 'Blog App'
 
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
+
 
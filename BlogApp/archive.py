@@ -0,0 +1,567 @@
+"""
+Bulk import and export of posts.
+
+``manage.py export_posts`` streams posts out as JSON Lines (one object per
+post) or as a directory of Markdown files with front matter, and
+``manage.py import_posts`` reads either back. Both formats carry the same
+fields (``FIELDS`` plus ``content``); front matter values are written as
+JSON, which is also valid YAML, and read back without a YAML library::
+
+    ---
+    slug: "hello-world"
+    title: "Hello, world"
+    tags: ["django", "python"]
+    is_published: true
+    ---
+
+    Body in Markdown or HTML.
+
+The import never calls ``BlogPost.save()``. Records are read lazily and
+handled ``batch_size`` at a time: authors, categories and tags are looked up
+(and missing categories and tags created) with one query each per batch,
+slugs are resolved against the posts already stored with at most two
+queries, and new and changed posts are written with ``bulk_create`` and
+``bulk_update``. Memory stays bounded by the batch size, the taxonomy and
+one id per imported post.
+
+Re-running an import is a no-op. A record with a ``slug`` is the post with
+that slug: it is created, left alone if nothing differs, or updated. A
+record without one takes the first of ``slugify(title)``, ``<slug>-1``, ...
+that is either free or already holds the same title and body (compared by
+``content_hash``), like ``BlogPost.save()`` picks slugs.
+
+Bulk writes skip model signals, so the import does their work afterwards in
+bulk: search index entries per batch, then taxonomy post counts, the
+related posts of the imported posts (a batch at a time), site statistics
+and the page cache once at the end. Cover images are
+neither exported nor imported.
+"""
+import json
+from dataclasses import dataclass, field
+from functools import reduce
+from itertools import islice
+from operator import or_
+from pathlib import Path
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+
+# Exported in this order, before the body
+FIELDS = ('slug', 'title', 'author', 'category', 'tags', 'is_published', 'is_featured', 'created_at', 'published_at')
+
+FRONT_MATTER = '---'
+
+# Errors kept on the result; later ones are only counted
+MAX_ERRORS = 100
+
+_CONTENT_FIELDS = ('content', 'content_html', 'content_hash', 'excerpt', 'word_count', 'reading_time')
+_META_FIELDS = ('title', 'author', 'category', 'is_published', 'is_featured', 'published_at', 'updated_at')
+
+
+class RecordError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def fail(self, location, error):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'{location}: {error}')
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# Export
+
+def export_records(queryset=None, batch_size=500):
+    """Yield every post of ``queryset`` as a record dict, ``batch_size`` rows at a time"""
+    if queryset is None:
+        from .models import BlogPost
+
+        queryset = BlogPost.objects.all()
+    posts = (
+        queryset.select_related('author', 'category')
+        .prefetch_related('tags')
+        .defer('content_html', 'excerpt', 'cover_image_variants')
+        .order_by('pk')
+    )
+    for post in posts.iterator(chunk_size=batch_size):
+        yield {
+            'slug': post.slug,
+            'title': post.title,
+            'author': post.author.username,
+            'category': post.category.name if post.category else None,
+            'tags': sorted(tag.name for tag in post.tags.all()),
+            'is_published': post.is_published,
+            'is_featured': post.is_featured,
+            'created_at': post.created_at.isoformat(),
+            'published_at': post.published_at.isoformat() if post.published_at else None,
+            'content': post.content,
+        }
+
+
+def write_jsonl(records, stream):
+    """Write records to a text stream, one JSON object per line; returns the count"""
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def to_markdown(record):
+    lines = [FRONT_MATTER]
+    lines += [f'{name}: {json.dumps(record.get(name), ensure_ascii=False)}' for name in FIELDS]
+    lines += [FRONT_MATTER, '', record.get('content') or '']
+    return '\n'.join(lines)
+
+
+def write_markdown(records, directory):
+    """Write each record to ``<slug>.md`` in ``directory``; returns the count"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for record in records:
+        (directory / f"{record['slug']}.md").write_text(to_markdown(record), encoding='utf-8')
+        count += 1
+    return count
+
+
+# Reading
+
+def read_jsonl(stream, name='-'):
+    """Yield ``(location, record)`` per non-blank line; bad lines yield the error instead"""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield f'{name}:{number}', json.loads(line)
+        except ValueError as exc:
+            yield f'{name}:{number}', RecordError(f'Invalid JSON: {exc}')
+
+
+def _front_matter_value(text):
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    # Hand-written YAML: bare strings and flow lists such as [django, python]
+    if text.startswith('[') and text.endswith(']'):
+        return [item.strip().strip('\'"') for item in text[1:-1].split(',') if item.strip()]
+    return text.strip('\'"')
+
+
+def parse_markdown(text):
+    """Record from a Markdown document with ``---`` delimited front matter"""
+    lines = text.split('\n')
+    if not lines or lines[0].strip() != FRONT_MATTER:
+        raise RecordError('Missing front matter')
+    for end in range(1, len(lines)):
+        if lines[end].strip() == FRONT_MATTER:
+            break
+    else:
+        raise RecordError('Unterminated front matter')
+
+    record = {}
+    for line in lines[1:end]:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        name, separator, value = line.partition(':')
+        if not separator:
+            raise RecordError(f'Invalid front matter line {line!r}')
+        record[name.strip()] = _front_matter_value(value)
+    body = lines[end + 1:]
+    if body and not body[0].strip():
+        body = body[1:]
+    record['content'] = '\n'.join(body)
+    return record
+
+
+def read_markdown(path):
+    """Yield ``(location, record)`` for a Markdown file or every ``*.md`` file under a directory"""
+    path = Path(path)
+    files = sorted(path.rglob('*.md')) if path.is_dir() else [path]
+    for file in files:
+        try:
+            yield str(file), parse_markdown(file.read_text(encoding='utf-8'))
+        except (OSError, UnicodeDecodeError, RecordError) as exc:
+            yield str(file), RecordError(str(exc))
+
+
+# Import
+
+def _datetime(record, name):
+    value = record.get(name)
+    if value in (None, ''):
+        return None
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise RecordError(f'Invalid {name} {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _bool(record, name):
+    value = record.get(name, False)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered not in ('true', 'false', 'yes', 'no', '1', '0', ''):
+            raise RecordError(f'Invalid {name} {value!r}')
+        return lowered in ('true', 'yes', '1')
+    return bool(value)
+
+
+def _names(value, what, max_length):
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise RecordError(f'{what} must be a list of names')
+    names = []
+    for name in value:
+        name = str(name).strip()
+        if len(name) > max_length:
+            raise RecordError(f'{what} name {name[:20]!r}... is longer than {max_length} characters')
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def free_slug(base, taken, max_length):
+    """First of ``base``, ``base-1``, ... not in ``taken``, shortened to ``max_length``"""
+    slug, counter = base[:max_length], 1
+    while slug in taken:
+        suffix = f'-{counter}'
+        slug = base[:max_length - len(suffix)] + suffix
+        counter += 1
+    return slug
+
+
+class _Importer:
+    """State shared across batches: author, category and tag ids by name"""
+
+    def __init__(self, default_author, result):
+        from django.contrib.auth.models import User
+        from .models import BlogPost, Category, Tag
+
+        self.post_model, self.category_model, self.tag_model = BlogPost, Category, Tag
+        self.user_model = User
+        self.default_author = default_author
+        self.result = result
+        self.authors, self.categories, self.tags = {}, {}, {}
+        self.slug_length = BlogPost._meta.get_field('slug').max_length
+        self.title_length = BlogPost._meta.get_field('title').max_length
+
+    def clean(self, raw):
+        """Validated fields of one record"""
+        if isinstance(raw, Exception):
+            raise raw
+        if not isinstance(raw, dict):
+            raise RecordError('Record is not an object')
+        title = str(raw.get('title') or '').strip()
+        if not title:
+            raise RecordError('Missing title')
+        if len(title) > self.title_length:
+            raise RecordError(f'Title is longer than {self.title_length} characters')
+        slug = str(raw.get('slug') or '').strip()
+        if slug and (slug != slugify(slug) or len(slug) > self.slug_length):
+            raise RecordError(f'Invalid slug {slug!r}')
+        author = str(raw.get('author') or self.default_author or '').strip()
+        if not author:
+            raise RecordError('Missing author and no default author given')
+        category = raw.get('category')
+        if isinstance(category, str):
+            category = [category]
+        category = _names(category, 'Category', self.category_model._meta.get_field('name').max_length)
+        if len(category) > 1:
+            raise RecordError('A post has one category')
+        return {
+            'title': title,
+            'slug': slug,
+            'author': author,
+            'category': category[0] if category else None,
+            'tags': _names(raw.get('tags'), 'Tag', self.tag_model._meta.get_field('name').max_length),
+            'content': str(raw.get('content') or ''),
+            'is_published': _bool(raw, 'is_published'),
+            'is_featured': _bool(raw, 'is_featured'),
+            'created_at': _datetime(raw, 'created_at'),
+            'published_at': _datetime(raw, 'published_at'),
+        }
+
+    def _resolve_authors(self, usernames):
+        missing = set(usernames) - self.authors.keys()
+        if missing:
+            self.authors.update(self.user_model.objects.filter(username__in=missing).values_list('username', 'pk'))
+
+    def _resolve_taxonomy(self, model, known, names):
+        """Fill ``known`` with ids for ``names``, creating the missing rows"""
+        missing = set(names) - known.keys()
+        if not missing:
+            return
+        known.update(model.objects.filter(name__in=missing).values_list('name', 'pk'))
+        missing -= known.keys()
+        if not missing:
+            return
+        slug_length = model._meta.get_field('slug').max_length
+        bases = {name: slugify(name)[:slug_length] or model._meta.model_name for name in missing}
+        taken = set(model.objects.filter(
+            reduce(or_, (Q(slug=base) | Q(slug__startswith=f'{base}-') for base in set(bases.values())))
+        ).values_list('slug', flat=True))
+        rows = []
+        for name in sorted(missing):
+            slug = free_slug(bases[name], taken, slug_length)
+            taken.add(slug)
+            rows.append(model(name=name, slug=slug))
+        model.objects.bulk_create(rows)
+        known.update(model.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    def _existing(self, records):
+        """Stored posts that records may be, keyed on slug"""
+        fields = ('pk', 'slug', 'title', 'content_hash', 'author_id', 'category_id',
+                  'is_published', 'is_featured', 'created_at', 'published_at')
+        posts = self.post_model.objects
+        bases = {record['slug'] or record['base'] for record in records}
+        existing = {row['slug']: row for row in posts.filter(slug__in=bases).values(*fields)}
+        # Only titles that collide can have taken one of their numbered slugs
+        colliding = {record['base'] for record in records if not record['slug'] and record['base'] in existing}
+        for chunk in _batched(sorted(colliding), 100):
+            query = reduce(or_, (Q(slug__startswith=f'{base}-') for base in chunk))
+            existing.update((row['slug'], row) for row in posts.filter(query).values(*fields))
+
+        tags = {}
+        through = self.post_model.tags.through
+        rows = through.objects.filter(blogpost_id__in=[row['pk'] for row in existing.values()])
+        for post_id, tag_id in rows.values_list('blogpost_id', 'tag_id'):
+            tags.setdefault(post_id, set()).add(tag_id)
+        for row in existing.values():
+            row['tag_ids'] = tags.get(row['pk'], set())
+        return existing
+
+    def _assign_slug(self, record, existing, claimed):
+        """The stored post ``record`` is (or None) and its slug"""
+        if record['slug']:
+            if record['slug'] in claimed:
+                raise RecordError(f"Slug {record['slug']!r} appears twice in one batch")
+            return existing.get(record['slug']), record['slug']
+
+        base, counter = record['base'], 0
+        while True:
+            suffix = f'-{counter}' if counter else ''
+            slug = base[:self.slug_length - len(suffix)] + suffix
+            row = existing.get(slug)
+            if slug not in claimed:
+                if row is None:
+                    return None, slug
+                if row['content_hash'] == record['content_hash'] and row['title'] == record['title']:
+                    return row, slug
+            counter += 1
+
+    def _changes(self, record, row):
+        changed = [
+            name for name in ('title', 'author_id', 'category_id', 'is_published', 'is_featured')
+            if record[name] != row[name]
+        ]
+        if record['content_hash'] != row['content_hash']:
+            changed.append('content')
+        for name in ('created_at', 'published_at'):
+            if record[name] is not None and record[name] != row[name]:
+                changed.append(name)
+        if record['tag_ids'] != row['tag_ids']:
+            changed.append('tags')
+        return changed
+
+    def _render(self, post):
+        from .rendering import content_hash, render
+        from .summaries import summarize
+
+        post.content_html, post.content_hash = render(post.content), content_hash(post.content)
+        post.excerpt, post.word_count, post.reading_time = summarize(post.content_html)
+
+    def import_batch(self, batch):
+        """Write one batch of ``(location, raw)`` records; returns the ids of posts written"""
+        from .rendering import content_hash
+
+        records = []
+        for location, raw in batch:
+            try:
+                record = self.clean(raw)
+            except RecordError as exc:
+                self.result.fail(location, exc)
+                continue
+            record['location'] = location
+            record['base'] = slugify(record['title'])[:self.slug_length] or 'post'
+            record['content_hash'] = content_hash(record['content'])
+            records.append(record)
+        if not records:
+            return []
+
+        now = timezone.now()
+        with transaction.atomic():
+            self._resolve_authors({record['author'] for record in records})
+            self._resolve_taxonomy(self.category_model, self.categories, {r['category'] for r in records if r['category']})
+            self._resolve_taxonomy(self.tag_model, self.tags, {name for r in records for name in r['tags']})
+            existing = self._existing(records)
+
+            created, updated, tagged = [], [], {}
+            claimed = set()
+            for record in records:
+                try:
+                    record['author_id'] = self.authors.get(record['author'])
+                    if record['author_id'] is None:
+                        raise RecordError(f"Unknown author {record['author']!r}")
+                    row, slug = self._assign_slug(record, existing, claimed)
+                except RecordError as exc:
+                    self.result.fail(record['location'], exc)
+                    continue
+                claimed.add(slug)
+                record['category_id'] = self.categories.get(record['category'])
+                record['tag_ids'] = {self.tags[name] for name in record['tags']}
+
+                if row is None:
+                    published_at = record['published_at']
+                    if record['is_published'] and published_at is None:
+                        published_at = record['created_at'] or now
+                    post = self.post_model(
+                        slug=slug, title=record['title'], content=record['content'],
+                        author_id=record['author_id'], category_id=record['category_id'],
+                        is_published=record['is_published'], is_featured=record['is_featured'],
+                        published_at=published_at,
+                    )
+                    self._render(post)
+                    # auto_now_add overwrites it on insert, so it is restored afterwards
+                    post.imported_created_at = record['created_at'] or published_at or now
+                    created.append(post)
+                    tagged[slug] = record['tag_ids']
+                    continue
+
+                changed = self._changes(record, row)
+                if not changed:
+                    self.result.unchanged += 1
+                    continue
+                published_at = record['published_at'] or row['published_at']
+                if record['is_published'] and published_at is None:
+                    published_at = now
+                post = self.post_model(
+                    pk=row['pk'], slug=slug, title=record['title'], content=record['content'],
+                    author_id=record['author_id'], category_id=record['category_id'],
+                    is_published=record['is_published'], is_featured=record['is_featured'],
+                    published_at=published_at, created_at=record['created_at'] or row['created_at'],
+                    updated_at=now,
+                )
+                post.changed = changed
+                updated.append(post)
+                if 'tags' in changed:
+                    tagged[slug] = record['tag_ids']
+
+            ids = self._write(created, updated, tagged)
+        self.result.created += len(created)
+        self.result.updated += len(updated)
+        return ids
+
+    def _write(self, created, updated, tagged):
+        post_model = self.post_model
+        through = post_model.tags.through
+
+        post_model.objects.bulk_create(created)
+        if any(post.pk is None for post in created):
+            # Backends that cannot return ids from a bulk insert
+            ids = dict(post_model.objects.filter(slug__in=[post.slug for post in created]).values_list('slug', 'pk'))
+            for post in created:
+                post.pk = ids[post.slug]
+        for post in created:
+            post.created_at = post.imported_created_at
+        post_model.objects.bulk_update(created, ['created_at'])
+
+        post_model.objects.bulk_update(updated, list(_META_FIELDS) + ['created_at'])
+        rerendered = [post for post in updated if 'content' in post.changed]
+        for post in rerendered:
+            self._render(post)
+        post_model.objects.bulk_update(rerendered, list(_CONTENT_FIELDS))
+
+        ids = {post.slug: post.pk for post in created + updated}
+        through.objects.filter(blogpost_id__in=[ids[slug] for slug in tagged]).delete()
+        through.objects.bulk_create([
+            through(blogpost_id=ids[slug], tag_id=tag_id)
+            for slug, tag_ids in tagged.items()
+            for tag_id in tag_ids
+        ])
+        return list(ids.values())
+
+
+def _index(post_model, ids):
+    from . import search
+
+    search.index_posts(post_model.objects.filter(pk__in=ids).prefetch_related('tags').defer('content_html'))
+
+
+def _refresh_related(post_model, touched, batch_size):
+    """Re-score the imported posts and their neighbours, ``batch_size`` posts at a time"""
+    from . import related
+
+    for chunk in _batched(touched, batch_size):
+        posts = post_model.objects.filter(pk__in=chunk).only(
+            'pk', 'title', 'content', 'category_id', 'is_published'
+        ).prefetch_related('tags')
+        for post in posts:
+            related.update_post(post, post_model)
+
+
+def _refresh_derived(post_model, touched, batch_size, refresh_related, rebuild_related):
+    """Do in bulk what the skipped model signals would have done per post"""
+    from . import counters, page_cache, related, stats
+    from .models import RelatedPost
+
+    counters.recount_taxonomy()
+    if rebuild_related:
+        related.rebuild_all(post_model, batch_size=batch_size)
+    elif refresh_related:
+        _refresh_related(post_model, touched, batch_size)
+    stats.invalidate()
+
+    page_cache.invalidate('home', 'list', 'about')
+    for chunk in _batched(touched, 500):
+        slugs = set(post_model.objects.filter(pk__in=chunk).values_list('slug', flat=True))
+        slugs.update(RelatedPost.objects.filter(related__in=chunk).values_list('post__slug', flat=True))
+        page_cache.invalidate(*(f'post:{slug}' for slug in slugs))
+
+
+def import_posts(records, author=None, batch_size=500, refresh_related=True, rebuild_related=False,
+                 on_batch=None):
+    """
+    Create or update posts from ``(location, record)`` pairs; returns an ``ImportResult``.
+
+    ``author`` is the username for records that name none. ``on_batch`` is
+    called with the running result after each batch. Related posts of the
+    imported posts are refreshed unless ``refresh_related`` is false;
+    ``rebuild_related`` recomputes the whole table instead.
+    """
+    result = ImportResult()
+    importer = _Importer(author, result)
+    touched = []
+    for batch in _batched(records, batch_size):
+        ids = importer.import_batch(batch)
+        _index(importer.post_model, ids)
+        touched += ids
+        if on_batch:
+            on_batch(result)
+    if touched:
+        _refresh_derived(importer.post_model, touched, batch_size, refresh_related, rebuild_related)
+    return result
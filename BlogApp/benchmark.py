@@ -0,0 +1,544 @@
+"""
+End-to-end latency benchmark for every route.
+
+``manage.py benchmark`` creates a throwaway database (like the test runner
+does), seeds it with a realistic archive (thousands of posts, tags and
+comments, a million or more likes skewed towards popular posts) and drives
+every named route of ``BlogApp/urls.py`` and ``BlogApp/api_urls.py`` with
+Django test clients from a thread pool, through the full middleware stack.
+
+Every route needs a ``Scenario`` in ``SCENARIOS`` saying how to call it
+(method, which client, how to pick arguments); a route without one is
+reported as uncovered, so new routes cannot silently escape the benchmark.
+Arguments are chosen before the timer starts, so only the request itself is
+measured.
+
+Results are JSON (throughput and p50/p95/p99 latency per route) meant to be
+kept and diffed between commits; ``compare()`` flags routes whose latency
+grew past the configured thresholds relative to a baseline run.
+"""
+import json
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from itertools import islice
+from typing import Callable, Optional
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+
+# Default dataset; override on the command line
+DATASET = {
+    'posts': 3000,
+    'categories': 12,
+    'tags': 300,
+    'comments': 30000,
+    'likes': 1000000,
+}
+
+BENCH_PASSWORD = 'benchmark-password'
+
+_WORDS = (
+    'django python cache query index latency render template search tag category deploy '
+    'server database request response worker queue image static compress migrate model '
+    'signal counter replica cursor page feed token session cookie browser network'
+).split()
+
+
+@dataclass
+class Dataset:
+    """Ids and slugs of the seeded rows that scenarios pick arguments from"""
+    post_ids: list
+    post_slugs: list
+    category_slugs: list
+    tag_slugs: list
+    comment_ids: list
+    staff_username: str
+    sizes: dict = field(default_factory=dict)
+
+
+@dataclass
+class Scenario:
+    """How to call one named route"""
+    name: str
+    method: str = 'get'
+    # 'anon', 'staff', or a new client per request: 'fresh' or 'fresh-staff' (logged in)
+    client: str = 'anon'
+    prepare: Optional[Callable] = None  # (dataset, rng) -> {'kwargs', 'query', 'data'}
+
+
+# Seeding
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(_WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _body(rng):
+    paragraphs = [f'<p>{_sentence(rng, rng.randint(12, 40))}</p>' for _ in range(rng.randint(3, 12))]
+    if rng.random() < 0.3:
+        paragraphs.insert(1, '<h2>Example</h2><pre><code class="language-python">def handler(request):\n    return 42\n</code></pre>')
+    return '\n'.join(paragraphs)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def seed(sizes=None, seed_value=0, batch_size=5000, stdout=None):
+    """Fill an empty database with a synthetic archive; returns the sizes used"""
+    from . import counters, related, search, view_counter
+    from django.contrib.auth.models import User
+    from .models import BlogPost, Category, Comment, Like, Tag
+    from .rendering import content_hash, render
+    from .summaries import summarize
+
+    sizes = {**DATASET, **(sizes or {})}
+    rng = random.Random(seed_value)
+    log = stdout.write if stdout else (lambda message: None)
+
+    author = User.objects.create_user('bench-author', password=BENCH_PASSWORD, is_staff=True)
+    Category.objects.bulk_create(Category(name=f'Category {n}', slug=f'category-{n}') for n in range(sizes['categories']))
+    Tag.objects.bulk_create(Tag(name=f'tag-{n}', slug=f'tag-{n}') for n in range(sizes['tags']))
+    category_ids = list(Category.objects.values_list('pk', flat=True))
+    tag_ids = list(Tag.objects.values_list('pk', flat=True))
+
+    # Rendering is the slow part of saving a post, so reuse a pool of bodies
+    bodies = []
+    for _ in range(min(200, sizes['posts']) or 1):
+        content = _body(rng)
+        content_html = render(content)
+        excerpt, words, minutes = summarize(content_html)
+        bodies.append((content, content_html, content_hash(content), excerpt, words, minutes))
+
+    log(f"Seeding {sizes['posts']} posts...\n")
+    now = timezone.now()
+    posts = []
+    for n in range(sizes['posts']):
+        content, content_html, digest, excerpt, words, minutes = rng.choice(bodies)
+        published_at = now - timedelta(hours=n * 6)
+        posts.append(BlogPost(
+            title=_sentence(rng, rng.randint(3, 8))[:-1], slug=f'bench-post-{n}', content=content,
+            content_html=content_html, content_hash=digest, excerpt=excerpt, word_count=words,
+            reading_time=minutes, author=author, category_id=rng.choice(category_ids),
+            is_published=rng.random() < 0.95, is_featured=rng.random() < 0.02, published_at=published_at,
+            view_count=rng.randint(0, 5000),
+        ))
+    with transaction.atomic():
+        BlogPost.objects.bulk_create(posts, batch_size=batch_size)
+        post_ids = list(BlogPost.objects.order_by('pk').values_list('pk', flat=True))
+        # created_at is auto_now_add, so spread the archive over time afterwards
+        for offset, pk in enumerate(post_ids):
+            BlogPost.objects.filter(pk=pk).update(created_at=now - timedelta(hours=offset * 6))
+
+        through = BlogPost.tags.through
+        # Popular tags are used much more than the long tail
+        tag_weights = [1 / (rank + 1) for rank in range(len(tag_ids))]
+        links = (
+            through(blogpost_id=pk, tag_id=tag_id)
+            for pk in post_ids
+            for tag_id in set(rng.choices(tag_ids, tag_weights, k=rng.randint(1, 5)))
+        )
+        for batch in _batched(links, batch_size):
+            through.objects.bulk_create(batch)
+
+    log(f"Seeding {sizes['comments']} comments...\n")
+    comments = (
+        Comment(
+            post_id=rng.choice(post_ids), name=f'Reader {n % 500}', email=f'reader{n % 500}@example.com',
+            text=_sentence(rng, rng.randint(5, 40)), is_approved=rng.random() < 0.9,
+        )
+        for n in range(sizes['comments'])
+    )
+    for batch in _batched(comments, batch_size):
+        Comment.objects.bulk_create(batch)
+
+    log(f"Seeding {sizes['likes']} likes...\n")
+    # Zipf-like: a few posts get most of the likes
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(len(post_ids))]
+    total = sum(weights)
+    per_post = [int(sizes['likes'] * weight / total) for weight in weights]
+    per_post[0] += sizes['likes'] - sum(per_post)
+    ranked = rng.sample(post_ids, len(post_ids))
+    likes = (
+        Like(post_id=pk, session_id=f'{visitor:032x}')
+        for pk, count in zip(ranked, per_post)
+        for visitor in range(count)
+    )
+    for batch in _batched(likes, batch_size):
+        Like.objects.bulk_create(batch)
+
+    log('Rebuilding counters, search index and related posts...\n')
+    counters.recount_posts()
+    counters.recount_taxonomy()
+    search.rebuild_index()
+    related.rebuild_all()
+    view_counter.flush()
+    return sizes
+
+
+def load_dataset():
+    from .models import BlogPost, Category, Comment, Like, Tag
+
+    published = BlogPost.objects.filter(is_published=True).order_by('pk')
+    return Dataset(
+        post_ids=list(published.values_list('pk', flat=True)),
+        post_slugs=list(published.values_list('slug', flat=True)),
+        category_slugs=list(Category.objects.filter(post_count__gt=0).values_list('slug', flat=True)),
+        tag_slugs=list(Tag.objects.filter(post_count__gt=0).values_list('slug', flat=True)),
+        comment_ids=list(Comment.objects.filter(is_approved=True).values_list('pk', flat=True)[:5000]),
+        staff_username='bench-author',
+        sizes={
+            'posts': BlogPost.objects.count(),
+            'categories': Category.objects.count(),
+            'tags': Tag.objects.count(),
+            'comments': Comment.objects.count(),
+            'likes': Like.objects.count(),
+        },
+    )
+
+
+# Scenarios
+
+def _post(dataset, rng):
+    return {'kwargs': {'slug': rng.choice(dataset.post_slugs)}}
+
+
+def _post_id(dataset, rng):
+    return {'kwargs': {'id': rng.choice(dataset.post_ids)}}
+
+
+def _visitor_like(dataset, rng):
+    return {'kwargs': {'slug': rng.choice(dataset.post_slugs)}, 'cookies': {}}
+
+
+def _blog_list(dataset, rng):
+    choice = rng.random()
+    if choice < 0.4:
+        return {'query': {'page': rng.randint(1, 20)}}
+    if choice < 0.6:
+        return {'query': {'category': rng.choice(dataset.category_slugs)}}
+    if choice < 0.8:
+        return {'query': {'tag': rng.choice(dataset.tag_slugs)}}
+    return {'query': {'search': rng.choice(_WORDS)}}
+
+
+def _api_posts(dataset, rng):
+    choice = rng.random()
+    if choice < 0.5:
+        return {'query': {'page': rng.randint(1, 20)}}
+    if choice < 0.75:
+        return {'query': {'fields': 'id,slug,title,excerpt'}}
+    return {'query': {'search': rng.choice(_WORDS)}}
+
+
+def _comment(dataset, rng):
+    return {'kwargs': {'pk': rng.choice(dataset.comment_ids)}}
+
+
+def _sacrificial_comment(dataset, rng):
+    from .models import Comment
+
+    comment = Comment.objects.create(post_id=rng.choice(dataset.post_ids), name='Spam', email='spam@example.com', text='Spam')
+    return {'kwargs': {'comment_id': comment.pk}}
+
+
+def _new_comment(dataset, rng):
+    return {'data': {'post': rng.choice(dataset.post_ids), 'name': 'Bench', 'email': 'bench@example.com', 'text': _sentence(rng, 12)}}
+
+
+def _contact(dataset, rng):
+    return {'data': {'name': 'Bench', 'email': 'bench@example.com', 'subject': 'Load test', 'message': _sentence(rng, 20)}}
+
+
+def _login(dataset, rng):
+    return {'data': {'username': dataset.staff_username, 'password': BENCH_PASSWORD}, 'json': True}
+
+
+def _timeseries(dataset, rng):
+    return {'query': {'metric': rng.choice(['posts', 'likes', 'comments'])}}
+
+
+SCENARIOS = [
+    # BlogApp/urls.py
+    Scenario('login'),
+    Scenario('logout', client='fresh-staff'),
+    Scenario('home'),
+    Scenario('blog_list', prepare=_blog_list),
+    Scenario('blog_detail', prepare=_post),
+    Scenario('like_post', method='post', prepare=_visitor_like),
+    Scenario('save_post', method='post', client='staff', prepare=_post),
+    Scenario('about'),
+    Scenario('dashboard', client='staff'),
+    Scenario('post_list_admin', client='staff'),
+    Scenario('post_create', client='staff'),
+    Scenario('post_edit', client='staff', prepare=_post_id),
+    Scenario('post_delete', client='staff', prepare=_post_id),
+    Scenario('saved_posts_list', client='staff'),
+    Scenario('perf_dashboard', client='staff'),
+    Scenario('delete_comment', method='post', client='staff', prepare=_sacrificial_comment),
+    # BlogApp/api_urls.py
+    Scenario('api-root'),
+    Scenario('post-list', prepare=_api_posts),
+    Scenario('post-detail', prepare=_post),
+    Scenario('post-related', prepare=_post),
+    Scenario('post-comments', prepare=_post),
+    Scenario('post-like', method='put', prepare=_visitor_like),
+    Scenario('post-save', method='post', client='staff', prepare=_post),
+    Scenario('comment-list'),
+    Scenario('comment-list', method='post', prepare=_new_comment),
+    Scenario('comment-detail', prepare=_comment),
+    Scenario('api-categories'),
+    Scenario('api-tags'),
+    Scenario('api-stats'),
+    Scenario('api-contact', method='post', prepare=_contact),
+    Scenario('api-dashboard-stats', client='staff'),
+    Scenario('api-dashboard-timeseries', client='staff', prepare=_timeseries),
+    Scenario('api-dashboard-compression', client='staff'),
+    Scenario('api-csrf'),
+    Scenario('api-login', method='post', client='fresh', prepare=_login),
+    Scenario('api-logout', method='post', client='fresh-staff'),
+    Scenario('api-current-user', client='staff'),
+]
+
+
+def route_names(urlconfs=('BlogApp.urls', 'BlogApp.api_urls')):
+    """Names of every route defined in ``urlconfs``"""
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+
+    for urlconf in urlconfs:
+        walk(get_resolver(urlconf).url_patterns)
+    return names
+
+
+def uncovered_routes():
+    return sorted(route_names() - {scenario.name for scenario in SCENARIOS})
+
+
+# Running
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _summary(latencies, statuses, wall):
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None  # noqa: E731
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 500),
+        'statuses': dict(sorted(statuses.items())),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'mean_ms': ms(statistics.fmean(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1]) if ordered else None,
+    }
+
+
+class _Clients:
+    """An anonymous and a logged-in staff client for one worker thread"""
+
+    def __init__(self, dataset):
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        self.anon = Client(raise_request_exception=False, HTTP_ACCEPT_ENCODING='gzip')
+        self.staff = Client(raise_request_exception=False, HTTP_ACCEPT_ENCODING='gzip')
+        self.staff_user = User.objects.get(username=dataset.staff_username)
+        self.staff.force_login(self.staff_user)
+
+
+def _request(scenario, clients, dataset, rng):
+    from django.test import Client
+
+    call = scenario.prepare(dataset, rng) if scenario.prepare else {}
+    if scenario.client.startswith('fresh'):
+        client = Client(raise_request_exception=False, HTTP_ACCEPT_ENCODING='gzip')
+        if scenario.client == 'fresh-staff':
+            client.force_login(clients.staff_user)
+    else:
+        client = getattr(clients, scenario.client)
+    if 'cookies' in call:
+        # A new visitor each time, as for likes from many readers
+        client.cookies.clear()
+    path = reverse(scenario.name, kwargs=call.get('kwargs'))
+    method = getattr(client, scenario.method)
+    if scenario.method == 'get':
+        args = (path, call.get('query'))
+        options = {}
+    elif call.get('json') or scenario.name.startswith(('api-', 'post-', 'comment-')):
+        args = (path, json.dumps(call.get('data', {})))
+        options = {'content_type': 'application/json'}
+    else:
+        args = (path, call.get('data', {}))
+        options = {}
+
+    started = time.perf_counter()
+    response = method(*args, **options)
+    return time.perf_counter() - started, response.status_code
+
+
+def run_scenario(scenario, dataset, requests=200, concurrency=8, warmup=5, seed_value=0):
+    """Drive one scenario; returns its summary dict"""
+    from django.db import connections
+
+    clients = None
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+
+    def worker(count, worker_seed):
+        rng = random.Random(worker_seed)
+        local = _Clients(dataset) if concurrency > 1 else clients
+        try:
+            for _ in range(count):
+                elapsed, status = _request(scenario, local, dataset, rng)
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+        finally:
+            if concurrency > 1:
+                # Threads opened their own connections
+                connections.close_all()
+
+    clients = _Clients(dataset)
+    warm_rng = random.Random(seed_value - 1)
+    for _ in range(warmup):
+        _request(scenario, clients, dataset, warm_rng)
+
+    shares = [requests // concurrency + (1 if n < requests % concurrency else 0) for n in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker(requests, seed_value)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(worker, count, seed_value + n) for n, count in enumerate(shares) if count]
+            for future in futures:
+                future.result()
+    wall = time.perf_counter() - started
+
+    summary = _summary(latencies, statuses, wall)
+    summary['method'] = scenario.method.upper()
+    return summary
+
+
+def scenario_key(scenario):
+    return scenario.name if scenario.method == 'get' else f'{scenario.name} {scenario.method.upper()}'
+
+
+def run(dataset, requests=200, concurrency=8, warmup=5, only=None, seed_value=0, stdout=None):
+    """Run every scenario (or those named in ``only``); returns the report dict"""
+    import logging
+    from django.core.cache import cache
+
+    cache.clear()
+    # Expected 4xx responses would otherwise log a warning per request
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        routes = _run_all(dataset, requests, concurrency, warmup, only, seed_value, stdout)
+    finally:
+        request_logger.setLevel(level)
+    return {
+        'meta': _meta(dataset, requests, concurrency),
+        'routes': routes,
+        'uncovered': uncovered_routes(),
+    }
+
+
+def _run_all(dataset, requests, concurrency, warmup, only, seed_value, stdout):
+    routes = {}
+    for index, scenario in enumerate(SCENARIOS):
+        key = scenario_key(scenario)
+        if only and scenario.name not in only and key not in only:
+            continue
+        routes[key] = run_scenario(scenario, dataset, requests, concurrency, warmup, seed_value + index * 1000)
+        if stdout:
+            result = routes[key]
+            stdout.write(
+                f"{key:<36} {result['throughput_rps'] or 0:>9.1f} req/s  p50 {result['p50_ms']:>8.2f} ms  "
+                f"p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms  errors {result['errors']}\n"
+            )
+    return routes
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _meta(dataset, requests, concurrency):
+    return {
+        'commit': _git_commit(),
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': dataset.sizes,
+        'requests_per_route': requests,
+        'concurrency': concurrency,
+    }
+
+
+# Regressions
+
+def compare(baseline, current, thresholds, min_delta_ms=1.0):
+    """
+    Routes whose metrics regressed against ``baseline``.
+
+    ``thresholds`` maps a metric (``p50_ms``, ``p95_ms``, ``p99_ms``,
+    ``throughput_rps``) to the allowed change in percent; latency may grow and
+    throughput may drop by that much. Latency changes smaller than
+    ``min_delta_ms`` are treated as noise.
+    """
+    regressions = []
+    for key, result in current['routes'].items():
+        before = baseline.get('routes', {}).get(key)
+        if not before:
+            continue
+        for metric, allowed in thresholds.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            if metric == 'throughput_rps':
+                change = (old - new) / old * 100
+                noise = False
+            else:
+                change = (new - old) / old * 100
+                noise = new - old < min_delta_ms
+            if change > allowed and not noise:
+                regressions.append({'route': key, 'metric': metric, 'baseline': old, 'current': new, 'change_pct': round(change, 1)})
+        if result['errors'] > before.get('errors', 0):
+            regressions.append({'route': key, 'metric': 'errors', 'baseline': before.get('errors', 0), 'current': result['errors'], 'change_pct': None})
+    return regressions
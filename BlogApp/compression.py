@@ -0,0 +1,233 @@
+"""
+Response compression for HTML and JSON.
+
+``CompressionMiddleware`` negotiates ``br`` (when the optional ``brotli``
+package is installed) or ``gzip`` from ``Accept-Encoding``. Pages from the
+anonymous page cache carry the output of ``precompress()`` stored with the
+cache entry (see ``page_cache.py``), so a cache hit is served without
+compressing again.
+
+CSRF tokens are different for every visitor, so bodies are split around
+them: each static chunk is deflated once, ending on a full flush so it does
+not depend on what follows, and only the short tokens are deflated per
+request before the pieces are joined into one gzip stream. This also keeps
+secrets out of the shared compression window (the BREACH attack), which is
+why brotli is only used for bodies without tokens.
+
+Per-endpoint ratios and CPU time are kept per process and exposed through
+``compression_stats()`` (``/api/dashboard/compression/``).
+"""
+import re
+import struct
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml',
+)
+
+_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+_SECRET_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]*)"')
+
+# Fixed header (no file name, zero mtime) so identical bodies compress identically
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+def _min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', 500)
+
+
+def _gzip_level():
+    return getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+
+
+def _brotli_quality():
+    return getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+
+def accepted_encodings(header):
+    """Encodings with a non-zero quality in an ``Accept-Encoding`` header"""
+    accepted = set()
+    for part in (header or '').split(','):
+        match = _ENCODING_RE.fullmatch(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def _deflate(data, final):
+    compressor = zlib.compressobj(_gzip_level(), zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH)
+
+
+def _split(content):
+    """Static chunks of ``content`` and the secret values between them"""
+    chunks, secrets, start = [], [], 0
+    for match in _SECRET_RE.finditer(content):
+        chunks.append(content[start:match.start(1)])
+        secrets.append(match.group(1))
+        start = match.end(1)
+    chunks.append(content[start:])
+    return chunks, secrets
+
+
+def _deflate_chunks(chunks):
+    return [_deflate(chunk, final=index == len(chunks) - 1) for index, chunk in enumerate(chunks)]
+
+
+def precompress(content):
+    """
+    Compress the parts of ``content`` that are the same for every visitor.
+
+    Returns a dict stored with cached pages and understood by ``encode()``:
+    deflated static chunks for gzip and, for bodies without secrets, a
+    complete brotli body.
+    """
+    chunks, secrets = _split(content)
+    stored = {'gzip': _deflate_chunks(chunks)}
+    if brotli is not None and not secrets:
+        stored['br'] = brotli.compress(content, quality=_brotli_quality())
+    return stored
+
+
+def encode(content, encoding, stored=None):
+    """``content`` compressed with ``encoding``, reusing ``stored`` parts where they fit"""
+    if encoding == 'br':
+        if stored and 'br' in stored:
+            return stored['br']
+        return brotli.compress(content, quality=_brotli_quality())
+
+    chunks, secrets = _split(content)
+    deflated = stored.get('gzip') if stored else None
+    if deflated is None or len(deflated) != len(chunks):
+        deflated = _deflate_chunks(chunks)
+    parts = [_GZIP_HEADER, deflated[0]]
+    for secret, chunk in zip(secrets, deflated[1:]):
+        parts += [_deflate(secret, final=False), chunk]
+    parts.append(struct.pack('<II', zlib.crc32(content), len(content) & 0xffffffff))
+    return b''.join(parts)
+
+
+def choose_encoding(request, content):
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING'))
+    if brotli is not None and 'br' in accepted and not _SECRET_RE.search(content):
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class _Stats:
+    """Per-process totals keyed on (endpoint, encoding)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, endpoint, encoding, size_in, size_out, cpu_ns, precompressed):
+        with self._lock:
+            totals = self._totals.setdefault((endpoint, encoding), {
+                'responses': 0, 'precompressed': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_ns': 0,
+            })
+            totals['responses'] += 1
+            totals['precompressed'] += int(precompressed)
+            totals['bytes_in'] += size_in
+            totals['bytes_out'] += size_out
+            totals['cpu_ns'] += cpu_ns
+
+    def snapshot(self):
+        with self._lock:
+            items = [(key, dict(totals)) for key, totals in self._totals.items()]
+        rows = []
+        for (endpoint, encoding), totals in items:
+            rows.append({
+                'endpoint': endpoint,
+                'encoding': encoding,
+                'responses': totals['responses'],
+                'precompressed': totals['precompressed'],
+                'bytes_in': totals['bytes_in'],
+                'bytes_out': totals['bytes_out'],
+                'ratio': round(totals['bytes_out'] / totals['bytes_in'], 4) if totals['bytes_in'] else None,
+                'cpu_ms': round(totals['cpu_ns'] / 1e6, 3),
+                'cpu_ms_per_response': round(totals['cpu_ns'] / 1e6 / totals['responses'], 3),
+            })
+        return sorted(rows, key=lambda row: row['bytes_in'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+_stats = _Stats()
+
+
+def compression_stats():
+    """Ratio and CPU time per endpoint and encoding since this process started"""
+    return _stats.snapshot()
+
+
+def reset_stats():
+    _stats.reset()
+
+
+class CompressionMiddleware:
+    """Compress HTML and JSON responses with brotli or gzip"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        content = response.content
+        encoding = choose_encoding(request, content)
+        if encoding is None:
+            return response
+
+        stored = getattr(response, 'precompressed', None)
+        started = time.process_time_ns()
+        compressed = encode(content, encoding, stored)
+        cpu_ns = time.process_time_ns() - started
+        if len(compressed) >= len(content):
+            return response
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name if match else None) or 'unresolved'
+        _stats.record(endpoint, encoding, len(content), len(compressed), cpu_ns, bool(stored and encoding in stored))
+
+        response.content = compressed
+        response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(compressed))
+        # The compressed body is no longer byte-for-byte the one the ETag named
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def _compressible(self, response):
+        if response.streaming or response.status_code != 200 or response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return False
+        return len(response.content) >= _min_size()
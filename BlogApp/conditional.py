@@ -0,0 +1,95 @@
+"""
+Conditional GET (ETag / Last-Modified) for the read API.
+
+Validators are derived from cheap aggregates instead of the response body:
+``updated_at`` and the stored like/comment counters of the posts involved,
+plus the latest change to categories and tags. A request whose
+``If-None-Match`` / ``If-Modified-Since`` still matches gets a ``304 Not
+Modified`` before anything is serialized.
+
+View counts are deliberately left out of the validators: they change on
+every read and would make every response unique. Tag changes touch the
+post's ``updated_at`` (see ``signals.py``), so retagging is picked up too.
+Writes that bypass ``save()`` and change what a post shows (stored covers
+and image variants, re-rendered content, summaries) stamp ``updated_at``
+themselves, since ``.update()`` and ``bulk_update()`` skip ``auto_now``.
+"""
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response if the client's validators still match, else None"""
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    response = get_conditional_response(request, etag=quote_etag(etag), last_modified=timestamp)
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified=None):
+    if response.status_code in (200, 304):
+        response['ETag'] = quote_etag(etag)
+        if last_modified:
+            response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    return response
+
+
+def taxonomy_state():
+    """Latest change and size of the category and tag tables"""
+    from .models import Category, Tag
+
+    categories = Category.objects.aggregate(latest=Max('updated_at'), count=Count('pk'))
+    tags = Tag.objects.aggregate(latest=Max('updated_at'), count=Count('pk'))
+    return categories, tags
+
+
+def post_list_validators(queryset, *variant):
+    """``(etag, last_modified)`` for a listing of ``queryset``"""
+    posts = queryset.order_by().aggregate(
+        latest=Max('updated_at'),
+        count=Count('pk'),
+        likes=Sum('like_count'),
+        comments=Sum('comment_count'),
+    )
+    categories, tags = taxonomy_state()
+    etag = make_etag(
+        'posts', posts['latest'], posts['count'], posts['likes'], posts['comments'],
+        categories['latest'], categories['count'], tags['latest'], tags['count'], *variant,
+    )
+    return etag, _latest(posts['latest'], categories['latest'], tags['latest'])
+
+
+def post_validators(post, *variant):
+    """``(etag, last_modified)`` for a single post loaded with its category"""
+    category = post.category
+    etag = make_etag(
+        'post', post.pk, post.updated_at, post.like_count, post.comment_count,
+        category.pk if category else None, category.updated_at if category else None, *variant,
+    )
+    return etag, _latest(post.updated_at, category.updated_at if category else None)
+
+
+def taxonomy_validators(kind, *variant):
+    """``(etag, last_modified)`` for the category or tag listings with post counts"""
+    from .models import BlogPost
+
+    # Filtered rather than FILTER clauses, so only published rows are read
+    posts = BlogPost.objects.filter(is_published=True).aggregate(latest=Max('updated_at'), count=Count('pk'))
+    categories, tags = taxonomy_state()
+    state = categories if kind == 'categories' else tags
+    etag = make_etag(kind, state['latest'], state['count'], posts['latest'], posts['count'], *variant)
+    return etag, _latest(state['latest'], posts['latest'])
@@ -0,0 +1,72 @@
+"""
+Denormalized counters.
+
+``like_count`` and ``comment_count`` (approved comments only) on BlogPost,
+and ``post_count`` (published posts only) on Category and Tag, are adjusted
+with ``F()`` updates by the receivers in ``signals.py``, in the same
+transaction as the write that changed them, so list pages, sidebars and
+serializers can read them without a COUNT per row. Writes that bypass model
+signals (``QuerySet.update()``, raw SQL) can make them drift;
+``manage.py recount_post_counters`` and ``manage.py recount_taxonomy_counters``
+rebuild them in bulk.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def adjust(post_id, field, delta):
+    """Add ``delta`` to one of the stored counters of a post"""
+    from .models import BlogPost
+
+    if not delta:
+        return
+    BlogPost.objects.filter(pk=post_id).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def adjust_post_counts(model, ids, delta):
+    """Add ``delta`` to ``post_count`` of the Category or Tag rows in ``ids``"""
+    ids = [pk for pk in ids if pk is not None]
+    if not ids or not delta:
+        return
+    model.objects.filter(pk__in=ids).update(post_count=Greatest(F('post_count') + delta, Value(0)))
+
+
+def count_subquery(queryset, key='post'):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{key: OuterRef('pk')})
+            .order_by()
+            .values(key)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def recount_posts(queryset=None):
+    """Recompute like_count and comment_count with one UPDATE; returns rows updated"""
+    from .models import BlogPost, Comment, Like
+
+    if queryset is None:
+        queryset = BlogPost.objects.all()
+    return queryset.update(
+        like_count=count_subquery(Like.objects.all()),
+        comment_count=count_subquery(Comment.objects.filter(is_approved=True)),
+    )
+
+
+def recount_taxonomy(category_model=None, tag_model=None, post_model=None):
+    """Recompute post_count on every category and tag; returns rows updated"""
+    if category_model is None:
+        from .models import BlogPost as post_model, Category as category_model, Tag as tag_model
+
+    published = post_model.objects.filter(is_published=True)
+    tagged = post_model.tags.through.objects.filter(blogpost__is_published=True)
+    return (
+        category_model.objects.update(post_count=count_subquery(published, key='category'))
+        + tag_model.objects.update(post_count=count_subquery(tagged, key='tag'))
+    )
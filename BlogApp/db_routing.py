@@ -0,0 +1,133 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+When ``REPLICA_DATABASE_URL`` is set the replica is configured as the
+``DATABASE_READ_REPLICA`` alias, and ``ReplicaRoutingMiddleware`` sends the
+reads of the read-only public views (``REPLICA_VIEWS``) to it. Everything
+else reads from the primary: other views, unsafe requests, management
+commands, the job worker, and the rest of any request that has already
+written, so a view always sees its own writes. Writes always go to the
+primary, and so does everything the database cache (page cache, site
+statistics) reads: an entry invalidated on the primary must not be served
+from a replica that has not caught up yet.
+
+Replicas lag, so a client that just wrote (any POST, PUT, PATCH or DELETE)
+gets a short-lived ``PIN_COOKIE`` and reads from the primary until it
+expires, ``DATABASE_REPLICA_PIN_SECONDS`` later. A comment or a like is
+then visible on the next page load instead of after the replica catches
+up. The cookie is not signed: forging it only sends the forger's own
+reads to the primary. API clients that drop cookies get no pinning.
+
+Two local databases are enough to try it: point ``DATABASE_URL`` and
+``REPLICA_DATABASE_URL`` at two SQLite files or Postgres databases and run
+``migrate`` against both (``--database=replica``). In tests the replica
+alias mirrors the primary.
+"""
+import contextvars
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'db_primary'
+
+# URL names whose GET and HEAD requests may read from the replica
+REPLICA_VIEWS = frozenset({
+    'home', 'blog_list', 'blog_detail',
+    'post-list', 'post-detail', 'post-related', 'post-comments',
+    'comment-list', 'comment-detail',
+    'api-categories', 'api-tags', 'api-stats',
+    'api-dashboard-stats', 'api-dashboard-timeseries',
+})
+
+_READ_METHODS = ('GET', 'HEAD')
+
+# DatabaseCache's model: cache entries are invalidated on the primary, and a
+# lagging replica would keep serving them
+_PRIMARY_ONLY_APPS = frozenset({'django_cache'})
+
+
+class _RequestState:
+    __slots__ = ('alias', 'wrote')
+
+    def __init__(self):
+        self.alias = None
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None"""
+    return getattr(settings, 'DATABASE_READ_REPLICA', None)
+
+
+def _is_primary(alias):
+    # The test runner points the replica at the primary's test database;
+    # reading it would gain nothing and trip the per-test database isolation
+    if alias not in connections:
+        return False
+    keys = ('ENGINE', 'NAME', 'HOST', 'PORT')
+    replica = connections[alias].settings_dict
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict
+    return all(replica.get(key) == primary.get(key) for key in keys)
+
+
+class ReplicaRouter:
+    """Reads go where the current request was routed, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in _PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is None or state.wrote:
+            return None
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label not in _PRIMARY_ONLY_APPS:
+            # Reads after a write in the same request must see it
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Route reads of read-only views to the replica; pin clients that wrote to the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _state.set(_RequestState())
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if request.method not in _READ_METHODS and replica_alias():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10),
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        alias = replica_alias()
+        if state is None or not alias or request.method not in _READ_METHODS or _is_primary(alias):
+            return None
+        match = request.resolver_match
+        if match and match.view_name in REPLICA_VIEWS and PIN_COOKIE not in request.COOKIES:
+            state.alias = alias
+        return None
@@ -0,0 +1,174 @@
+"""
+Responsive derivatives of uploaded images.
+
+``BlogPost.cover_image`` and ``AboutPage.profile_image`` are uploaded at
+full resolution. ``build_variants()`` uses Pillow to write resized copies
+at fixed widths in WebP (and AVIF when Pillow supports it) plus a tiny
+blurred placeholder, and records them in a JSON field next to the image::
+
+    {"source": "blog_covers/a.jpg", "width": 2400, "height": 1600,
+     "formats": {"avif": [[320, "derivatives/..."], ...], "webp": [...]},
+     "placeholder": "data:image/webp;base64,..."}
+
+Derivatives are written through the image field's storage, so they work
+with both local ``MEDIA_ROOT`` and Cloudinary. They are produced out of band
+by the job queue when an image is saved (see tasks.py) or in bulk by
+``manage.py build_image_derivatives``, never while serving a request.
+Until they exist, or after the image is replaced (``source`` no longer
+matches), templates fall back to the original file.
+"""
+import base64
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageFilter, ImageOps, features
+
+
+# Target widths per kind of image; an image is never upscaled
+WIDTHS = {
+    'cover': (320, 640, 960, 1280, 1920),
+    'profile': (150, 300, 600),
+}
+
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+PLACEHOLDER_WIDTH = 16
+
+# (model label, image field, variants field, kind)
+IMAGE_FIELDS = (
+    ('BlogApp.BlogPost', 'cover_image', 'cover_image_variants', 'cover'),
+    ('BlogApp.AboutPage', 'profile_image', 'profile_image_variants', 'profile'),
+)
+
+
+def _quality():
+    return getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+
+
+def output_formats():
+    """Derivative formats, best compression first, that this Pillow can write"""
+    wanted = getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', ('avif', 'webp'))
+    return [fmt for fmt in wanted if fmt in CONTENT_TYPES and features.check(fmt)]
+
+
+def is_current(image, variants):
+    """Whether ``variants`` were built from the file currently in ``image``"""
+    return bool(image) and bool(variants) and variants.get('source') == image.name
+
+
+def _load(image):
+    image.open('rb')
+    try:
+        picture = Image.open(io.BytesIO(image.read()))
+        picture.load()
+    finally:
+        image.close()
+    picture = ImageOps.exif_transpose(picture)
+    return picture.convert('RGBA' if picture.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+
+def _encode(picture, fmt, **options):
+    buffer = io.BytesIO()
+    picture.save(buffer, format=fmt.upper(), **options)
+    return buffer.getvalue()
+
+
+def _resized(picture, width):
+    height = max(1, round(picture.height * width / picture.width))
+    return picture.resize((width, height), Image.LANCZOS)
+
+
+def placeholder(picture):
+    """A blurred data URI of a few hundred bytes shown while the image loads"""
+    small = _resized(picture, min(PLACEHOLDER_WIDTH, picture.width)).filter(ImageFilter.GaussianBlur(1))
+    data = _encode(small, 'webp', quality=30)
+    return 'data:image/webp;base64,' + base64.b64encode(data).decode()
+
+
+def build_variants(image, kind):
+    """Write derivatives of ``image`` to its storage and return the variants dict"""
+    picture = _load(image)
+    stem, _ = os.path.splitext(image.name)
+    widths = sorted({min(width, picture.width) for width in WIDTHS[kind]})
+
+    formats = {}
+    for fmt in output_formats():
+        entries = []
+        for width in widths:
+            data = _encode(_resized(picture, width), fmt, quality=_quality())
+            name = image.storage.save(f'derivatives/{stem}-{width}w.{fmt}', ContentFile(data))
+            entries.append([width, name])
+        formats[fmt] = entries
+
+    return {
+        'source': image.name,
+        'width': picture.width,
+        'height': picture.height,
+        'formats': formats,
+        'placeholder': placeholder(picture),
+    }
+
+
+def delete_variants(storage, variants):
+    for entries in (variants or {}).get('formats', {}).values():
+        for _, name in entries:
+            storage.delete(name)
+
+
+def stamped(model, **values):
+    """``values`` for ``.update()``, plus ``updated_at`` when ``model`` has one"""
+    # update() skips auto_now, and conditional GETs are validated on updated_at
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        values['updated_at'] = timezone.now()
+    return values
+
+
+def refresh(instance, image_field, variants_field, kind, force=False):
+    """Rebuild the derivatives of one instance if stale; returns True if rebuilt"""
+    image = getattr(instance, image_field)
+    old = getattr(instance, variants_field) or {}
+    if not force and (is_current(image, old) or (not image and not old)):
+        return False
+
+    variants = build_variants(image, kind) if image else {}
+    # update() so a concurrent edit of other fields is not overwritten
+    type(instance).objects.filter(pk=instance.pk).update(**stamped(type(instance), **{variants_field: variants}))
+    setattr(instance, variants_field, variants)
+    delete_variants(image.storage, old)
+    _invalidate_pages(instance)
+    return True
+
+
+def _invalidate_pages(instance):
+    from . import page_cache
+
+    if instance._meta.model_name == 'blogpost':
+        page_cache.invalidate(*page_cache.post_groups(instance))
+    else:
+        page_cache.invalidate('about')
+
+
+def refresh_all(force=False):
+    """Rebuild stale derivatives for every configured image field; returns the count"""
+    from django.apps import apps
+
+    rebuilt = 0
+    for label, image_field, variants_field, kind in IMAGE_FIELDS:
+        model = apps.get_model(label)
+        fields = ['pk', image_field, variants_field] + (['slug'] if label == 'BlogApp.BlogPost' else [])
+        for instance in model.objects.only(*fields).iterator():
+            if refresh(instance, image_field, variants_field, kind, force=force):
+                rebuilt += 1
+    return rebuilt
+
+
+def srcset(image, variants, fmt, build_url=None):
+    """``srcset`` value for one derivative format, or '' if there is none"""
+    if not is_current(image, variants):
+        return ''
+    entries = variants.get('formats', {}).get(fmt, [])
+    urls = ((width, image.storage.url(name)) for width, name in entries)
+    return ', '.join(f'{build_url(url) if build_url else url} {width}w' for width, url in urls)
@@ -0,0 +1,363 @@
+"""
+Per-request SQL and template instrumentation.
+
+``PerfMiddleware`` wraps every database connection with an execute wrapper
+for the duration of a request and records each query's time and
+fingerprint: the SQL with literals and placeholder lists collapsed, so the
+same lookup with different ids counts as one shape. Template time is the
+time spent in the top-level ``Template.render`` of the Django backend,
+which is patched once; queries that run while a template renders (lazy
+relations, model methods called from templates) are counted in both.
+
+From the fingerprints two problems surface without anyone looking for them:
+
+* *repeated* queries: the same SQL with the same parameters more than once
+  in a request, such as ``{% if post.tags.all %}`` followed by
+  ``{% for tag in post.tags.all %}``;
+* *N+1* suspects: one shape run ``PERF_NPLUSONE_THRESHOLD`` times or more,
+  usually with different parameters, such as a per-row count in a
+  serializer or a relation followed inside a template loop.
+
+Each is reported with the template that was rendering and the first frame
+of project code that ran it. Timings are sent back in a ``Server-Timing``
+header (to staff, or everyone with ``PERF_SERVER_TIMING = 'all'``), requests
+slower than ``PERF_SLOW_REQUEST_MS`` or with more than
+``PERF_SLOW_REQUEST_QUERIES`` queries are logged on ``BlogApp.perf``, and
+per-endpoint aggregates are kept per process and shown on
+``/dashboard/perf/`` (see ``perf_stats()``).
+
+All of this costs time on every query, so it only runs with
+``PERF_INSTRUMENTATION`` on, which defaults to ``DEBUG``. When it is off at
+startup the middleware removes itself and ``Template.render`` is left alone.
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger('BlogApp.perf')
+
+_recorder = contextvars.ContextVar('perf_recorder', default=None)
+
+# Durations kept per endpoint for percentiles
+RECENT_REQUESTS = 200
+# Problem queries kept per endpoint, least seen dropped first
+MAX_PROBLEMS = 25
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def fingerprint(sql):
+    """``sql`` with literals replaced by ``?`` and ``IN`` lists collapsed"""
+    sql = _STRING_RE.sub('?', sql.replace('%s', '?'))
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+_project_root = None
+_skip_dirs = None
+
+
+def _caller():
+    """``file:line`` of the innermost frame in project code, outside this module"""
+    global _project_root, _skip_dirs
+    if _project_root is None:
+        _project_root = str(Path(settings.BASE_DIR).resolve()) + os.sep
+        _skip_dirs = (os.sep + 'site-packages' + os.sep, os.sep + 'dist-packages' + os.sep)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(_project_root) and filename != __file__
+                and not any(part in filename for part in _skip_dirs)):
+            return f'{os.path.relpath(filename, _project_root)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return ''
+
+
+class Recorder:
+    """Queries and template time of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ns = 0
+        self.template_ns = 0
+        self.templates = []
+        self._shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            self.queries += 1
+            self.db_ns += elapsed
+            self._record(sql, params, elapsed)
+
+    def _record(self, sql, params, elapsed):
+        shape = self._shapes.get(sql)
+        if shape is None:
+            shape = self._shapes[sql] = {
+                'sql': sql,
+                'count': 0,
+                'ns': 0,
+                'params': {},
+                'template': self.templates[-1] if self.templates else '',
+                'location': _caller(),
+            }
+        shape['count'] += 1
+        shape['ns'] += elapsed
+        try:
+            key = repr(params)
+        except Exception:
+            key = None
+        shape['params'][key] = shape['params'].get(key, 0) + 1
+
+    def problems(self):
+        """Repeated and N+1 queries of this request, most frequent first"""
+        threshold = _setting('PERF_NPLUSONE_THRESHOLD', 5)
+        merged = {}
+        for shape in self._shapes.values():
+            # Raw SQL with inlined literals only matches its siblings once fingerprinted
+            key = fingerprint(shape['sql'])
+            entry = merged.setdefault(key, {
+                'fingerprint': key, 'count': 0, 'ms': 0.0, 'repeats': 0,
+                'template': shape['template'], 'location': shape['location'],
+            })
+            entry['count'] += shape['count']
+            entry['ms'] += shape['ns'] / 1e6
+            entry['repeats'] += sum(count - 1 for count in shape['params'].values())
+
+        problems = []
+        for entry in merged.values():
+            if entry['count'] >= threshold:
+                entry['kind'] = 'n+1'
+            elif entry['repeats']:
+                entry['kind'] = 'repeated'
+            else:
+                continue
+            entry['ms'] = round(entry['ms'], 3)
+            problems.append(entry)
+        return sorted(problems, key=lambda entry: entry['count'], reverse=True)
+
+
+_template_patch_lock = threading.Lock()
+_template_patched = False
+
+
+def _patch_template_render():
+    """Time the Django backend's top-level ``Template.render`` once per process"""
+    global _template_patched
+    with _template_patch_lock:
+        if _template_patched:
+            return
+        from django.template.backends.django import Template
+
+        original = Template.render
+
+        def render(self, context=None, request=None):
+            recorder = _recorder.get()
+            if recorder is None:
+                return original(self, context, request)
+            recorder.templates.append(getattr(self.template, 'name', None) or '')
+            started = time.perf_counter_ns()
+            try:
+                return original(self, context, request)
+            finally:
+                elapsed = time.perf_counter_ns() - started
+                recorder.templates.pop()
+                # Nested renders (render_to_string inside a template) are in the outer time
+                if not recorder.templates:
+                    recorder.template_ns += elapsed
+
+        Template.render = render
+        _template_patched = True
+
+
+class _Stats:
+    """Per-process totals keyed on endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, endpoint, total_ns, recorder, problems):
+        with self._lock:
+            totals = self._totals.get(endpoint)
+            if totals is None:
+                totals = self._totals[endpoint] = {
+                    'requests': 0, 'total_ns': 0, 'max_ns': 0, 'db_ns': 0, 'template_ns': 0,
+                    'queries': 0, 'max_queries': 0, 'flagged': 0,
+                    'recent': deque(maxlen=RECENT_REQUESTS), 'problems': {},
+                }
+            totals['requests'] += 1
+            totals['total_ns'] += total_ns
+            totals['max_ns'] = max(totals['max_ns'], total_ns)
+            totals['db_ns'] += recorder.db_ns
+            totals['template_ns'] += recorder.template_ns
+            totals['queries'] += recorder.queries
+            totals['max_queries'] = max(totals['max_queries'], recorder.queries)
+            totals['recent'].append(total_ns)
+            totals['flagged'] += int(bool(problems))
+
+            known = totals['problems']
+            for problem in problems:
+                entry = known.get(problem['fingerprint'])
+                if entry is None:
+                    if len(known) >= MAX_PROBLEMS:
+                        del known[min(known, key=lambda key: known[key]['requests'])]
+                    entry = known[problem['fingerprint']] = {
+                        'fingerprint': problem['fingerprint'], 'kind': problem['kind'],
+                        'requests': 0, 'max_count': 0,
+                        'template': problem['template'], 'location': problem['location'],
+                    }
+                entry['requests'] += 1
+                entry['max_count'] = max(entry['max_count'], problem['count'])
+                if problem['kind'] == 'n+1':
+                    entry['kind'] = 'n+1'
+
+    def snapshot(self):
+        with self._lock:
+            items = [
+                (endpoint, dict(totals, recent=sorted(totals['recent']),
+                                problems=[dict(entry) for entry in totals['problems'].values()]))
+                for endpoint, totals in self._totals.items()
+            ]
+        rows = []
+        for endpoint, totals in items:
+            requests = totals['requests']
+            recent = totals['recent']
+            rows.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'avg_ms': round(totals['total_ns'] / 1e6 / requests, 3),
+                'p50_ms': round(_percentile(recent, 50) / 1e6, 3),
+                'p95_ms': round(_percentile(recent, 95) / 1e6, 3),
+                'max_ms': round(totals['max_ns'] / 1e6, 3),
+                'avg_db_ms': round(totals['db_ns'] / 1e6 / requests, 3),
+                'avg_template_ms': round(totals['template_ns'] / 1e6 / requests, 3),
+                'avg_queries': round(totals['queries'] / requests, 2),
+                'max_queries': totals['max_queries'],
+                'flagged': totals['flagged'],
+                'problems': sorted(totals['problems'], key=lambda entry: entry['requests'], reverse=True),
+            })
+        return sorted(rows, key=lambda row: row['avg_ms'] * row['requests'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+_stats = _Stats()
+
+
+def perf_stats():
+    """Timings, query counts and problem queries per endpoint since this process started"""
+    return _stats.snapshot()
+
+
+def reset_stats():
+    _stats.reset()
+
+
+def server_timing(total_ns, recorder):
+    """``Server-Timing`` header value for a finished request"""
+    return ', '.join([
+        f'db;dur={recorder.db_ns / 1e6:.1f};desc="{recorder.queries} queries"',
+        f'tpl;dur={recorder.template_ns / 1e6:.1f}',
+        f'total;dur={total_ns / 1e6:.1f}',
+    ])
+
+
+def enabled():
+    """Whether requests are instrumented"""
+    return _setting('PERF_INSTRUMENTATION', settings.DEBUG)
+
+
+def _shows_timing(request):
+    mode = _setting('PERF_SERVER_TIMING', 'staff')
+    if mode == 'all':
+        return True
+    if mode != 'staff':
+        return False
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+class PerfMiddleware:
+    """Record queries and template time per request; report and aggregate them"""
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _patch_template_render()
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+
+        recorder = Recorder()
+        token = _recorder.set(recorder)
+        started = time.perf_counter_ns()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        total_ns = time.perf_counter_ns() - started
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name if match else None) or 'unresolved'
+        problems = recorder.problems()
+        _stats.record(endpoint, total_ns, recorder, problems)
+
+        if _shows_timing(request):
+            response['Server-Timing'] = server_timing(total_ns, recorder)
+        self._log_slow(request, endpoint, total_ns, recorder, problems)
+        return response
+
+    def _log_slow(self, request, endpoint, total_ns, recorder, problems):
+        slow = total_ns / 1e6 >= _setting('PERF_SLOW_REQUEST_MS', 500)
+        busy = recorder.queries > _setting('PERF_SLOW_REQUEST_QUERIES', 50)
+        if not (slow or busy):
+            return
+        logger.warning(
+            'Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, templates %.1f ms%s',
+            request.method, request.path, endpoint, total_ns / 1e6,
+            recorder.queries, recorder.db_ns / 1e6, recorder.template_ns / 1e6,
+            ''.join(
+                f"\n  {problem['kind']} x{problem['count']} [{problem['template'] or '-'} "
+                f"{problem['location'] or '-'}]: {problem['fingerprint'][:200]}"
+                for problem in problems[:5]
+            ),
+        )
@@ -0,0 +1,222 @@
+"""
+Background jobs without a broker.
+
+Slow side effects (sending mail, storing uploads, building image
+derivatives) are stored as ``Job`` rows by ``enqueue()`` and run by
+``manage.py run_worker``, which ``start.sh`` starts next to gunicorn on the
+same box. The database is the only moving part, so a job enqueued inside a
+request's transaction exists exactly when the rows it refers to do.
+
+Workers claim a job with a conditional ``UPDATE ... WHERE status='queued'``,
+which works on both SQLite and Postgres and lets several workers share the
+table. Higher ``priority`` runs first. A failing job is retried with
+exponential backoff until ``max_attempts``; a job whose worker died is
+handed out again once its lease expires. ``dedup_key`` collapses repeated
+requests for the same work while it is still waiting (see the partial
+unique constraint on ``Job``).
+
+Task functions register themselves with ``@task('name')`` (see tasks.py) and
+are called with the job's payload as keyword arguments.
+
+Between jobs the worker also folds the post views that web processes have
+spilled (see view_counter.py), so page views never wait on that update.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+# Candidates read per claim attempt; others may be taken by concurrent workers
+CLAIM_BATCH = 10
+
+
+def task(name):
+    """Register a function as the handler of jobs named ``name``"""
+    def register(func):
+        _tasks[name] = func
+        return func
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(name, payload=None, priority=0, dedup_key=None, delay=0, max_attempts=None):
+    """
+    Queue ``name`` to run with ``payload`` and return the waiting ``Job``.
+
+    If a job with ``dedup_key`` is already waiting it is returned instead,
+    raised to ``priority`` and brought forward if this request is sooner.
+    """
+    if name not in _tasks:
+        raise ValueError(f'Unknown task {name!r}')
+    run_at = timezone.now() + timedelta(seconds=delay)
+    job = Job(
+        task=name,
+        payload=payload or {},
+        priority=priority,
+        dedup_key=dedup_key,
+        run_at=run_at,
+        max_attempts=max_attempts or _setting('JOB_MAX_ATTEMPTS', 5),
+    )
+    if dedup_key is None:
+        job.save()
+        return job
+
+    # Retry once: the waiting job may be claimed between the insert and the merge
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                job.save(force_insert=True)
+            return job
+        except IntegrityError:
+            job.pk = None
+        waiting = Job.objects.filter(dedup_key=dedup_key, status=Job.QUEUED)
+        if waiting.update(priority=Greatest(F('priority'), priority), run_at=Least(F('run_at'), run_at)):
+            return waiting.first()
+    raise IntegrityError(f'Could not enqueue {name!r} with dedup key {dedup_key!r}')
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times"""
+    base = _setting('JOB_RETRY_BACKOFF', 30)
+    delay = min(base * 2 ** (attempts - 1), _setting('JOB_RETRY_BACKOFF_MAX', 6 * 60 * 60))
+    # Jitter so jobs that failed together do not all retry together
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(worker):
+    """Take the next due job for ``worker``, or None if there is none"""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('pk', flat=True)[:CLAIM_BATCH]
+    )
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _retry_or_fail(job, error, retry=True):
+    """Put a failed job back in the queue after a backoff, or give up on it"""
+    jobs = Job.objects.filter(pk=job.pk)
+    if retry and job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                jobs.update(
+                    status=Job.QUEUED,
+                    run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+                    locked_by='',
+                    locked_at=None,
+                    last_error=error,
+                )
+            return Job.QUEUED
+        except IntegrityError:
+            # The same work was queued again meanwhile; that job covers the retry
+            error += '\nNot retried: superseded by a newer job with the same dedup key.'
+    jobs.update(status=Job.FAILED, finished_at=timezone.now(), locked_by='', locked_at=None, last_error=error)
+    return Job.FAILED
+
+
+def run(job):
+    """Run a claimed job and record the outcome; returns the new status"""
+    func = _tasks.get(job.task)
+    if func is None:
+        logger.error('Job %s has unknown task %r', job.pk, job.task)
+        return _retry_or_fail(job, f'Unknown task {job.task!r}', retry=False)
+    try:
+        func(**job.payload)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        return _retry_or_fail(job, traceback.format_exc())
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, finished_at=timezone.now(), locked_by='', locked_at=None, last_error='',
+    )
+    return Job.DONE
+
+
+def requeue_stale():
+    """Hand out again jobs whose worker stopped before finishing them"""
+    lease = timedelta(seconds=_setting('JOB_LEASE_SECONDS', 600))
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - lease)
+    count = 0
+    for job in stale:
+        _retry_or_fail(job, f'Lease held by {job.locked_by} expired.')
+        count += 1
+    return count
+
+
+def purge_finished():
+    """Delete jobs that succeeded more than ``JOB_RETENTION_DAYS`` ago"""
+    cutoff = timezone.now() - timedelta(days=_setting('JOB_RETENTION_DAYS', 7))
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _fold_view_counts():
+    """Apply the post views web processes have spilled (see view_counter.py)"""
+    from . import view_counter
+
+    try:
+        view_counter.apply_pending()
+    except Exception:
+        logger.exception('Could not fold spilled post views')
+
+
+def work(worker=None, once=False, max_jobs=None, poll_interval=None, should_stop=lambda: False):
+    """
+    Run jobs until stopped; returns the number of jobs run.
+
+    With ``once`` the worker exits as soon as no job is due instead of
+    polling every ``poll_interval`` seconds.
+    """
+    worker = worker or worker_name()
+    poll_interval = _setting('JOB_POLL_INTERVAL', 2) if poll_interval is None else poll_interval
+    processed = 0
+    last_maintenance = last_fold = None
+    while not should_stop() and (max_jobs is None or processed < max_jobs):
+        # A long-lived process must notice connections the database dropped
+        close_old_connections()
+        if last_maintenance is None or time.monotonic() - last_maintenance > 60:
+            requeue_stale()
+            purge_finished()
+            last_maintenance = time.monotonic()
+        if last_fold is None or time.monotonic() - last_fold >= _setting('VIEW_COUNT_FLUSH_INTERVAL', 10):
+            _fold_view_counts()
+            last_fold = time.monotonic()
+
+        job = claim(worker)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run(job)
+        processed += 1
+    return processed
@@ -0,0 +1,101 @@
+"""
+Race-free likes.
+
+``like()`` is a single ``INSERT ... ON CONFLICT DO NOTHING`` (understood by
+both Postgres and SQLite) and ``unlike()`` a single ``DELETE``; the row
+count says whether anything changed, so concurrent double clicks can never
+hit the ``(post, session_id)`` unique constraint. When something did change,
+``BlogPost.like_count`` is adjusted in the same transaction and the new
+value is read back with ``RETURNING`` where the database supports it; no
+``COUNT(*)`` over Like is needed.
+
+These writes bypass model signals, so the counter, the cached site
+statistics and the post's cached page are updated here instead of by the
+receivers in ``signals.py``. Listings, home and about also show like counts
+but are left to expire (``PAGE_CACHE_TTL``): dropping them on every like
+would empty the anonymous page cache on a busy site.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import page_cache, stats
+
+
+def _quoted(model, *names):
+    quote = connection.ops.quote_name
+    return [quote(model._meta.db_table)] + [quote(model._meta.get_field(name).column) for name in names]
+
+
+def _can_return_from_update():
+    # UPDATE ... RETURNING: Postgres, and SQLite from 3.35
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def _adjust_like_count(cursor, post_id, delta):
+    """Apply ``delta`` to the stored counter; returns ``(like_count, slug)``"""
+    from .models import BlogPost
+
+    table, like_count, slug, pk = _quoted(BlogPost, 'like_count', 'slug', 'id')
+    greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+    sql = f'UPDATE {table} SET {like_count} = {greatest}({like_count} + %s, 0) WHERE {pk} = %s'
+    if _can_return_from_update():
+        cursor.execute(f'{sql} RETURNING {like_count}, {slug}', [delta, post_id])
+    else:
+        cursor.execute(sql, [delta, post_id])
+        cursor.execute(f'SELECT {like_count}, {slug} FROM {table} WHERE {pk} = %s', [post_id])
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def _invalidate(slug):
+    stats.invalidate()
+    if slug:
+        page_cache.invalidate(f'post:{slug}')
+
+
+def _current_like_count(post_id):
+    from .models import BlogPost
+
+    return BlogPost.objects.filter(pk=post_id).values_list('like_count', flat=True).first() or 0
+
+
+def like(post_id, session_id):
+    """Like a post; returns ``(changed, like_count)``. Liking twice is a no-op."""
+    from .models import Like
+
+    table, post, session, created_at = _quoted(Like, 'post', 'session_id', 'created_at')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({post}, {session}, {created_at}) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING',
+            [post_id, session_id, connection.ops.adapt_datetimefield_value(timezone.now())],
+        )
+        if cursor.rowcount != 1:
+            return False, _current_like_count(post_id)
+        like_count, slug = _adjust_like_count(cursor, post_id, 1)
+    _invalidate(slug)
+    return True, like_count
+
+
+def unlike(post_id, session_id):
+    """Remove a like; returns ``(changed, like_count)``. Unliking twice is a no-op."""
+    from .models import Like
+
+    table, post, session = _quoted(Like, 'post', 'session_id')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {post} = %s AND {session} = %s', [post_id, session_id])
+        if cursor.rowcount != 1:
+            return False, _current_like_count(post_id)
+        like_count, slug = _adjust_like_count(cursor, post_id, -1)
+    _invalidate(slug)
+    return True, like_count
+
+
+def toggle(post_id, session_id):
+    """Unlike if liked, like otherwise; returns ``(liked, like_count)``"""
+    removed, like_count = unlike(post_id, session_id)
+    if removed:
+        return False, like_count
+    _, like_count = like(post_id, session_id)
+    return True, like_count
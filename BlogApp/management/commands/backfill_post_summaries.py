@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored excerpt, word count and reading time of every blog post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = summaries.backfill(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated summaries of {updated} posts.'))
@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from BlogApp import benchmark
+
+
+def _threshold(value):
+    metric, _, percent = value.partition('=')
+    if metric not in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps') or not percent:
+        raise ValueError(value)
+    return metric, float(percent)
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and report throughput and p50/p95/p99 latency for every route'
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DATASET.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f'Rows to seed (default {default})')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per route')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads per route')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route')
+        parser.add_argument('--route', action='append', default=[], help='Only run this route (repeatable)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for data and arguments')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded database for the next run')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--baseline', help='JSON report of an earlier run to compare with')
+        parser.add_argument(
+            '--threshold', type=_threshold, action='append', default=[],
+            help='Allowed regression in percent, e.g. p95_ms=20 or throughput_rps=15 (repeatable; default p95_ms=20)',
+        )
+        parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore latency changes smaller than this')
+
+    def handle(self, *args, **options):
+        uncovered = benchmark.uncovered_routes()
+        if uncovered:
+            self.stderr.write(f"Routes without a benchmark scenario: {', '.join(uncovered)}")
+
+        # Never seed the real database: use a separate one, as the test runner does
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = str(Path(settings.BASE_DIR) / 'benchmark.sqlite3')
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            from BlogApp.models import BlogPost
+
+            if not BlogPost.objects.exists():
+                benchmark.seed(
+                    {name: options[name] for name in benchmark.DATASET},
+                    seed_value=options['seed'], stdout=self.stderr,
+                )
+            dataset = benchmark.load_dataset()
+            report = benchmark.run(
+                dataset,
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                warmup=options['warmup'],
+                only=set(options['route']),
+                seed_value=options['seed'],
+                stdout=self.stderr,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            thresholds = dict(options['threshold'] or [('p95_ms', 20.0)])
+            regressions = benchmark.compare(baseline, report, thresholds, options['min_delta_ms'])
+            report['regressions'] = regressions
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            Path(options['output']).write_text(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(
+                    f"{regression['route']}: {regression['metric']} {regression['baseline']} -> "
+                    f"{regression['current']} ({regression['change_pct']}%)"
+                )
+            raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}.')
+        self.stderr.write(self.style.SUCCESS(f"Benchmarked {len(report['routes'])} routes."))
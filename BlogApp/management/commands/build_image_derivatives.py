@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import images
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/AVIF derivatives and placeholders for cover and profile images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild derivatives that are already up to date')
+
+    def handle(self, *args, **options):
+        rebuilt = images.refresh_all(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Built derivatives for {rebuilt} images.'))
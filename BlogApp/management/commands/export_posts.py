@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from BlogApp import archive
+from BlogApp.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = 'Write posts as JSON Lines or as a directory of Markdown files with front matter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help='JSONL file, "-" for stdout, or a directory for --format markdown')
+        parser.add_argument('--format', choices=['jsonl', 'markdown'], default='jsonl')
+        parser.add_argument('--published', action='store_true', help='Only published posts')
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts read per query')
+
+    def handle(self, *args, **options):
+        posts = BlogPost.objects.filter(is_published=True) if options['published'] else BlogPost.objects.all()
+        records = archive.export_records(posts, batch_size=options['batch_size'])
+        output = options['output']
+
+        if options['format'] == 'markdown':
+            if output == '-':
+                raise CommandError('Markdown export needs an output directory.')
+            count = archive.write_markdown(records, output)
+        elif output == '-':
+            count = archive.write_jsonl(records, self.stdout)
+        else:
+            with open(output, 'w', encoding='utf-8') as stream:
+                count = archive.write_jsonl(records, stream)
+
+        # Keep stdout clean when it carries the export
+        stream = self.stderr if output == '-' else self.stdout
+        stream.write(self.style.SUCCESS(f'Exported {count} posts.'))
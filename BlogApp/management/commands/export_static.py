@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import static_export
+
+
+class Command(BaseCommand):
+    help = 'Render the public pages into a static directory, rewriting only pages whose content changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Export directory (default: STATIC_EXPORT_DIR)')
+        parser.add_argument('--workers', type=int, default=None, help='Rendering processes (default: one per CPU)')
+        parser.add_argument('--force', action='store_true', help='Render every page, even if unchanged')
+
+    def handle(self, *args, **options):
+        result = static_export.export(options['output'], workers=options['workers'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {result.rendered} pages: {result.written} written, {result.unchanged} unchanged, '
+            f'{result.removed} removed, {result.failed} failed.'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Fold buffered post views into BlogPost.view_count'
+
+    def handle(self, *args, **options):
+        applied = view_counter.flush()
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} buffered views.'))
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from BlogApp import archive
+
+
+class Command(BaseCommand):
+    help = 'Create or update posts from JSON Lines or Markdown files with front matter, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='JSONL file, "-" for stdin, or a Markdown file or directory')
+        parser.add_argument('--format', choices=['jsonl', 'markdown'], default=None,
+                            help='Default: markdown for directories and .md files, otherwise jsonl')
+        parser.add_argument('--author', default=None, help='Username for records that name no author')
+        parser.add_argument('--batch-size', type=int, default=500, help='Records written per transaction')
+        related = parser.add_mutually_exclusive_group()
+        related.add_argument('--skip-related', action='store_true',
+                             help='Do not refresh related posts (run rebuild_related_posts later)')
+        related.add_argument('--rebuild-related', action='store_true',
+                             help='Recompute related posts for every post, not just the imported ones')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'markdown' if source != '-' and (Path(source).is_dir() or source.endswith('.md')) else 'jsonl'
+        if source != '-' and not Path(source).exists():
+            raise CommandError(f'{source} does not exist.')
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{result.created} created, {result.updated} updated, '
+                    f'{result.unchanged} unchanged, {result.failed} failed so far'
+                )
+
+        def run(records):
+            return archive.import_posts(
+                records, author=options['author'], batch_size=options['batch_size'],
+                refresh_related=not options['skip_related'], rebuild_related=options['rebuild_related'],
+                on_batch=progress,
+            )
+
+        if fmt == 'markdown':
+            result = run(archive.read_markdown(source))
+        elif source == '-':
+            result = run(archive.read_jsonl(sys.stdin))
+        else:
+            with open(source, encoding='utf-8') as stream:
+                result = run(archive.read_jsonl(stream, source))
+
+        for error in result.errors:
+            self.stderr.write(error)
+        if result.failed > len(result.errors):
+            self.stderr.write(f'... and {result.failed - len(result.errors)} more errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported posts: {result.created} created, {result.updated} updated, '
+            f'{result.unchanged} unchanged, {result.failed} failed.'
+        ))
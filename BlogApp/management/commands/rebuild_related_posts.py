@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import related
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-posts table for all published posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts recomputed per transaction')
+
+    def handle(self, *args, **options):
+        processed = related.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Computed related posts for {processed} posts.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored like and comment counts on every blog post'
+
+    def handle(self, *args, **options):
+        updated = counters.recount_posts()
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} posts.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored published-post counts on every category and tag'
+
+    def handle(self, *args, **options):
+        updated = counters.recount_taxonomy()
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} categories and tags.'))
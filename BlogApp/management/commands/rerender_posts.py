@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from BlogApp import rendering
+
+
+class Command(BaseCommand):
+    help = 'Re-render the stored HTML of blog posts whose body or render pipeline changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--force', action='store_true', help='Re-render every post, even if up to date')
+
+    def handle(self, *args, **options):
+        updated = rendering.rerender(batch_size=options['batch_size'], force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Re-rendered {updated} posts.'))
@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from BlogApp import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (mail, uploads, image derivatives)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due instead of polling')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Exit after running this many jobs')
+        parser.add_argument('--poll-interval', type=float, default=None, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        stopping = []
+
+        def stop(signum, frame):
+            # Finish the current job, then exit
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        processed = jobs.work(
+            once=options['once'],
+            max_jobs=options['max_jobs'],
+            poll_interval=options['poll_interval'],
+            should_stop=lambda: bool(stopping),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Ran {processed} jobs.'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0004_contactpage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewCountDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_count_deltas', to='BlogApp.blogpost')),
+            ],
+        ),
+    ]
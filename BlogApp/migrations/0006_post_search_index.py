@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from BlogApp import search
+
+
+def create_search_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    search.rebuild_index(apps.get_model('BlogApp', 'BlogPost'))
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0005_viewcountdelta'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
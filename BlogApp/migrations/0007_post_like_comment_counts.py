@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:29
+
+from django.db import migrations, models
+
+from BlogApp.counters import count_subquery
+
+
+def backfill_counts(apps, schema_editor):
+    BlogPost = apps.get_model('BlogApp', 'BlogPost')
+    Comment = apps.get_model('BlogApp', 'Comment')
+    Like = apps.get_model('BlogApp', 'Like')
+    BlogPost.objects.update(
+        like_count=count_subquery(Like.objects.all()),
+        comment_count=count_subquery(Comment.objects.filter(is_approved=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0006_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, help_text='Approved comments'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
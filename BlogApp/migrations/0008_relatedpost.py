@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from BlogApp import related
+
+
+def backfill_related_posts(apps, schema_editor):
+    related.rebuild_all(apps.get_model('BlogApp', 'BlogPost'), apps.get_model('BlogApp', 'RelatedPost'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0007_post_like_comment_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='BlogApp.blogpost')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_from', to='BlogApp.blogpost')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['post', '-score'], name='BlogApp_rel_post_id_cb1ee9_idx')],
+                'unique_together': {('post', 'related')},
+            },
+        ),
+        migrations.RunPython(backfill_related_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:39
+
+from django.db import migrations, models
+
+from BlogApp.summaries import backfill
+
+
+def backfill_summaries(apps, schema_editor):
+    backfill(apps.get_model('BlogApp', 'BlogPost'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0008_relatedpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='reading_time',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:42
+
+from django.db import migrations, models
+
+from BlogApp.rendering import rerender
+
+
+def render_posts(apps, schema_editor):
+    rerender(apps.get_model('BlogApp', 'BlogPost'), force=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0009_post_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_posts, migrations.RunPython.noop),
+    ]
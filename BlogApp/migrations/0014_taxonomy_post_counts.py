@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+from BlogApp.counters import recount_taxonomy
+
+
+def backfill_counts(apps, schema_editor):
+    recount_taxonomy(
+        apps.get_model('BlogApp', 'Category'),
+        apps.get_model('BlogApp', 'Tag'),
+        apps.get_model('BlogApp', 'BlogPost'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0013_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
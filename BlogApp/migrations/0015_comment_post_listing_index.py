@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0014_taxonomy_post_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at', '-id'], name='blogapp_comment_post_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BlogApp', '0015_comment_post_listing_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='blogpost',
+            name='BlogApp_blo_is_publ_85587b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='blogpost',
+            name='BlogApp_blo_slug_1e349a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='relatedpost',
+            name='BlogApp_rel_post_id_cb1ee9_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='like',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='savedpost',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', '-id'], name='blogapp_post_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-created_at', '-id'], name='blogapp_post_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_featured', True), ('is_published', True)), fields=['-created_at', '-id'], name='blogapp_post_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-view_count'], name='blogapp_post_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['-created_at', '-id'], name='blogapp_comment_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relatedpost',
+            index=models.Index(fields=['post', '-score', 'related'], name='blogapp_related_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedpost',
+            index=models.Index(fields=['user', '-saved_at'], name='blogapp_savedpost_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('post', 'session_id'), name='blogapp_like_post_visitor_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='savedpost',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='blogapp_savedpost_user_post_uniq'),
+        ),
+    ]
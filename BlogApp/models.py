@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.urls import reverse
@@ -9,7 +9,10 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True)
+    # Published posts, kept current by signals.py (see counters.py)
+    post_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -30,7 +33,10 @@ class Category(models.Model):
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True, blank=True)
+    # Published posts, kept current by signals.py (see counters.py)
+    post_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
@@ -51,23 +57,46 @@ class BlogPost(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     content = models.TextField(help_text="Use Markdown or HTML for formatting")
+    # Derived from content on save, see rendering.py and summaries.py
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveIntegerField(default=0, editable=False, help_text="Minutes")
     cover_image = models.ImageField(upload_to='blog_covers/', blank=True, null=True)
+    # Resized WebP/AVIF copies and placeholder, see images.py
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='posts')
     tags = models.ManyToManyField(Tag, blank=True, related_name='posts')
     is_published = models.BooleanField(default=False)
     is_featured = models.BooleanField(default=False)
     view_count = models.PositiveIntegerField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0, help_text="Approved comments")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
 
+    # Maintained with F() updates elsewhere (see counters.py and view_counter.py),
+    # so a regular save() must never write back a stale in-memory value.
+    COUNTER_FIELDS = ('view_count', 'like_count', 'comment_count')
+
     class Meta:
         ordering = ['-created_at']
+        # One per hot access path, see PlanRegressionTest (slug is indexed by unique=True)
         indexes = [
+            # Dashboard and admin listings of every post
             models.Index(fields=['-created_at']),
-            models.Index(fields=['is_published']),
-            models.Index(fields=['slug']),
+            # Public listings, newest first with the keyset tie-breaker (see pagination.py)
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_published=True),
+                         name='blogapp_post_published_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(is_published=True),
+                         name='blogapp_post_category_idx'),
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_published=True, is_featured=True),
+                         name='blogapp_post_featured_idx'),
+            models.Index(fields=['-view_count'], condition=models.Q(is_published=True),
+                         name='blogapp_post_popular_idx'),
         ]
 
     def save(self, *args, **kwargs):
@@ -84,6 +113,23 @@ class BlogPost(models.Model):
         # Set published_at when first published
         if self.is_published and not self.published_at:
             self.published_at = timezone.now()
+
+        deferred = self.get_deferred_fields()
+        update_fields = kwargs.get('update_fields')
+        if 'content' not in deferred and (update_fields is None or 'content' in update_fields):
+            from .summaries import SUMMARY_FIELDS, summarize
+            self.render_content()
+            self.excerpt, self.word_count, self.reading_time = summarize(self.content_html)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(SUMMARY_FIELDS) | {'content_html', 'content_hash'}
+
+        if not self._state.adding and update_fields is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
         
         super().save(*args, **kwargs)
 
@@ -93,15 +139,99 @@ class BlogPost(models.Model):
     def get_absolute_url(self):
         return reverse('blog_detail', kwargs={'slug': self.slug})
 
+    def render_content(self):
+        """Refresh content_html unless it already matches the body; returns True if re-rendered"""
+        from .rendering import content_hash, render
+        digest = content_hash(self.content)
+        if self.content_hash == digest and (self.content_html or not self.content):
+            return False
+        self.content_html, self.content_hash = render(self.content), digest
+        return True
+
     def increment_views(self):
+        # Buffered and written in batches, see view_counter
+        from .view_counter import record_view
+        record_view(self.pk)
         self.view_count += 1
-        self.save(update_fields=['view_count'])
 
     def get_like_count(self):
-        return self.likes.count()
+        return self.like_count
 
     def get_comment_count(self):
-        return self.comments.count()
+        return self.comment_count
+
+
+class RelatedPost(models.Model):
+    """Precomputed neighbour of a post, see related.py"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_from')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ['post', 'related']
+        indexes = [
+            # related_posts() orders by score, then the related post's id
+            models.Index(fields=['post', '-score', 'related'], name='blogapp_related_post_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.related_id} related to {self.post_id} ({self.score:.2f})"
+
+
+class ViewCountDelta(models.Model):
+    """Views spilled by a worker that are not yet folded into BlogPost.view_count"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='view_count_deltas')
+    count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"+{self.count} views on post {self.post_id}"
+
+
+class Job(models.Model):
+    """A unit of background work run by ``manage.py run_worker``, see jobs.py"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='blogapp_job_claim_idx'),
+        ]
+        constraints = [
+            # At most one waiting job per key; a running one may have read stale state
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='blogapp_job_unique_queued_dedup_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
 
 
 class Comment(models.Model):
@@ -114,23 +244,45 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A post's comments, newest first (keyset pages, see pagination.py). is_approved
+            # is left out: SQLite cannot use a bare boolean term as an index equality.
+            models.Index(fields=['post', '-created_at', '-id'], name='blogapp_comment_post_idx'),
+            # All approved comments, newest first (/api/comments/)
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_approved=True),
+                         name='blogapp_comment_approved_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.name} on {self.post.title}"
 
+    def save(self, *args, **kwargs):
+        # Keep the row and BlogPost.comment_count in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Like(models.Model):
     post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='likes')
+    # Anonymous visitor id from BlogApp.visitors (older rows hold a session key)
     session_id = models.CharField(max_length=40, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ['post', 'session_id']
         ordering = ['-created_at']
+        constraints = [
+            # Also the index for a post's likes; a visitor's likes use session_id's own index
+            models.UniqueConstraint(fields=['post', 'session_id'], name='blogapp_like_post_visitor_uniq'),
+        ]
 
     def __str__(self):
         return f"Like on {self.post.title} by session {self.session_id[:8]}..."
 
+    def save(self, *args, **kwargs):
+        # Keep the row and BlogPost.like_count in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class SavedPost(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_posts')
@@ -138,8 +290,14 @@ class SavedPost(models.Model):
     saved_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ['user', 'post']
         ordering = ['-saved_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='blogapp_savedpost_user_post_uniq'),
+        ]
+        indexes = [
+            # A reader's saved posts, most recent first
+            models.Index(fields=['user', '-saved_at'], name='blogapp_savedpost_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} saved {self.post.title}"
@@ -204,6 +362,7 @@ class AboutPage(models.Model):
         blank=True
     )
     profile_image = models.ImageField(upload_to='about/', blank=True, null=True)
+    profile_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     topics = models.TextField(
         help_text="List of topics you write about (one per line)",
         default="Web Development\nSoftware Engineering\nTechnology Trends\nPersonal Projects\nLearning Experiences",
@@ -0,0 +1,144 @@
+"""
+Full-page cache for anonymous readers.
+
+Views wrapped in ``cache_anonymous_page`` are served straight from the cache
+for GET requests from visitors who are logged out and carry no session or
+flash-message cookie. Pages are keyed on path and query string and belong to
+one or more invalidation groups (``home``, ``list``, ``about`` or
+``post:<slug>``). Each group has a version stored in the cache and
+``invalidate()`` simply replaces it, so only pages in the affected groups
+are dropped. The receivers in ``signals.py`` decide which groups a model
+change touches.
+
+CSRF tokens are not shared between visitors: every cached form token is
+replaced with a fresh one for the current request on a hit. Entries also
+keep the compressed form of the page (``compression.precompress``), so the
+compression middleware does not compress a hit again.
+
+Invalidation goes through the cache itself, so every worker must share the
+cache backend: settings default to the database cache unless ``DEBUG`` is on
+(see ``CACHES``).
+"""
+import functools
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from .compression import precompress
+
+
+KEY_PREFIX = 'page'
+VERSION_PREFIX = 'page_version'
+
+_CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TTL', 300)
+
+
+def is_cacheable_request(request):
+    """Only logged-out, session-less GET/HEAD requests share cached pages"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if getattr(request, 'user', None) is not None and request.user.is_authenticated:
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES or 'messages' in request.COOKIES:
+        return False
+    return True
+
+
+def _versions(groups):
+    keys = [f'{VERSION_PREFIX}:{group}' for group in groups]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [str(versions[key]) for key in keys]
+
+
+def _page_key(request, groups, variant=''):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return ':'.join([KEY_PREFIX, path, variant] + _versions(groups))
+
+
+def post_groups(post):
+    """The listing pages plus the detail pages that show ``post``"""
+    from .models import RelatedPost
+
+    showing = RelatedPost.objects.filter(related=post).values_list('post__slug', flat=True)
+    return ['home', 'list', f'post:{post.slug}'] + [f'post:{slug}' for slug in showing]
+
+
+def invalidate(*groups):
+    """Drop every cached page belonging to any of ``groups``"""
+    if groups:
+        now = time.time_ns()
+        cache.set_many({f'{VERSION_PREFIX}:{group}': now for group in groups}, None)
+
+
+def _with_fresh_csrf_token(request, content):
+    if b'csrfmiddlewaretoken' not in content:
+        return content
+    token = get_token(request).encode()
+    return _CSRF_INPUT_RE.sub(lambda match: match.group(1) + token + match.group(2), content)
+
+
+def cache_anonymous_page(groups, on_hit=None, variant=None):
+    """
+    Cache a view's response for anonymous visitors.
+
+    ``groups`` is a callable taking the view's arguments and returning the
+    invalidation groups for the page. A view may set ``page_cache_meta`` on
+    its response; that dict is stored with the page and passed to
+    ``on_hit(request, meta)`` whenever the page is served from the cache.
+    ``variant``, if given, takes the same arguments and returns a short
+    string for the parts of the page that differ between visitors (for
+    example whether they liked the post); each value is cached separately.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            key = _page_key(
+                request,
+                groups(request, *args, **kwargs),
+                variant(request, *args, **kwargs) if variant else '',
+            )
+            entry = cache.get(key)
+            if entry is not None:
+                if on_hit is not None:
+                    on_hit(request, entry['meta'])
+                response = HttpResponse(
+                    _with_fresh_csrf_token(request, entry['content']),
+                    status=entry['status'],
+                    content_type=entry['content_type'],
+                )
+                response.precompressed = entry.get('compressed')
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                response.precompressed = precompress(response.content)
+                cache.set(key, {
+                    'content': response.content,
+                    'compressed': response.precompressed,
+                    'status': response.status_code,
+                    'content_type': response['Content-Type'],
+                    'meta': getattr(response, 'page_cache_meta', {}),
+                }, _timeout())
+                response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+"""
+Keyset (cursor) pagination for public post listings.
+
+Page-number pagination runs a COUNT(*) and an OFFSET that grows with the page
+number. Keyset pagination instead remembers the ``(created_at, id)`` of the
+last row shown and asks for rows strictly after it, so every page is one
+indexed range scan of ``page_size + 1`` rows no matter how deep it is.
+
+Cursors are opaque URL-safe strings; they are used by ``blog_list`` (with
+``?cursor=``) and by ``api_views.BlogPostCursorPagination`` for
+``/api/posts/``.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk, backwards=False):
+    raw = f"{'p' if backwards else 'n'}|{value.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, pk, backwards)`` for a cursor string"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, value, pk = raw.split('|')
+        created_at = parse_datetime(value)
+        if direction not in ('n', 'p') or created_at is None:
+            raise ValueError
+        return created_at, int(pk), direction == 'p'
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+class KeysetPage:
+    """One page of results plus the cursors of its neighbours"""
+
+    def __init__(self, items, next_cursor, previous_cursor):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_keyset(queryset, cursor=None, page_size=10, field='created_at'):
+    """
+    Return a KeysetPage of ``queryset`` ordered newest first by ``(field, pk)``.
+
+    Any ordering already on the queryset is replaced. Raises InvalidCursor
+    for a malformed cursor.
+    """
+    backwards = False
+    if cursor:
+        value, pk, backwards = decode_cursor(cursor)
+        if backwards:
+            queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+        else:
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+
+    if backwards:
+        queryset = queryset.order_by(field, 'pk')
+    else:
+        queryset = queryset.order_by(f'-{field}', '-pk')
+
+    items = list(queryset[:page_size + 1])
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if backwards:
+        items.reverse()
+
+    if not items:
+        return KeysetPage([], None, None)
+
+    first, last = items[0], items[-1]
+    # Moving forwards there is always a way back (and vice versa) once a cursor was used
+    more_after = has_more if not backwards else True
+    more_before = has_more if backwards else bool(cursor)
+    return KeysetPage(
+        items,
+        encode_cursor(getattr(last, field), last.pk) if more_after else None,
+        encode_cursor(getattr(first, field), first.pk, backwards=True) if more_before else None,
+    )
+
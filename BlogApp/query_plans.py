@@ -0,0 +1,79 @@
+"""
+Query plan inspection for the hot read paths.
+
+``captured_selects()`` records the SELECT statements a block of code runs,
+``explain()`` returns the plan of one of them on the current database and
+``plan_problems()`` names what an index should have avoided: a full scan of
+one of the given tables, or a sort for ``ORDER BY``. ``PlanRegressionTest``
+runs every hot page and API route through them, so a queryset or index
+change that loses an access path fails a test instead of a production page.
+
+Plans are read from ``EXPLAIN QUERY PLAN`` on SQLite and ``EXPLAIN`` on
+PostgreSQL. Test tables are tiny, and PostgreSQL rightly prefers reading a
+few pages sequentially to using any index, so sequential scans and sorts are
+disabled for the statement: it then only uses them when no index can do the
+job, which is exactly what the checks are after. SQLite plans by the shape
+of the query alone. Other backends are not supported.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connections, transaction
+
+
+SUPPORTED_VENDORS = ('sqlite', 'postgresql')
+
+_SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(.*)$')
+_SQLITE_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF |LAST TERM OF )?ORDER BY')
+_PG_SCAN_RE = re.compile(r'Seq Scan on "?(\w+)"?')
+_PG_SORT_RE = re.compile(r'(?:^|->\s+)(?:Incremental )?Sort\s+\(')
+
+
+@contextmanager
+def captured_selects(using='default'):
+    """Collect ``(sql, params)`` of every single SELECT run in the block"""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        yield queries
+
+
+def explain(sql, params=(), using='default'):
+    """The plan of a statement as a list of lines"""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+    raise NotImplementedError(f'Query plans are not supported on {connection.vendor}')
+
+
+def plan_problems(plan, tables, vendor='sqlite'):
+    """Full scans of ``tables`` and ``ORDER BY`` sorts in ``plan``"""
+    tables = {table.lower() for table in tables}
+    problems = []
+    for line in plan:
+        if vendor == 'sqlite':
+            scan = _SQLITE_SCAN_RE.match(line.strip())
+            if scan and scan.group(1).lower() in tables and 'INDEX' not in scan.group(2):
+                problems.append(f'full scan of {scan.group(1)}')
+            if _SQLITE_SORT_RE.search(line):
+                problems.append('sort')
+        else:
+            scan = _PG_SCAN_RE.search(line)
+            if scan and scan.group(1).lower() in tables:
+                problems.append(f'full scan of {scan.group(1)}')
+            if _PG_SORT_RE.search(line.strip()):
+                problems.append('sort')
+    return problems
@@ -0,0 +1,223 @@
+"""
+Precomputed related posts.
+
+Each published post stores its best ``RELATED_POSTS_STORED`` neighbours in the
+``RelatedPost`` table, scored from shared tags, a shared category and keyword
+overlap of the title and body. The detail page and
+``/api/posts/{slug}/related/`` then need a single indexed lookup instead of
+an OR/DISTINCT join per request.
+
+Scores are refreshed incrementally from ``signals.py`` when a post or its
+tags change, once per post when the transaction commits: the post's own
+list is recomputed, the post is re-scored in the lists of its candidates,
+and lists it dropped out of are refilled from their own candidates.
+``manage.py rebuild_related_posts`` recomputes everything, a batch of posts
+at a time, each scored against the same bounded candidates as on a save.
+"""
+import html
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.html import strip_tags
+
+
+RELATED_POSTS_STORED = 6
+
+# Candidates are bounded so a save never scores the whole archive
+MAX_CANDIDATES = 300
+RECENT_CANDIDATES = 50
+
+TAG_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.2
+TEXT_WEIGHT = 0.3
+KEYWORDS_PER_POST = 30
+
+_WORD_RE = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+_STOP_WORDS = frozenset("""
+    about after again also among and any are because been before being between both but
+    can could did does doing down during each few for from further had has have having
+    her here hers him his how into its itself just more most much must not now off once
+    only other our ours out over own same she should some such than that the their theirs
+    them then there these they this those through too under until very was were what when
+    where which while who whom why will with would you your yours
+""".split())
+
+
+def keywords(post):
+    """Most frequent meaningful words of a post, title words counted three times"""
+    counts = Counter()
+    for weight, text in ((3, post.title or ''), (1, html.unescape(strip_tags(post.content or '')))):
+        for word in _WORD_RE.findall(text.lower()):
+            if word not in _STOP_WORDS:
+                counts[word] += weight
+    return {word for word, _ in counts.most_common(KEYWORDS_PER_POST)}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Profile:
+    __slots__ = ('pk', 'category_id', 'tags', 'words')
+
+    def __init__(self, post):
+        self.pk = post.pk
+        self.category_id = post.category_id
+        self.tags = {tag.pk for tag in post.tags.all()}
+        self.words = keywords(post)
+
+
+def score(a, b):
+    value = TAG_WEIGHT * _jaccard(a.tags, b.tags) + TEXT_WEIGHT * _jaccard(a.words, b.words)
+    if a.category_id is not None and a.category_id == b.category_id:
+        value += CATEGORY_WEIGHT
+    return round(value, 6)
+
+
+def _candidates(post_model, post):
+    published = post_model.objects.filter(is_published=True).exclude(pk=post.pk).only(
+        'pk', 'title', 'content', 'category_id'
+    ).prefetch_related('tags').order_by('-created_at')
+    overlap = Q(tags__in=[tag.pk for tag in post.tags.all()])
+    if post.category_id is not None:
+        overlap |= Q(category_id=post.category_id)
+    sharing = published.filter(overlap).distinct()[:MAX_CANDIDATES]
+    recent = published[:RECENT_CANDIDATES]
+    return {candidate.pk: candidate for candidate in list(sharing) + list(recent)}.values()
+
+
+def _scored(post_model, post):
+    """``(score, candidate_id)`` of every candidate sharing something with ``post``, best first"""
+    profile = _Profile(post)
+    scored = []
+    for candidate in _candidates(post_model, post):
+        value = score(profile, _Profile(candidate))
+        if value > 0:
+            scored.append((value, candidate.pk))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored
+
+
+def _trim(related_model, post_ids):
+    """Keep only the best RELATED_POSTS_STORED rows for each of ``post_ids``"""
+    rows = related_model.objects.filter(post_id__in=post_ids).order_by('post_id', '-score', 'related_id')
+    kept = Counter()
+    extra = []
+    for row_id, post_id in rows.values_list('id', 'post_id'):
+        kept[post_id] += 1
+        if kept[post_id] > RELATED_POSTS_STORED:
+            extra.append(row_id)
+    if extra:
+        related_model.objects.filter(id__in=extra).delete()
+
+
+def update_post(post, post_model=None, related_model=None):
+    """
+    Refresh the related-post rows involving ``post``.
+
+    Returns the ids of other posts whose stored neighbours changed.
+    """
+    if post_model is None:
+        from .models import BlogPost as post_model
+    if related_model is None:
+        from .models import RelatedPost as related_model
+
+    # Lists that currently mention the post may lose it
+    affected = set(related_model.objects.filter(related_id=post.pk).values_list('post_id', flat=True))
+    related_model.objects.filter(Q(post_id=post.pk) | Q(related_id=post.pk)).delete()
+    if not post.is_published:
+        refill(affected, post_model, related_model)
+        return affected
+
+    scored = _scored(post_model, post)
+    rows = [
+        related_model(post_id=post.pk, related_id=candidate_id, score=value)
+        for value, candidate_id in scored[:RELATED_POSTS_STORED]
+    ]
+    # The post may now belong in its candidates' lists too
+    rows += [
+        related_model(post_id=candidate_id, related_id=post.pk, score=value)
+        for value, candidate_id in scored
+    ]
+    related_model.objects.bulk_create(rows)
+
+    candidate_ids = {candidate_id for _, candidate_id in scored}
+    _trim(related_model, candidate_ids)
+    refill(affected - candidate_ids, post_model, related_model)
+    return affected | candidate_ids
+
+
+def refill(post_ids, post_model=None, related_model=None):
+    """
+    Recompute the lists of ``post_ids`` that hold fewer than
+    ``RELATED_POSTS_STORED`` rows, after a neighbour was removed from them.
+
+    Returns the ids of the posts recomputed.
+    """
+    if post_model is None:
+        from .models import BlogPost as post_model
+    if related_model is None:
+        from .models import RelatedPost as related_model
+
+    full = set(
+        related_model.objects.filter(post_id__in=post_ids).values('post_id')
+        .annotate(rows=Count('id')).filter(rows__gte=RELATED_POSTS_STORED).values_list('post_id', flat=True)
+    )
+    short = post_model.objects.filter(pk__in=set(post_ids) - full, is_published=True).only(
+        'pk', 'title', 'content', 'category_id'
+    ).prefetch_related('tags')
+    refilled = set()
+    for post in short:
+        related_model.objects.filter(post_id=post.pk).delete()
+        related_model.objects.bulk_create(
+            related_model(post_id=post.pk, related_id=candidate_id, score=value)
+            for value, candidate_id in _scored(post_model, post)[:RELATED_POSTS_STORED]
+        )
+        refilled.add(post.pk)
+    return refilled
+
+
+def rebuild_all(post_model=None, related_model=None, batch_size=500):
+    """Recompute related posts for every published post; returns posts processed"""
+    if post_model is None:
+        from .models import BlogPost as post_model
+    if related_model is None:
+        from .models import RelatedPost as related_model
+
+    related_model.objects.exclude(post__is_published=True).delete()
+    published = post_model.objects.filter(is_published=True).only(
+        'pk', 'title', 'content', 'category_id'
+    ).prefetch_related('tags').order_by('pk')
+
+    # Batches of posts, each scored against its bounded candidates as on a save,
+    # so memory does not grow with the archive
+    processed = 0
+    last_pk = None
+    while True:
+        batch = published if last_pk is None else published.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return processed
+        rows = [
+            related_model(post_id=post.pk, related_id=candidate_id, score=value)
+            for post in batch
+            for value, candidate_id in _scored(post_model, post)[:RELATED_POSTS_STORED]
+        ]
+        with transaction.atomic():
+            related_model.objects.filter(post_id__in=[post.pk for post in batch]).delete()
+            related_model.objects.bulk_create(rows)
+        processed += len(batch)
+        last_pk = batch[-1].pk
+
+
+def related_posts(post, limit=3):
+    """Published neighbours of ``post``, best first, in one indexed query"""
+    from .models import BlogPost
+
+    return BlogPost.objects.filter(
+        related_from__post=post, is_published=True
+    ).order_by('-related_from__score', 'related_from__related_id')[:limit]
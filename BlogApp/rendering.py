@@ -0,0 +1,318 @@
+"""
+Server-side rendering of post bodies.
+
+``render()`` turns the stored ``content`` into the HTML shown on the detail
+page: Markdown is converted (unless the body is already HTML), the result
+is passed through an allowlist sanitizer built on ``html.parser``, headings
+get stable ``id`` anchors and ``<pre>`` blocks are highlighted with Pygments
+(when installed; otherwise they keep their ``language-*`` class and Prism
+highlights them in the browser).
+
+``BlogPost.save()`` stores the output in ``content_html`` together with
+``content_hash``, a digest of the body and ``RENDERER_VERSION``, so the
+pipeline runs once per edit instead of once per reader. Bump
+``RENDERER_VERSION`` when the output changes and run
+``manage.py rerender_posts``.
+"""
+import functools
+import hashlib
+import re
+from html import escape
+from html.parser import HTMLParser
+
+import markdown
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .summaries import SUMMARY_FIELDS, summarize
+
+try:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError:
+    highlight = None
+
+
+RENDERER_VERSION = 2
+
+ALLOWED_TAGS = frozenset("""
+    a abbr b blockquote br caption code col colgroup dd del div dl dt em figcaption figure
+    font h1 h2 h3 h4 h5 h6 hr i img ins kbd li mark ol p pre q s small span strike strong
+    sub sup table tbody td tfoot th thead tr u ul
+""".split())
+
+# Tags dropped together with everything inside them
+DROPPED_CONTENT_TAGS = frozenset(
+    'script style iframe object embed template noscript textarea select button form svg math'.split()
+)
+
+VOID_TAGS = frozenset('br col hr img'.split())
+
+GLOBAL_ATTRIBUTES = frozenset(['class', 'title', 'style', 'dir', 'lang'])
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height', 'loading'},
+    'td': {'colspan', 'rowspan', 'align'},
+    'th': {'colspan', 'rowspan', 'align', 'scope'},
+    'ol': {'start', 'type'},
+    'font': {'color', 'face', 'size'},
+    'col': {'span'},
+    'colgroup': {'span'},
+}
+
+URL_ATTRIBUTES = frozenset(['href', 'src'])
+ALLOWED_SCHEMES = frozenset(['http', 'https', 'mailto'])
+_DATA_IMAGE_RE = re.compile(r'^data:image/(png|jpe?g|gif|webp);base64,', re.IGNORECASE)
+_SCHEME_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.\-]*):')
+_UNSAFE_STYLE_RE = re.compile(r'expression|url\s*\(|javascript:|@import|behavior', re.IGNORECASE)
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x20]+')
+
+HEADING_TAGS = frozenset('h1 h2 h3 h4 h5 h6'.split())
+_LANGUAGE_CLASS_RE = re.compile(r'\b(?:language|lang)-([\w+#.-]+)')
+_HTML_BLOCK_RE = re.compile(r'<(?:p|div|h[1-6]|ul|ol|pre|table|blockquote|br|img)\b', re.IGNORECASE)
+
+
+def content_hash(content):
+    """Digest identifying a body as rendered by the current pipeline"""
+    return hashlib.sha256(f'{RENDERER_VERSION}:{content or ""}'.encode()).hexdigest()
+
+
+def _safe_url(value, attribute, tag):
+    url = _CONTROL_CHARS_RE.sub('', value)
+    if tag == 'img' and attribute == 'src' and _DATA_IMAGE_RE.match(url):
+        return value
+    match = _SCHEME_RE.match(url)
+    if match and match.group(1).lower() not in ALLOWED_SCHEMES:
+        return None
+    return value
+
+
+def _pygments_style():
+    return getattr(settings, 'PYGMENTS_STYLE', 'monokai')
+
+
+@functools.lru_cache(maxsize=1)
+def highlight_css():
+    """Stylesheet for server-highlighted code blocks (empty without Pygments)"""
+    if highlight is None:
+        return ''
+    return HtmlFormatter(style=_pygments_style()).get_style_defs('.post-content .highlight')
+
+
+def highlight_code(code, language):
+    """Highlighted ``<pre>`` block, or None when the language is unknown"""
+    if highlight is None or not language:
+        return None
+    try:
+        lexer = get_lexer_by_name(language)
+    except ClassNotFound:
+        return None
+    body = highlight(code, lexer, HtmlFormatter(nowrap=True, style=_pygments_style()))
+    return f'<pre class="highlight" data-language="{escape(language)}"><code>{body}</code></pre>'
+
+
+class _Sanitizer(HTMLParser):
+    """Re-serialize HTML keeping only allowlisted tags and attributes"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        self.dropping = []
+        self.heading = None
+        self.pre = None
+        self.anchors = set()
+
+    # Output helpers
+
+    def _emit(self, text):
+        if self.pre is not None:
+            self.pre['parts'].append(text)
+        else:
+            self.out.append(text)
+
+    def _attributes(self, tag, attrs):
+        allowed = GLOBAL_ATTRIBUTES | ALLOWED_ATTRIBUTES.get(tag, set())
+        cleaned = []
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES:
+                value = _safe_url(value, name, tag)
+                if value is None:
+                    continue
+            if name == 'style' and _UNSAFE_STYLE_RE.search(value):
+                continue
+            cleaned.append((name, value))
+        if tag == 'a' and any(name == 'target' for name, _ in cleaned):
+            cleaned = [(name, value) for name, value in cleaned if name != 'rel']
+            cleaned.append(('rel', 'noopener noreferrer'))
+        return cleaned
+
+    @staticmethod
+    def _start_tag(tag, attrs):
+        rendered = ''.join(f' {name}="{escape(value)}"' for name, value in attrs)
+        return f'<{tag}{rendered}>'
+
+    # Parser callbacks
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping:
+            if tag == self.dropping[-1]:
+                self.dropping.append(tag)
+            return
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping.append(tag)
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+
+        attrs = self._attributes(tag, attrs)
+        if self.pre is not None:
+            # Markup inside code blocks only contributes its text and language
+            if tag == 'code':
+                self.pre['classes'].append(dict(attrs).get('class', ''))
+            elif tag == 'br':
+                self.pre['text'].append('\n')
+            self._emit(self._start_tag(tag, attrs))
+            if tag not in VOID_TAGS:
+                self.open_tags.append(tag)
+            return
+
+        if tag == 'pre':
+            self.pre = {
+                'attrs': attrs, 'classes': [dict(attrs).get('class', '')],
+                'text': [], 'parts': [], 'depth': len(self.open_tags),
+            }
+            self.open_tags.append(tag)
+            return
+
+        if tag in HEADING_TAGS and self.heading is None:
+            attrs = [(name, value) for name, value in attrs if name != 'id']
+            self.heading = {'tag': tag, 'text': [], 'index': len(self.out), 'attrs': attrs}
+            self.out.append(None)
+        else:
+            self.out.append(self._start_tag(tag, attrs))
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag == self.dropping[-1]:
+                self.dropping.pop()
+            return
+        if tag not in self.open_tags:
+            return
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self._close(current)
+            if current == tag:
+                break
+
+    def _close(self, tag):
+        if tag == 'pre' and self.pre is not None and len(self.open_tags) == self.pre['depth']:
+            self._close_pre()
+        elif self.heading is not None and tag == self.heading['tag']:
+            self._close_heading()
+        else:
+            self._emit(f'</{tag}>')
+
+    def _close_pre(self):
+        pre, self.pre = self.pre, None
+        language = None
+        for classes in pre['classes']:
+            match = _LANGUAGE_CLASS_RE.search(classes or '')
+            if match:
+                language = match.group(1).lower()
+        highlighted = highlight_code(''.join(pre['text']), language)
+        if highlighted is not None:
+            self.out.append(highlighted)
+        else:
+            self.out.append(self._start_tag('pre', pre['attrs']) + ''.join(pre['parts']) + '</pre>')
+
+    def _close_heading(self):
+        heading, self.heading = self.heading, None
+        base = slugify(''.join(heading['text'])) or 'section'
+        anchor, counter = base, 1
+        while anchor in self.anchors:
+            counter += 1
+            anchor = f'{base}-{counter}'
+        self.anchors.add(anchor)
+        self.out[heading['index']] = self._start_tag(heading['tag'], [('id', anchor)] + heading['attrs'])
+        self.out.append(
+            f'<a class="heading-anchor" href="#{anchor}" aria-label="Link to this section">#</a>'
+            f'</{heading["tag"]}>'
+        )
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        if self.pre is not None:
+            self.pre['text'].append(data)
+        elif self.heading is not None:
+            self.heading['text'].append(data)
+        self._emit(escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self._close(self.open_tags.pop())
+        return ''.join(part for part in self.out if part is not None)
+
+
+def sanitize(html):
+    """Allowlist-sanitize ``html``, adding heading anchors and code highlighting"""
+    parser = _Sanitizer()
+    parser.feed(html or '')
+    return parser.close()
+
+
+def to_html(content):
+    """Convert a Markdown or plain-text body to HTML; HTML passes through"""
+    content = content or ''
+    if _HTML_BLOCK_RE.search(content):
+        return content
+    return markdown.markdown(content, extensions=['fenced_code', 'tables'])
+
+
+def render(content):
+    """Full pipeline: Markdown, sanitizing, heading anchors and highlighting"""
+    return sanitize(to_html(content))
+
+
+def rerender(post_model=None, batch_size=200, force=False):
+    """Re-render posts whose stored HTML is stale (or all with ``force``)"""
+    if post_model is None:
+        from .models import BlogPost as post_model
+
+    # Summaries are derived from the rendered body, so they are refreshed too;
+    # bulk_update() skips auto_now, and conditional GETs are validated on updated_at
+    fields = ['content_html', 'content_hash', *SUMMARY_FIELDS, 'updated_at']
+    updated = 0
+    batch = []
+    posts = post_model.objects.only('pk', 'content', 'content_hash').order_by('pk')
+    for post in posts.iterator(chunk_size=batch_size):
+        digest = content_hash(post.content)
+        if not force and post.content_hash == digest:
+            continue
+        post.content_html, post.content_hash = render(post.content), digest
+        post.excerpt, post.word_count, post.reading_time = summarize(post.content_html)
+        post.updated_at = timezone.now()
+        batch.append(post)
+        if len(batch) >= batch_size:
+            post_model.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+    if batch:
+        post_model.objects.bulk_update(batch, fields)
+        updated += len(batch)
+    return updated
@@ -0,0 +1,216 @@
+"""
+Full-text search over blog posts.
+
+Posts are indexed into a ranked full-text table instead of being scanned with
+``icontains`` on every search:
+
+- PostgreSQL: ``blogapp_post_search`` with a weighted ``tsvector`` column and
+  a GIN index, queried with ``websearch_to_tsquery`` and ``ts_rank``.
+- SQLite: an FTS5 virtual table ``blogapp_post_fts`` ranked with ``bm25``.
+
+Any other backend (or a SQLite build without FTS5) falls back to the old
+``icontains`` filter. The index is kept current by the receivers in
+``signals.py``; ``manage.py rebuild_search_index`` repopulates it from
+scratch. ``search_posts()`` is the one entry point shared by the HTML views
+and the API. It adds the match and the rank to the caller's queryset as SQL,
+so filters applied before or after it (published, category, tag) and the
+caller's pagination all run in the same query, over every match.
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+
+PG_TABLE = 'blogapp_post_search'
+FTS_TABLE = 'blogapp_post_fts'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _document(post):
+    """Return the (title, tags, body) text indexed for a post"""
+    tags = ' '.join(tag.name for tag in post.tags.all()) if post.pk else ''
+    body = html.unescape(strip_tags(post.content or ''))
+    return post.title or '', tags, body
+
+
+def _backend(conn=None):
+    conn = conn or connection
+    if conn.vendor == 'postgresql':
+        return 'postgresql'
+    if conn.vendor == 'sqlite':
+        if getattr(conn, '_blog_fts_available', False):
+            return 'sqlite'
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            if cursor.fetchone():
+                conn._blog_fts_available = True
+                return 'sqlite'
+    return None
+
+
+def create_index(schema_editor):
+    """Create the full-text table for the current database (used by migrations)"""
+    from .models import BlogPost
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        post_table = schema_editor.quote_name(BlogPost._meta.db_table)
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {PG_TABLE} ('
+            f'post_id bigint PRIMARY KEY REFERENCES {post_table} (id) ON DELETE CASCADE, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {PG_TABLE}_document_gin ON {PG_TABLE} USING GIN (document)'
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(title, tags, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite built without FTS5: search falls back to icontains
+            pass
+
+
+def drop_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {PG_TABLE}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def index_post(post):
+    """Add or refresh a post in the search index"""
+    index_posts([post])
+
+
+def index_posts(posts):
+    """Add or refresh several posts in the search index with one statement per step"""
+    backend = _backend()
+    if backend is None:
+        return
+
+    rows = [(post.pk, *_document(post)) for post in posts if post.pk is not None]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        if backend == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {PG_TABLE} (post_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('english', %s), 'A') || "
+                f"setweight(to_tsvector('english', %s), 'B') || "
+                f"setweight(to_tsvector('english', %s), 'C')) "
+                f"ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+        else:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, tags, body) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+
+def remove_post(post_id):
+    """Drop a post from the search index"""
+    if _backend() == 'sqlite':
+        # Virtual tables have no foreign keys, so nothing cascades
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild_index(post_model=None, batch_size=500):
+    """Re-index every post; returns the number of posts indexed"""
+    if post_model is None:
+        from .models import BlogPost as post_model
+
+    if _backend() is None:
+        return 0
+
+    count = 0
+    posts = post_model.objects.prefetch_related('tags').order_by('pk')
+    for start in range(0, posts.count(), batch_size):
+        batch = list(posts[start:start + batch_size])
+        index_posts(batch)
+        count += len(batch)
+    return count
+
+
+def _fts5_query(query):
+    # Quote every word so user input can't inject FTS5 syntax, and match
+    # prefixes so "djan" still finds "django" like the old icontains did.
+    tokens = _TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+class _Rank(Func):
+    """Full-text rank of the outer row's post, looked up by primary key"""
+
+    output_field = FloatField()
+
+    def __init__(self, sql, params):
+        super().__init__(F('pk'))
+        self.rank_sql = sql
+        self.rank_params = params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk_sql, pk_params = compiler.compile(self.source_expressions[0])
+        return self.rank_sql.replace('%(pk)s', pk_sql), [*self.rank_params, *pk_params]
+
+
+def _match(query):
+    """
+    ``(pk__in subquery, rank expression, ordering)`` for ``query``, or None
+    if the database has no full-text index.
+
+    The subquery is None when the query has no words to search for.
+    """
+    backend = _backend()
+    if backend is None:
+        return None
+    if backend == 'postgresql':
+        tsquery = "websearch_to_tsquery('english', %s)"
+        matching = RawSQL(f'SELECT post_id FROM {PG_TABLE} WHERE document @@ {tsquery}', [query])
+        rank = _Rank(f'(SELECT ts_rank(document, {tsquery}) FROM {PG_TABLE} WHERE post_id = %(pk)s)', [query])
+        return matching, rank, '-search_rank'
+    match = _fts5_query(query)
+    if not match:
+        return None, None, None
+    matching = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    rank = _Rank(
+        f'(SELECT bm25({FTS_TABLE}, 10.0, 5.0, 1.0) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = %(pk)s)',
+        [match],
+    )
+    # bm25 is lower for better matches
+    return matching, rank, 'search_rank'
+
+
+def search_posts(queryset, query):
+    """Narrow a BlogPost queryset to posts matching ``query``, best match first"""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    matched = _match(query)
+    if matched is None:
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(content__icontains=query) |
+            Q(tags__name__icontains=query)
+        ).distinct()
+
+    matching, rank, ordering = matched
+    if matching is None:
+        return queryset.none()
+    return queryset.filter(pk__in=matching).annotate(search_rank=rank).order_by(ordering, '-pk')
@@ -1,8 +1,43 @@
 from rest_framework import serializers
+from .images import is_current, output_formats, srcset
 from .models import BlogPost, Comment, Like, SavedPost, Category, Tag, ContactMessage
+from .visitors import get_visitor_id
 from django.contrib.auth.models import User
 
 
+class SparseFieldsetMixin:
+    """
+    Let API clients choose fields with ``?fields=a,b`` and/or ``?exclude=c``.
+
+    Without ``fields`` the serializer's ``default_fields`` are used, so list
+    payloads can stay compact while heavier fields remain available on request.
+    """
+    default_fields = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        selected = self.selected_fields(request.query_params if request else {})
+        for name in list(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, query_params):
+        available = list(cls.Meta.fields)
+        requested = query_params.get('fields')
+        if requested:
+            selected = [name.strip() for name in requested.split(',') if name.strip()]
+        else:
+            selected = list(cls.default_fields or available)
+        excluded = [name.strip() for name in (query_params.get('exclude') or '').split(',') if name.strip()]
+
+        unknown = sorted(set(selected + excluded) - set(available))
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}"})
+        return [name for name in selected if name not in excluded]
+
+
 class CategorySerializer(serializers.ModelSerializer):
     post_count = serializers.IntegerField(read_only=True)
 
@@ -25,38 +60,58 @@ class AuthorSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'first_name', 'last_name']
 
 
-class BlogPostListSerializer(serializers.ModelSerializer):
+class CoverImageMixin(serializers.Serializer):
+    """Responsive derivatives of the cover image (see images.py)"""
+    cover_image_srcset = serializers.SerializerMethodField()
+    cover_image_placeholder = serializers.SerializerMethodField()
+
+    def get_cover_image_srcset(self, obj):
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request else None
+        sets = {fmt: srcset(obj.cover_image, obj.cover_image_variants, fmt, build_url) for fmt in output_formats()}
+        return {fmt: value for fmt, value in sets.items() if value}
+
+    def get_cover_image_placeholder(self, obj):
+        if is_current(obj.cover_image, obj.cover_image_variants):
+            return obj.cover_image_variants.get('placeholder')
+        return None
+
+
+class BlogPostListSerializer(SparseFieldsetMixin, CoverImageMixin, serializers.ModelSerializer):
     """Serializer for blog post list (summary)"""
     author = AuthorSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    like_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
+
+    # The full body is only sent when asked for with ?fields=...,content
+    default_fields = [
+        'id', 'title', 'slug', 'excerpt', 'word_count', 'reading_time',
+        'cover_image', 'cover_image_srcset', 'cover_image_placeholder', 'author',
+        'category', 'tags', 'is_published', 'is_featured',
+        'view_count', 'like_count', 'comment_count',
+        'created_at', 'updated_at', 'published_at'
+    ]
 
     class Meta:
         model = BlogPost
         fields = [
-            'id', 'title', 'slug', 'content', 'cover_image', 'author',
+            'id', 'title', 'slug', 'content', 'content_html', 'excerpt', 'word_count', 'reading_time',
+            'cover_image', 'cover_image_srcset', 'cover_image_placeholder', 'author',
             'category', 'tags', 'is_published', 'is_featured',
             'view_count', 'like_count', 'comment_count',
             'created_at', 'updated_at', 'published_at'
         ]
-        read_only_fields = ['slug', 'view_count', 'created_at', 'updated_at', 'published_at']
-
-    def get_like_count(self, obj):
-        return obj.get_like_count()
-
-    def get_comment_count(self, obj):
-        return obj.get_comment_count()
+        read_only_fields = [
+            'slug', 'content_html', 'excerpt', 'word_count', 'reading_time', 'view_count', 'like_count', 'comment_count',
+            'created_at', 'updated_at', 'published_at'
+        ]
 
 
-class BlogPostDetailSerializer(serializers.ModelSerializer):
+class BlogPostDetailSerializer(CoverImageMixin, serializers.ModelSerializer):
     """Serializer for blog post detail (full content)"""
     author = AuthorSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
-    like_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
     user_liked = serializers.SerializerMethodField()
     user_saved = serializers.SerializerMethodField()
     cover_image_url = serializers.SerializerMethodField()
@@ -64,13 +119,17 @@ class BlogPostDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = BlogPost
         fields = [
-            'id', 'title', 'slug', 'content', 'cover_image', 'cover_image_url', 'author',
+            'id', 'title', 'slug', 'content', 'content_html', 'excerpt', 'word_count', 'reading_time',
+            'cover_image', 'cover_image_url', 'cover_image_srcset', 'cover_image_placeholder', 'author',
             'category', 'tags', 'is_published', 'is_featured',
             'view_count', 'like_count', 'comment_count',
             'user_liked', 'user_saved',
             'created_at', 'updated_at', 'published_at'
         ]
-        read_only_fields = ['slug', 'view_count', 'created_at', 'updated_at', 'published_at']
+        read_only_fields = [
+            'slug', 'content_html', 'excerpt', 'word_count', 'reading_time', 'view_count', 'like_count', 'comment_count',
+            'created_at', 'updated_at', 'published_at'
+        ]
 
     def get_cover_image_url(self, obj):
         if obj.cover_image:
@@ -80,18 +139,13 @@ class BlogPostDetailSerializer(serializers.ModelSerializer):
             return obj.cover_image.url
         return None
 
-    def get_like_count(self, obj):
-        return obj.get_like_count()
-
-    def get_comment_count(self, obj):
-        return obj.get_comment_count()
-
     def get_user_liked(self, obj):
         request = self.context.get('request')
-        if request and request.session.session_key:
+        visitor_id = get_visitor_id(request) if request else None
+        if visitor_id:
             return Like.objects.filter(
                 post=obj,
-                session_id=request.session.session_key
+                session_id=visitor_id
             ).exists()
         return False
 
@@ -115,6 +169,13 @@ class CommentSerializer(serializers.ModelSerializer):
         return Comment.objects.create(**validated_data)
 
 
+class CommentListSerializer(serializers.ModelSerializer):
+    """Comments as shown under a post, without the commenter's email"""
+    class Meta:
+        model = Comment
+        fields = ['id', 'name', 'text', 'is_approved', 'created_at']
+
+
 class CommentCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating comments"""
     class Meta:
@@ -0,0 +1,347 @@
+"""
+Signal receivers that keep derived data in step with the blog models.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, page_cache, related, search, stats, tasks
+from .models import AboutPage, BlogPost, Category, Comment, Like, Tag
+
+
+@receiver(post_save, sender=BlogPost)
+def index_saved_post(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+def _reindex_posts(post_ids):
+    for post in BlogPost.objects.filter(pk__in=post_ids).prefetch_related('tags'):
+        search.index_post(post)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def index_retagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # tag.posts.clear() doesn't say which posts lost the tag afterwards
+        instance._cleared_post_ids = list(instance.posts.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_post(instance)
+    elif action == 'post_clear':
+        _reindex_posts(getattr(instance, '_cleared_post_ids', []))
+    else:
+        # tag.posts.add(...) / remove(...): pk_set holds the affected posts
+        _reindex_posts(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag_posts(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    _reindex_posts(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_deleted_tag_posts(sender, instance, **kwargs):
+    instance._tagged_post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def index_deleted_tag_posts(sender, instance, **kwargs):
+    _reindex_posts(getattr(instance, '_tagged_post_ids', []))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def touch_retagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    # Tags are part of the post, so API validators (conditional.py) must see the change
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        post_ids = [instance.pk]
+    elif action == 'post_clear':
+        post_ids = getattr(instance, '_cleared_post_ids', [])
+    else:
+        post_ids = pk_set
+    _touch_posts(post_ids)
+
+
+@receiver(post_save, sender=Tag)
+def touch_renamed_tag_posts(sender, instance, created, raw=False, **kwargs):
+    # The detail payload carries tag names
+    if not (raw or created):
+        _touch_posts(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def touch_untagged_posts(sender, instance, **kwargs):
+    _touch_posts(getattr(instance, '_tagged_post_ids', []))
+
+
+def _touch_posts(post_ids):
+    BlogPost.objects.filter(pk__in=post_ids).update(updated_at=timezone.now())
+
+
+# Stored like/comment counters
+
+@receiver(post_save, sender=Like)
+def count_new_like(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.adjust(instance.post_id, 'like_count', 1)
+
+
+@receiver(post_delete, sender=Like)
+def count_removed_like(sender, instance, **kwargs):
+    counters.adjust(instance.post_id, 'like_count', -1)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_state(sender, instance, raw=False, **kwargs):
+    instance._counted_as = None
+    if instance.pk and not raw:
+        # (post_id, is_approved) as currently stored, to diff in post_save
+        instance._counted_as = Comment.objects.filter(pk=instance.pk).values_list(
+            'post_id', 'is_approved'
+        ).first()
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_counted_as', None)
+    if before == (instance.post_id, instance.is_approved):
+        return
+    if before and before[1]:
+        counters.adjust(before[0], 'comment_count', -1)
+    if instance.is_approved:
+        counters.adjust(instance.post_id, 'comment_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_removed_comment(sender, instance, **kwargs):
+    if instance.is_approved:
+        counters.adjust(instance.post_id, 'comment_count', -1)
+
+
+# Stored published-post counts on categories and tags
+
+def _changes_post_counting(update_fields):
+    return update_fields is None or bool({'is_published', 'category', 'category_id'} & set(update_fields))
+
+
+@receiver(pre_save, sender=BlogPost)
+def remember_post_counting_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._post_counted_as = None
+    if instance.pk and not raw and _changes_post_counting(update_fields):
+        # (is_published, category_id) as currently stored, to diff in post_save
+        instance._post_counted_as = BlogPost.objects.filter(pk=instance.pk).values_list(
+            'is_published', 'category_id'
+        ).first()
+
+
+@receiver(post_save, sender=BlogPost)
+def count_saved_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _changes_post_counting(update_fields):
+        return
+    was_published, old_category = getattr(instance, '_post_counted_as', None) or (False, None)
+    if (was_published, old_category) == (instance.is_published, instance.category_id):
+        return
+    if was_published:
+        counters.adjust_post_counts(Category, [old_category], -1)
+    if instance.is_published:
+        counters.adjust_post_counts(Category, [instance.category_id], 1)
+    if was_published != instance.is_published:
+        tag_ids = list(instance.tags.values_list('pk', flat=True))
+        counters.adjust_post_counts(Tag, tag_ids, 1 if instance.is_published else -1)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_deleted_post_tags(sender, instance, **kwargs):
+    # The tag links are gone by post_delete, without an m2m_changed signal
+    instance._counted_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=BlogPost)
+def count_removed_post(sender, instance, **kwargs):
+    if instance.is_published:
+        counters.adjust_post_counts(Category, [instance.category_id], -1)
+        counters.adjust_post_counts(Tag, getattr(instance, '_counted_tag_ids', []), -1)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def count_retagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_tag_ids = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    delta = 1 if action == 'post_add' else -1
+    if not reverse:
+        # post.tags.add/remove/clear: pk_set holds the tags
+        if instance.is_published:
+            tag_ids = getattr(instance, '_cleared_tag_ids', []) if action == 'post_clear' else pk_set
+            counters.adjust_post_counts(Tag, tag_ids, delta)
+    else:
+        # tag.posts.add/remove/clear: pk_set holds the posts
+        post_ids = getattr(instance, '_cleared_post_ids', []) if action == 'post_clear' else pk_set
+        published = BlogPost.objects.filter(pk__in=post_ids, is_published=True).count()
+        counters.adjust_post_counts(Tag, [instance.pk], delta * published)
+
+
+# Site statistics snapshot
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_site_stats(sender, **kwargs):
+    stats.invalidate()
+
+
+# Related posts
+
+def _update_related_on_commit(post):
+    # A dashboard save fires post_save and several m2m_changed actions for the
+    # same instance; score it once, after they have all been applied
+    if getattr(post, '_related_update_pending', False):
+        return
+    post._related_update_pending = True
+
+    def update():
+        post._related_update_pending = False
+        if BlogPost.objects.filter(pk=post.pk).exists():
+            _invalidate_post_ids(related.update_post(post))
+
+    transaction.on_commit(update)
+
+
+@receiver(post_save, sender=BlogPost)
+def update_related_posts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _update_related_on_commit(instance)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def update_retagged_related_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _update_related_on_commit(instance)
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_post_ids', [])
+    for post in BlogPost.objects.filter(pk__in=pk_set):
+        _update_related_on_commit(post)
+
+
+@receiver(post_delete, sender=Tag)
+def update_untagged_related_posts(sender, instance, **kwargs):
+    for post in BlogPost.objects.filter(pk__in=getattr(instance, '_tagged_post_ids', [])):
+        _update_related_on_commit(post)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_related_neighbours(sender, instance, **kwargs):
+    # Their rows pointing at the post are cascaded away with it
+    instance._related_neighbour_ids = list(instance.related_from.values_list('post_id', flat=True))
+
+
+@receiver(post_delete, sender=BlogPost)
+def refill_related_neighbours(sender, instance, **kwargs):
+    neighbour_ids = getattr(instance, '_related_neighbour_ids', [])
+    if neighbour_ids:
+        transaction.on_commit(lambda: _invalidate_post_ids(related.refill(neighbour_ids)))
+
+
+# Anonymous page cache
+
+@receiver(post_save, sender=BlogPost)
+def invalidate_saved_post_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate(*page_cache.post_groups(instance))
+
+
+@receiver(pre_delete, sender=BlogPost)
+def invalidate_deleted_post_pages(sender, instance, **kwargs):
+    page_cache.invalidate(*page_cache.post_groups(instance))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def invalidate_retagged_post_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if action == 'post_clear':
+            pk_set = getattr(instance, '_cleared_post_ids', [])
+        page_cache.invalidate('home', 'list')
+        _invalidate_post_ids(pk_set)
+    else:
+        page_cache.invalidate(*page_cache.post_groups(instance))
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_taxonomy_pages(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    slugs = instance.posts.values_list('slug', flat=True)
+    page_cache.invalidate('home', 'list', *[f'post:{slug}' for slug in slugs])
+
+
+@receiver(post_save, sender=AboutPage)
+def invalidate_about_page(sender, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate('about')
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_commented_post_page(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_counted_as', None)
+    post_ids = set()
+    if instance.is_approved:
+        post_ids.add(instance.post_id)
+    if before and before[1]:
+        post_ids.add(before[0])
+    _invalidate_post_ids(post_ids)
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_uncommented_post_page(sender, instance, **kwargs):
+    if instance.is_approved:
+        _invalidate_post_ids({instance.post_id})
+
+
+def _invalidate_post_ids(post_ids):
+    if post_ids:
+        slugs = BlogPost.objects.filter(pk__in=post_ids).values_list('slug', flat=True)
+        page_cache.invalidate(*[f'post:{slug}' for slug in slugs])
+
+
+# Image derivatives
+
+@receiver(post_save, sender=BlogPost)
+def queue_cover_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        tasks.queue_image_variants(instance, 'cover_image')
+
+
+@receiver(post_save, sender=AboutPage)
+def queue_profile_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        tasks.queue_image_variants(instance, 'profile_image')
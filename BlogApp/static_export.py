@@ -0,0 +1,338 @@
+"""
+Static export of the public, read-only pages.
+
+``manage.py export_static`` renders the home page, every page of the blog
+listing (unfiltered and for each category and tag), every published post and
+the about page through the normal views, as an anonymous visitor, into a
+directory a CDN or any static file server can serve. Listing URLs carry
+their filters in the query string, which static hosting ignores, so they
+are written to path-based locations instead and links between exported
+pages are rewritten to match::
+
+    /                          -> index.html
+    /blog/?category=c&page=2   -> blog/category/c/page/2/index.html
+    /blog/<slug>/              -> blog/<slug>/index.html
+
+Exports are incremental. Every page gets a fingerprint of what it shows
+(the ``updated_at`` and content hash of its posts, comment counts, related
+posts, sidebar counts, plus the templates and renderer version), computed
+from a few queries without rendering. Only pages whose fingerprint changed
+are rendered, and a file is only rewritten when the SHA-256 of the new HTML
+differs, so an edited post touches its own page, the listings and home page
+it appears on, and the posts that list it as related. Pages that no longer
+exist are deleted. Both are recorded in ``.export-manifest.json``.
+
+Stale pages are rendered in parallel by a process pool. View and like
+counts are not part of the fingerprint, so they are only as fresh as the
+last time the page was rendered for another reason. Forms (comments, likes,
+search) still need the dynamic site; CSRF tokens are blanked in exports.
+Assets keep pointing at ``STATIC_URL``.
+"""
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit
+
+from django.conf import settings
+from django.db.models import Max
+
+from .rendering import RENDERER_VERSION
+
+
+MANIFEST_NAME = '.export-manifest.json'
+MANIFEST_VERSION = 1
+
+# Listing filters that get their own exported pages
+LIST_FILTERS = ('category', 'tag')
+
+_HREF_RE = re.compile(r'(href=")([^"]*)(")')
+_CSRF_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+@dataclass
+class Page:
+    url: str
+    path: str
+    fingerprint: str
+
+
+@dataclass
+class ExportResult:
+    rendered: int = 0
+    written: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed: int = 0
+
+
+def output_dir():
+    return Path(getattr(settings, 'STATIC_EXPORT_DIR', settings.BASE_DIR / 'static_export'))
+
+
+def _fingerprint(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def _blog_list_url(page=1, **filters):
+    from django.urls import reverse
+
+    query = {name: value for name, value in filters.items() if value}
+    if page > 1:
+        query['page'] = page
+    url = reverse('blog_list')
+    return f'{url}?{urlencode(sorted(query.items()))}' if query else url
+
+
+def canonical_url(url):
+    """``url`` with its query in a fixed order and ``page=1`` dropped, for lookups"""
+    parts = urlsplit(url)
+    query = sorted((name, value) for name, value in parse_qsl(parts.query) if (name, value) != ('page', '1'))
+    return f'{parts.path}?{urlencode(query)}' if query else parts.path
+
+
+def static_path(url):
+    """File, relative to the export directory, that the page at ``url`` is written to"""
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split('/') if segment]
+    query = dict(parse_qsl(parts.query))
+    for name in LIST_FILTERS:
+        if name in query:
+            segments += [name, query[name]]
+    if query.get('page', '1') != '1':
+        segments += ['page', query['page']]
+    return '/'.join(segments + ['index.html'])
+
+
+def static_url(path):
+    return '/' + path[:-len('index.html')]
+
+
+def _file_digest(paths):
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(str(path).encode())
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def site_fingerprint():
+    """What every page depends on: templates, rendering and hashed asset names"""
+    from django.template.utils import get_app_template_dirs
+
+    template_dirs = [Path(d) for config in settings.TEMPLATES for d in config.get('DIRS', [])]
+    template_dirs += [Path(d) for d in get_app_template_dirs('templates')]
+    templates = [path for d in template_dirs if d.is_dir() for path in d.rglob('*.html')]
+
+    assets = []
+    static_root = getattr(settings, 'STATIC_ROOT', None)
+    if static_root and (Path(static_root) / 'staticfiles.json').is_file():
+        assets.append(Path(static_root) / 'staticfiles.json')
+    return _fingerprint(RENDERER_VERSION, _file_digest(templates), _file_digest(assets))
+
+
+def plan():
+    """Every page to export with its fingerprint, from a handful of queries"""
+    from .conditional import taxonomy_state
+    from .models import AboutPage, BlogPost, Category, Comment, RelatedPost, Tag
+    from .views import BLOG_LIST_PAGE_SIZE, HOME_FEATURED_POSTS, HOME_LATEST_POSTS
+    from .stats import get_site_stats
+
+    site = site_fingerprint()
+    taxonomy = taxonomy_state()
+
+    # In listing order (BlogPost.Meta.ordering)
+    posts = list(BlogPost.objects.filter(is_published=True).values(
+        'id', 'slug', 'updated_at', 'content_hash', 'comment_count', 'is_featured', 'category_id',
+        'cover_image', 'cover_image_variants',
+    ))
+    by_id = {post['id']: post for post in posts}
+    # Content and covers are fingerprinted directly rather than trusting every .update() to stamp updated_at
+    state = {
+        post['id']: (
+            post['id'], post['updated_at'], post['content_hash'],
+            post['cover_image'], post['cover_image_variants'],
+        )
+        for post in posts
+    }
+
+    tags_of = defaultdict(list)
+    for post_id, tag_id in BlogPost.tags.through.objects.filter(blogpost__in=by_id).values_list('blogpost_id', 'tag_id'):
+        tags_of[post_id].append(tag_id)
+    related_of = defaultdict(list)
+    for post_id, related_id in RelatedPost.objects.filter(post__in=by_id).values_list('post_id', 'related_id'):
+        related_of[post_id].append(state.get(related_id))
+    latest_comment = dict(
+        Comment.objects.filter(post__in=by_id, is_approved=True).values('post')
+        .annotate(latest=Max('id')).values_list('post', 'latest')
+    )
+
+    pages = []
+
+    def add(url, *parts):
+        pages.append(Page(url, static_path(url), _fingerprint(site, *parts)))
+
+    featured = [state[post['id']] for post in posts if post['is_featured']][:HOME_FEATURED_POSTS]
+    featured_ids = {entry[0] for entry in featured}
+    latest = [state[post['id']] for post in posts if post['id'] not in featured_ids][:HOME_LATEST_POSTS]
+    add('/', featured, latest, len(posts))
+
+    # The sidebar lists categories and the most used tags with their post counts
+    sidebar = (
+        list(Category.objects.filter(post_count__gt=0).values_list('id', 'post_count')),
+        list(Tag.objects.filter(post_count__gt=0).order_by('-post_count', 'id').values_list('id', 'post_count')[:10]),
+    )
+    in_category, in_tag = defaultdict(list), defaultdict(list)
+    for post in posts:
+        in_category[post['category_id']].append(post['id'])
+        for tag_id in tags_of[post['id']]:
+            in_tag[tag_id].append(post['id'])
+    listings = [({}, [post['id'] for post in posts])]
+    listings += [({'category': slug}, in_category[pk]) for pk, slug in Category.objects.values_list('id', 'slug')]
+    listings += [({'tag': slug}, in_tag[pk]) for pk, slug in Tag.objects.values_list('id', 'slug')]
+    for filters, ids in listings:
+        page_count = max(1, -(-len(ids) // BLOG_LIST_PAGE_SIZE))
+        for number in range(1, page_count + 1):
+            shown = ids[(number - 1) * BLOG_LIST_PAGE_SIZE:number * BLOG_LIST_PAGE_SIZE]
+            add(_blog_list_url(number, **filters), [state[pk] for pk in shown], page_count, sidebar, taxonomy)
+
+    for post in posts:
+        add(
+            f"/blog/{post['slug']}/",
+            state[post['id']], post['comment_count'], latest_comment.get(post['id']),
+            post['category_id'], sorted(tags_of[post['id']]), related_of[post['id']], taxonomy,
+        )
+
+    # The view creates the row on first use, so do the same for a stable fingerprint
+    add('/about/', AboutPage.get_instance().updated_at, get_site_stats()['published_posts'])
+    return pages
+
+
+def rewrite_links(content, page_url, urls):
+    """Point links to other exported pages at their static locations"""
+    def replace(match):
+        href = html.unescape(match.group(2))
+        parts = urlsplit(urljoin(page_url, href))
+        if parts.scheme or parts.netloc or href.startswith('#'):
+            return match.group(0)
+        target = urls.get(canonical_url(parts.path + (f'?{parts.query}' if parts.query else '')))
+        if target is None:
+            return match.group(0)
+        fragment = f'#{parts.fragment}' if parts.fragment else ''
+        return f'{match.group(1)}{html.escape(target + fragment)}{match.group(3)}'
+
+    return _HREF_RE.sub(replace, content)
+
+
+def render_page(url):
+    """Render ``url`` as an anonymous visitor; returns ``(url, status, html)``"""
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    parts = urlsplit(url)
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    # Not a visit: see visitors.should_count_view
+    request.is_static_export = True
+    match = resolve(parts.path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return url, response.status_code, response.content.decode(response.charset)
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _render_all(urls, workers):
+    if workers <= 1 or len(urls) < 2:
+        return [render_page(url) for url in urls]
+
+    from django.db import connections
+
+    # Children must open their own connections, not share the parent's
+    connections.close_all()
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(method), initializer=_init_worker,
+    ) as pool:
+        return list(pool.map(render_page, urls, chunksize=max(1, len(urls) // (workers * 4))))
+
+
+def _load_manifest(root):
+    try:
+        manifest = json.loads((root / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+    return manifest.get('pages', {}) if manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _remove(root, relative):
+    path = root / relative
+    path.unlink(missing_ok=True)
+    # Drop directories left empty, up to the export root
+    for parent in path.parents:
+        if parent == root or not parent.is_dir() or any(parent.iterdir()):
+            break
+        parent.rmdir()
+
+
+def export(root=None, workers=None, force=False):
+    """Bring the export directory up to date; returns an ``ExportResult``"""
+    root = Path(root) if root else output_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    previous = _load_manifest(root)
+    pages = plan()
+    urls = {canonical_url(page.url): static_url(page.path) for page in pages}
+
+    stale = [
+        page for page in pages
+        if force or previous.get(page.url, {}).get('fingerprint') != page.fingerprint
+        or not (root / page.path).is_file()
+    ]
+    by_url = {page.url: page for page in pages}
+    result = ExportResult()
+    manifest = {url: entry for url, entry in previous.items() if url in by_url}
+
+    for url, status, content in _render_all([page.url for page in stale], workers):
+        page = by_url[url]
+        result.rendered += 1
+        if status != 200:
+            result.failed += 1
+            manifest.pop(url, None)
+            continue
+        content = _CSRF_RE.sub(r'\1\2', rewrite_links(content, url, urls))
+        data = content.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        if previous.get(url, {}).get('sha256') == digest and (root / page.path).is_file():
+            result.unchanged += 1
+        else:
+            _write(root / page.path, data)
+            result.written += 1
+        manifest[url] = {'path': page.path, 'fingerprint': page.fingerprint, 'sha256': digest}
+
+    for url, entry in previous.items():
+        if url not in by_url:
+            _remove(root, entry['path'])
+            result.removed += 1
+
+    _write(root / MANIFEST_NAME, json.dumps({'version': MANIFEST_VERSION, 'pages': manifest}, indent=1).encode())
+    return result
@@ -0,0 +1,47 @@
+"""
+Site-wide statistics shared by the home, about and dashboard pages and the
+stats API.
+
+The numbers are computed in two aggregate queries and cached for
+``SITE_STATS_CACHE_TTL`` seconds. Receivers in ``signals.py`` drop the
+snapshot whenever a post, like or comment changes, so the TTL only bounds
+how stale buffered view counts can get.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+
+CACHE_KEY = 'blog:site_stats'
+
+
+def _compute():
+    from .models import BlogPost, Comment
+
+    published = Q(is_published=True)
+    totals = BlogPost.objects.aggregate(
+        total_posts=Count('pk'),
+        published_posts=Count('pk', filter=published),
+        featured_posts=Count('pk', filter=Q(is_featured=True)),
+        total_views=Sum('view_count', filter=published),
+        # Stored counters (see counters.py) instead of scanning Like/Comment
+        total_likes=Sum('like_count'),
+        approved_comments=Sum('comment_count'),
+    )
+    stats = {key: value or 0 for key, value in totals.items()}
+    stats['draft_posts'] = stats['total_posts'] - stats['published_posts']
+    stats['total_comments'] = Comment.objects.count()
+    return stats
+
+
+def get_site_stats():
+    """Return the cached statistics snapshot, computing it if needed"""
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        stats = _compute()
+        cache.set(CACHE_KEY, stats, getattr(settings, 'SITE_STATS_CACHE_TTL', 60))
+    return stats
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
@@ -0,0 +1,85 @@
+"""
+Plain-text excerpt, word count and reading time of a post body.
+
+Listings used to run ``truncatewords|striptags`` over the whole body on every
+render, which also meant loading ``content`` for every card. ``BlogPost.save()``
+stores the output of ``summarize()`` for the rendered body whenever it is
+saved, so list pages and the API can defer ``content`` entirely.
+``manage.py backfill_post_summaries`` fills in rows saved before these
+fields existed.
+"""
+import html
+import math
+import re
+
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+
+EXCERPT_WORDS = 40
+EXCERPT_MAX_LENGTH = 500
+WORDS_PER_MINUTE = 200
+
+SUMMARY_FIELDS = ('excerpt', 'word_count', 'reading_time')
+
+_INVISIBLE_RE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_HEADING_ANCHOR_RE = re.compile(r'<a class="heading-anchor"[^>]*>.*?</a>', re.DOTALL)
+# Block-level tags separate words even when the markup has no whitespace
+_BLOCK_TAG_RE = re.compile(
+    r'</?(?:p|div|br|hr|li|ul|ol|h[1-6]|pre|blockquote|tr|td|th|table|figure|figcaption)\b[^>]*>',
+    re.IGNORECASE,
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def plain_text(content):
+    """Visible text of an HTML body with tags removed and entities decoded"""
+    text = _INVISIBLE_RE.sub(' ', content or '')
+    text = _HEADING_ANCHOR_RE.sub('', text)
+    text = _BLOCK_TAG_RE.sub(' ', text)
+    text = html.unescape(strip_tags(text))
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def reading_time(word_count):
+    """Whole minutes to read ``word_count`` words, at least one for any text"""
+    if not word_count:
+        return 0
+    return max(1, math.ceil(word_count / WORDS_PER_MINUTE))
+
+
+def summarize(content):
+    """Return ``(excerpt, word_count, reading_time)`` for a post body"""
+    text = plain_text(content)
+    words = len(text.split())
+    excerpt = Truncator(Truncator(text).words(EXCERPT_WORDS)).chars(EXCERPT_MAX_LENGTH)
+    return excerpt, words, reading_time(words)
+
+
+def backfill(post_model=None, batch_size=500):
+    """Recompute the stored summaries of every post; returns posts updated"""
+    if post_model is None:
+        from .models import BlogPost as post_model
+
+    # Summaries are taken from the rendered body once it exists (see rendering.py)
+    field_names = {field.name for field in post_model._meta.concrete_fields}
+    source = 'content_html' if 'content_html' in field_names else 'content'
+
+    # bulk_update() skips auto_now, and conditional GETs are validated on updated_at
+    fields = [*SUMMARY_FIELDS, 'updated_at'] if 'updated_at' in field_names else SUMMARY_FIELDS
+
+    updated = 0
+    batch = []
+    for post in post_model.objects.only('pk', source).order_by('pk').iterator(chunk_size=batch_size):
+        post.excerpt, post.word_count, post.reading_time = summarize(getattr(post, source))
+        post.updated_at = timezone.now()
+        batch.append(post)
+        if len(batch) >= batch_size:
+            post_model.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+    if batch:
+        post_model.objects.bulk_update(batch, fields)
+        updated += len(batch)
+    return updated
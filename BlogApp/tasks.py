@@ -0,0 +1,101 @@
+"""
+Background tasks run by the job queue (see jobs.py).
+
+Each task looks its rows up again when it runs and does nothing if they
+are gone, so a job outliving its post is harmless. Tasks are safe to run
+twice: a worker can die after the work but before recording it.
+"""
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.mail import send_mail
+
+from . import images
+from .jobs import enqueue, task
+
+
+def staging_storage():
+    """Local directory where uploads wait for ``store_upload``"""
+    return FileSystemStorage(location=getattr(settings, 'JOB_STAGING_DIR', settings.BASE_DIR / 'job_staging'))
+
+
+def _image_field(label, image_field):
+    for entry in images.IMAGE_FIELDS:
+        if entry[0] == label and entry[1] == image_field:
+            return entry
+    return None
+
+
+def stage_upload(instance, field_name, upload):
+    """Keep ``upload`` on local disk and queue storing it in ``instance.<field_name>``"""
+    staged_name = staging_storage().save(os.path.basename(upload.name), upload)
+    return enqueue('store_upload', {
+        'model': instance._meta.label,
+        'pk': instance.pk,
+        'field': field_name,
+        'staged_name': staged_name,
+    }, priority=10)
+
+
+def queue_image_variants(instance, image_field):
+    """Queue building derivatives of ``instance``'s image unless they are current"""
+    entry = _image_field(instance._meta.label, image_field)
+    if entry is None or image_field in instance.get_deferred_fields():
+        return None
+    _, _, variants_field, _ = entry
+    image, variants = getattr(instance, image_field), getattr(instance, variants_field)
+    if images.is_current(image, variants) or (not image and not variants):
+        return None
+    return enqueue(
+        'refresh_image_variants',
+        {'model': instance._meta.label, 'pk': instance.pk, 'field': image_field},
+        dedup_key=f'image_variants:{instance._meta.label}:{instance.pk}:{image_field}',
+    )
+
+
+@task('send_contact_email')
+def send_contact_email(message_id):
+    from .models import ContactMessage
+
+    message = ContactMessage.objects.filter(pk=message_id).first()
+    if message is None or not getattr(settings, 'CONTACT_EMAIL', None):
+        return
+    # Let failures raise so the job is retried
+    send_mail(
+        f'New Contact Form: {message.subject}',
+        f'From: {message.name} ({message.email})\n\n{message.message}',
+        settings.DEFAULT_FROM_EMAIL,
+        [settings.CONTACT_EMAIL],
+    )
+
+
+@task('store_upload')
+def store_upload(model, pk, field, staged_name):
+    staging = staging_storage()
+    if not staging.exists(staged_name):
+        return
+    model_class = apps.get_model(model)
+    instance = model_class.objects.filter(pk=pk).first()
+    if instance is not None:
+        file_field = instance._meta.get_field(field)
+        with staging.open(staged_name) as staged:
+            name = file_field.generate_filename(instance, os.path.basename(staged_name))
+            name = file_field.storage.save(name, File(staged), max_length=file_field.max_length)
+        # update() so edits made while the job waited are not overwritten
+        model_class.objects.filter(pk=pk).update(**images.stamped(model_class, **{field: name}))
+        setattr(instance, field, name)
+        queue_image_variants(instance, field)
+    staging.delete(staged_name)
+
+
+@task('refresh_image_variants')
+def refresh_image_variants(model, pk, field):
+    entry = _image_field(model, field)
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if entry is None or instance is None:
+        return
+    _, image_field, variants_field, kind = entry
+    images.refresh(instance, image_field, variants_field, kind)
@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..images import CONTENT_TYPES, is_current, output_formats, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, variants, sizes='100vw', **attrs):
+    """
+    ``<picture>`` for an uploaded image with AVIF/WebP ``srcset`` sources.
+
+    Usage: ``{% responsive_image post.cover_image post.cover_image_variants sizes="50vw" alt=post.title class="card-img-top" %}``
+    The original file stays the ``<img>`` fallback; while derivatives are
+    missing only that is rendered.
+    """
+    if not image:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    sources = []
+    if is_current(image, variants):
+        for fmt in output_formats():
+            value = srcset(image, variants, fmt)
+            if value:
+                sources.append((CONTENT_TYPES[fmt], value, sizes))
+        if variants.get('placeholder'):
+            style = attrs.get('style', '').rstrip()
+            if style and not style.endswith(';'):
+                style += ';'
+            attrs['style'] = (
+                f"{style} background-image: url('{variants['placeholder']}'); background-size: cover;"
+            ).strip()
+
+    img = format_html(
+        '<img src="{}"{}>',
+        image.url,
+        format_html_join('', ' {}="{}"', ((name.replace('_', '-'), value) for name, value in attrs.items())),
+    )
+    if not sources:
+        return img
+    return format_html(
+        '<picture>{}{}</picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', sources),
+        img,
+    )
@@ -1,7 +1,42 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.urls import resolve
 from django.utils import timezone
-from .models import BlogPost, Category, Tag, Comment, Like, SavedPost, ContactMessage
+from . import archive, benchmark, compression, images, jobs, likes, related, static_export, view_counter
+from .counters import recount_posts
+from .db_routing import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, _RequestState, _state
+from .instrumentation import Recorder, fingerprint, perf_stats, reset_stats
+from .models import (
+    BlogPost, Category, Tag, Comment, Like, SavedPost, ContactMessage, Job, RelatedPost, ViewCountDelta,
+)
+from .pagination import paginate_keyset
+from .query_plans import captured_selects, explain, plan_problems
+from .rendering import render
+from .search import index_posts, search_posts
+from .stats import get_site_stats
+from .timeseries import parse_range, time_series
+from .views import COMMENTS_PAGE_SIZE
 
 
 class BlogPostModelTest(TestCase):
@@ -82,3 +117,1284 @@ class LikeModelTest(TestCase):
         self.assertEqual(like.session_id, 'test_session_123')
 
 
+class BlogTestCase(TestCase):
+    """Starts every test with an empty cache and view buffer, and a ``testuser`` author"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def setUp(self):
+        cache.clear()
+        # Drop views buffered by other tests before their posts are reused
+        view_counter.flush()
+        self.addCleanup(view_counter.flush)
+
+    def create_post(self, title='Test Post', content='Content', **fields):
+        """A published post by ``testuser`` unless ``fields`` say otherwise"""
+        fields.setdefault('author', self.user)
+        fields.setdefault('is_published', True)
+        return BlogPost.objects.create(title=title, content=content, **fields)
+
+
+class ViewCounterTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post()
+
+    def test_views_are_buffered_until_flush(self):
+        with self.settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_FLUSH_THRESHOLD=1000):
+            self.post.increment_views()
+            self.post.increment_views()
+
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.view_count, 0)
+            self.assertEqual(view_counter.pending_views(self.post.pk), 2)
+
+            view_counter.spill()
+            self.assertEqual(ViewCountDelta.objects.count(), 1)
+
+            self.assertEqual(view_counter.flush(), 2)
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.view_count, 2)
+            self.assertFalse(ViewCountDelta.objects.exists())
+
+            # Folding again must not count the same views twice
+            self.assertEqual(view_counter.apply_pending(), 0)
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.view_count, 2)
+
+    def test_due_views_are_spilled_not_folded_and_errors_are_contained(self):
+        with self.settings(VIEW_COUNT_FLUSH_INTERVAL=3600, VIEW_COUNT_FLUSH_THRESHOLD=2):
+            with mock.patch.object(ViewCountDelta.objects, 'bulk_create', side_effect=RuntimeError('locked')):
+                with self.assertLogs('BlogApp.view_counter', 'ERROR'):
+                    view_counter.record_view(self.post.pk)
+                    view_counter.record_view(self.post.pk)
+            self.assertEqual(view_counter.pending_views(self.post.pk), 2)
+
+            view_counter.record_view(self.post.pk)
+            self.assertEqual(view_counter.pending_views(self.post.pk), 0)
+            self.assertEqual(ViewCountDelta.objects.get().count, 3)
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.view_count, 0)
+
+        jobs.work(once=True)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 3)
+
+
+class SearchTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.django_post = self.create_post('Deploying Django', '<p>Notes on gunicorn and whitenoise.</p>')
+        self.other_post = self.create_post('Gardening', '<p>Tomatoes mention Django once.</p>')
+
+    def test_search_ranks_title_matches_first(self):
+        results = list(search_posts(BlogPost.objects.all(), 'django'))
+        self.assertEqual(results, [self.django_post, self.other_post])
+
+    def test_index_follows_content_and_tag_changes(self):
+        self.other_post.tags.add(Tag.objects.create(name='Vegetables'))
+        self.assertEqual(list(search_posts(BlogPost.objects.all(), 'vegetab')), [self.other_post])
+
+        self.django_post.content = 'Now about cucumbers'
+        self.django_post.save()
+        self.assertEqual(list(search_posts(BlogPost.objects.all(), 'whitenoise')), [])
+        self.assertEqual(list(search_posts(BlogPost.objects.all(), 'cucumbers')), [self.django_post])
+
+    def test_blog_list_search(self):
+        response = self.client.get('/blog/', {'search': 'gunicorn'})
+        self.assertEqual(list(response.context['page_obj']), [self.django_post])
+
+    def test_filters_apply_to_every_match_not_the_best_few(self):
+        drafts = BlogPost.objects.bulk_create(
+            BlogPost(title=f'Django draft {n}', slug=f'django-draft-{n}', content='Django', author=self.user)
+            for n in range(600)
+        )
+        index_posts(drafts)
+        results = search_posts(BlogPost.objects.all(), 'django')
+        self.assertEqual(results.count(), 602)
+        published = search_posts(BlogPost.objects.filter(is_published=True), 'django')
+        self.assertEqual(list(published), [self.django_post, self.other_post])
+
+
+class PostCounterTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post()
+
+    def test_counters_follow_likes_and_comment_approval(self):
+        like = Like.objects.create(post=self.post, session_id='abc')
+        comment = Comment.objects.create(post=self.post, name='A', email='a@example.com', text='Hi')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+        comment.is_approved = False
+        comment.save()
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_stale_instance_save_keeps_counters(self):
+        stale = BlogPost.objects.get(pk=self.post.pk)
+        Like.objects.create(post=self.post, session_id='abc')
+        stale.title = 'Edited'
+        stale.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_recount_repairs_drift(self):
+        Like.objects.create(post=self.post, session_id='abc')
+        BlogPost.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=3)
+        recount_posts()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+
+
+class SiteStatsTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post()
+
+    def test_snapshot_is_cached_and_invalidated(self):
+        self.assertEqual(get_site_stats()['published_posts'], 1)
+        with self.assertNumQueries(0):
+            get_site_stats()
+
+        Like.objects.create(post=self.post, session_id='abc')
+        stats = get_site_stats()
+        self.assertEqual(stats['total_likes'], 1)
+        self.assertEqual(stats['draft_posts'], 0)
+
+    def test_stats_api(self):
+        response = self.client.get('/api/stats/')
+        self.assertEqual(response.json()['total_posts'], 1)
+
+
+class PageCacheTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Cached Post')
+
+    def test_anonymous_detail_is_cached_and_still_counts_views(self):
+        url = self.post.get_absolute_url()
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Cached Post')
+        self.assertEqual(view_counter.pending_views(self.post.pk), 2)
+
+    def test_post_change_invalidates_its_pages(self):
+        url = self.post.get_absolute_url()
+        self.client.get(url)
+        self.client.get('/blog/')
+        self.post.title = 'Renamed Post'
+        self.post.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Renamed Post')
+        self.assertContains(self.client.get('/blog/'), 'Renamed Post')
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.get('/')
+        self.client.login(username='testuser', password='testpass123')
+        self.assertNotIn('X-Page-Cache', self.client.get('/'))
+
+
+class TimeSeriesTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+
+    def _post_on(self, year, month, day):
+        post = self.create_post(f'Post {year}-{month}-{day}', is_published=False)
+        created = timezone.make_aware(datetime(year, month, day, 12))
+        BlogPost.objects.filter(pk=post.pk).update(created_at=created)
+        return post
+
+    def test_calendar_months_in_one_query(self):
+        self._post_on(2025, 1, 31)
+        self._post_on(2025, 3, 1)
+        self._post_on(2025, 3, 31)
+        start, end = parse_range('2025-01-01', '2025-03-31', 'month')
+
+        with self.assertNumQueries(1):
+            series = time_series('posts', 'month', start, end)
+        self.assertEqual(
+            [(point['bucket'], point['count']) for point in series],
+            [('2025-01-01', 1), ('2025-02-01', 0), ('2025-03-01', 2)]
+        )
+
+    def test_timeseries_api(self):
+        self._post_on(2025, 3, 3)
+        self.client.login(username='staff', password='testpass123')
+
+        response = self.client.get('/api/dashboard/timeseries/', {
+            'metric': 'posts', 'bucket': 'week', 'from': '2025-03-01', 'to': '2025-03-14',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([point['count'] for point in response.json()['results']], [0, 1, 0])
+
+        response = self.client.get('/api/dashboard/timeseries/', {'metric': 'views'})
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.create_post(f'Post {i}') for i in range(5)]
+        # Identical timestamps must still page in a stable order
+        BlogPost.objects.update(created_at=timezone.now())
+
+    def test_pages_forward_and_back_without_count(self):
+        queryset = BlogPost.objects.filter(is_published=True)
+        with self.assertNumQueries(1):
+            first = paginate_keyset(queryset, None, 2)
+        second = paginate_keyset(queryset, first.next_cursor, 2)
+        third = paginate_keyset(queryset, second.next_cursor, 2)
+
+        seen = [post.pk for page in (first, second, third) for post in page]
+        self.assertEqual(seen, sorted((post.pk for post in self.posts), reverse=True))
+        self.assertFalse(third.has_next())
+        self.assertFalse(first.has_previous())
+        self.assertEqual(list(paginate_keyset(queryset, third.previous_cursor, 2)), list(second))
+
+    def test_api_cursor_mode(self):
+        response = self.client.get('/api/posts/', {'pagination': 'cursor', 'page_size': 3})
+        data = response.json()
+        self.assertNotIn('count', data)
+        self.assertEqual(len(data['results']), 3)
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNone(data['next'])
+
+        self.assertEqual(self.client.get('/api/posts/', {'cursor': 'garbage'}).status_code, 404)
+
+    def test_html_cursor_mode(self):
+        response = self.client.get('/blog/', {'cursor': ''})
+        self.assertTrue(response.context['cursor_mode'])
+        self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertNotContains(response, 'Older posts')
+
+
+class RelatedPostsTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.python = Tag.objects.create(name='Python')
+        self.django = Tag.objects.create(name='Django')
+
+    def _post(self, title, *tags):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = self.create_post(title, f'{title} content')
+            post.tags.add(*tags)
+        return post
+
+    def test_neighbours_are_ranked_and_updated_incrementally(self):
+        post = self._post('Django views', self.python, self.django)
+        close = self._post('Django models', self.python, self.django)
+        loose = self._post('Python scripts', self.python)
+        self.assertEqual(list(related.related_posts(post)), [close, loose])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            close.tags.clear()
+        self.assertEqual(list(related.related_posts(post))[0], loose)
+
+    def test_lists_that_lose_a_post_are_refilled(self):
+        stored = related.RELATED_POSTS_STORED
+        posts = [self._post(f'Django topic {n}', self.django) for n in range(stored + 2)]
+        first = posts[0]
+        self.assertEqual(RelatedPost.objects.filter(post=first).count(), stored)
+
+        dropped = RelatedPost.objects.filter(post=first).first().related
+        with self.captureOnCommitCallbacks(execute=True):
+            dropped.is_published = False
+            dropped.save()
+        self.assertEqual(RelatedPost.objects.filter(post=first).count(), stored)
+        self.assertFalse(RelatedPost.objects.filter(related=dropped).exists())
+
+        dropped = RelatedPost.objects.filter(post=first).first().related
+        with self.captureOnCommitCallbacks(execute=True):
+            dropped.delete()
+        self.assertEqual(RelatedPost.objects.filter(post=first).count(), stored - 1)
+
+    def test_dashboard_save_scores_the_post_once(self):
+        staff = User.objects.create_user(username='editor', password='pw', is_staff=True)
+        post = self._post('Django views', self.python)
+        self.client.force_login(staff)
+        post.author = staff
+        post.save()
+        with mock.patch.object(related, 'update_post', wraps=related.update_post) as update_post:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/dashboard/edit/{post.pk}/', {
+                    'title': 'Django views', 'content': 'Body', 'tags': [self.django.pk], 'is_published': 'on',
+                })
+        self.assertEqual(update_post.call_count, 1)
+
+    def test_rebuild_matches_incremental(self):
+        self._post('Django views', self.python, self.django)
+        self._post('Django models', self.python, self.django)
+        self._post('Python scripts', self.python)
+        before = set(RelatedPost.objects.values_list('post_id', 'related_id'))
+        draft = self.create_post('Draft', is_published=False)
+        RelatedPost.objects.create(post=draft, related=BlogPost.objects.exclude(pk=draft.pk).first(), score=1)
+        # Batches smaller than the archive still see every candidate
+        self.assertEqual(related.rebuild_all(batch_size=2), 3)
+        self.assertEqual(set(RelatedPost.objects.values_list('post_id', 'related_id')), before)
+
+    def test_related_endpoint(self):
+        post = self._post('Django views', self.django)
+        other = self._post('Django models', self.django)
+        response = self.client.get(f'/api/posts/{post.slug}/related/')
+        self.assertEqual([item['slug'] for item in response.json()], [other.slug])
+
+
+class SparseFieldsetTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_post('Sparse Post', '<p>' + 'word ' * 100 + '</p>')
+
+    def test_default_list_sends_excerpt_not_content(self):
+        item = self.client.get('/api/posts/').json()['results'][0]
+        self.assertNotIn('content', item)
+        self.assertTrue(item['excerpt'].startswith('word word'))
+        self.assertEqual(item['word_count'], 100)
+
+    def test_fields_and_exclude(self):
+        item = self.client.get('/api/posts/', {'fields': 'title,slug,content'}).json()['results'][0]
+        self.assertEqual(set(item), {'title', 'slug', 'content'})
+
+        item = self.client.get('/api/posts/', {'exclude': 'tags,author'}).json()['results'][0]
+        self.assertNotIn('tags', item)
+        self.assertNotIn('author', item)
+        self.assertIn('excerpt', item)
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/api/posts/', {'fields': 'title,nope'}).status_code, 400)
+
+    def test_narrow_list_query_defers_content(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/posts/', {'fields': 'title,slug'})
+        post_query = next(q['sql'] for q in queries if 'LIMIT' in q['sql'])
+        self.assertNotIn('"content"', post_query)
+        self.assertNotIn('blogapp_tag', ' '.join(q['sql'] for q in queries))
+
+
+class PostSummaryTest(BlogTestCase):
+    def test_summary_is_stored_on_save(self):
+        body = '<h2>Intro</h2><p>Fish &amp; chips</p><script>alert(1)</script>' + '<p>word</p>' * 450
+        post = self.create_post('Long', body, is_published=False)
+        self.assertTrue(post.excerpt.startswith('Intro Fish & chips word'))
+        self.assertNotIn('alert', post.excerpt)
+        self.assertEqual(post.word_count, 454)
+        self.assertEqual(post.reading_time, 3)
+
+        post.content = '<p>Short now</p>'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual((post.excerpt, post.word_count, post.reading_time), ('Short now', 2, 1))
+
+    def test_saving_deferred_post_keeps_summary(self):
+        post = self.create_post('Deferred', '<p>one two three</p>', is_published=False)
+        deferred = BlogPost.objects.defer('content').get(pk=post.pk)
+        deferred.title = 'Renamed'
+        deferred.save()
+        post.refresh_from_db()
+        self.assertEqual((post.title, post.excerpt, post.word_count), ('Renamed', 'one two three', 3))
+
+    def test_backfill_command(self):
+        post = self.create_post('Old', '<p>alpha beta</p>', is_published=False)
+        BlogPost.objects.filter(pk=post.pk).update(excerpt='', word_count=0, reading_time=0)
+        call_command('backfill_post_summaries', batch_size=1, stdout=io.StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.excerpt, post.word_count, post.reading_time), ('alpha beta', 2, 1))
+
+    def test_list_page_does_not_load_content(self):
+        self.create_post('Listed', '<p>secret body</p>')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/blog/')
+        self.assertContains(response, 'secret body')
+        self.assertFalse(any('"content"' in q['sql'] for q in queries if 'blogapp_blogpost' in q['sql']))
+
+
+class ContentRenderingTest(BlogTestCase):
+    def test_sanitizer_strips_unsafe_markup(self):
+        html = render(
+            '<p onclick="x()">Hi <a href="javascript:alert(1)">link</a>'
+            '<a href="https://example.com" target="_blank">ok</a></p>'
+            '<script>alert(1)</script><iframe src="https://evil"></iframe><img src="/a.png" onerror="x()">'
+        )
+        self.assertNotIn('onclick', html)
+        self.assertNotIn('javascript', html)
+        self.assertNotIn('script', html)
+        self.assertNotIn('iframe', html)
+        self.assertNotIn('onerror', html)
+        self.assertIn('<a href="https://example.com" target="_blank" rel="noopener noreferrer">ok</a>', html)
+        self.assertIn('<img src="/a.png">', html)
+
+    def test_heading_anchors_and_highlighting(self):
+        html = render('<h2>Setup</h2><h2>Setup</h2><pre><code class="language-python">x = 1 &lt; 2</code></pre>')
+        self.assertIn('<h2 id="setup">', html)
+        self.assertIn('<h2 id="setup-2">', html)
+        self.assertIn('<pre class="highlight" data-language="python">', html)
+        self.assertIn('&lt;', html)
+
+    def test_plain_text_is_escaped_into_paragraphs(self):
+        self.assertEqual(render('a <b\n\nsecond'), '<p>a &lt;b</p>\n<p>second</p>')
+
+    def test_markdown_headings_and_fenced_code(self):
+        html = render('## Install\n\nRun it:\n\n```python\nx = 1 < 2\n```\n')
+        self.assertIn('<h2 id="install">Install', html)
+        self.assertIn('<p>Run it:</p>', html)
+        self.assertIn('<pre class="highlight" data-language="python">', html)
+        self.assertIn('&lt;', html)
+
+    def test_render_runs_once_per_revision(self):
+        post = self.create_post('Rendered', '<p>One</p>')
+        self.assertEqual(post.content_html, '<p>One</p>')
+        with mock.patch('BlogApp.rendering.sanitize') as sanitize:
+            post.title = 'Renamed'
+            post.save()
+            sanitize.assert_not_called()
+
+        post.content = '<p>Two</p>'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, '<p>Two</p>')
+
+    def test_rerender_command_updates_stale_rows(self):
+        post = self.create_post('Stale', '<p>Body</p>', is_published=False)
+        BlogPost.objects.filter(pk=post.pk).update(content_html='', content_hash='old')
+        call_command('rerender_posts', stdout=io.StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, '<p>Body</p>')
+
+
+class ConditionalGetTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Tech')
+        self.post = self.create_post('Cached Post', '<p>Body</p>', category=self.category)
+
+    def _revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        return first['ETag'], self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_resources_are_not_modified(self):
+        for url in ['/api/posts/', f'/api/posts/{self.post.slug}/', '/api/categories/', '/api/tags/']:
+            etag, response = self._revalidate(url)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_changes_invalidate_validators(self):
+        etag, _ = self._revalidate('/api/posts/')
+        Like.objects.create(post=self.post, session_id='abc')
+        self.assertEqual(self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag, _ = self._revalidate('/api/posts/')
+        self.post.tags.add(Tag.objects.create(name='New'))
+        self.assertEqual(self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag, _ = self._revalidate('/api/categories/')
+        self.category.name = 'Technology'
+        self.category.save()
+        self.assertEqual(self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Views are still counted for revalidated reads
+        view_counter.flush()
+        url = f'/api/posts/{self.post.slug}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        view_counter.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 2)
+
+    def test_writes_that_bypass_save_invalidate_validators(self):
+        url = f'/api/posts/{self.post.slug}/'
+        etag, _ = self._revalidate(url)
+        BlogPost.objects.filter(pk=self.post.pk).update(**images.stamped(BlogPost, cover_image='blog_covers/new.jpg'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag, _ = self._revalidate('/api/posts/')
+        BlogPost.objects.filter(pk=self.post.pk).update(content_html='', content_hash='old')
+        call_command('rerender_posts', stdout=io.StringIO())
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_tag_rename_and_delete_invalidate_post_detail(self):
+        tag = Tag.objects.create(name='Old name')
+        self.post.tags.add(tag)
+        url = f'/api/posts/{self.post.slug}/'
+
+        etag, _ = self._revalidate(url)
+        tag.name = 'New name'
+        tag.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['name'] for item in response.json()['tags']], ['New name'])
+
+        etag, _ = self._revalidate(url)
+        tag.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tags'], [])
+
+
+class CompressionTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        compression.reset_stats()
+        self.post = self.create_post('Compressed', '<p>' + 'compressible ' * 200 + '</p>')
+
+    def test_accept_encoding_negotiation(self):
+        self.assertEqual(compression.accepted_encodings('gzip;q=0, br, deflate;q=0.5'), {'br', 'deflate'})
+        self.assertEqual(self.client.get('/').get('Content-Encoding'), None)
+
+    def test_cached_page_hit_is_not_recompressed(self):
+        url = f'/blog/{self.post.slug}/'
+        miss = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(miss['Content-Encoding'], 'gzip')
+        self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(miss.content))
+
+        self.client.cookies.clear()
+        with mock.patch('BlogApp.compression.precompress') as precompress:
+            hit = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            precompress.assert_not_called()
+        self.assertEqual(hit['X-Page-Cache'], 'hit')
+        body = gzip.decompress(hit.content)
+        # The stored chunks were reused around the fresh CSRF token
+        self.assertIn(b'compressible compressible', body)
+        self.assertIn('Accept-Encoding', hit['Vary'])
+
+        row = next(row for row in compression.compression_stats() if row['endpoint'] == 'blog_detail')
+        self.assertEqual((row['responses'], row['precompressed']), (2, 2))
+        self.assertLess(row['ratio'], 0.5)
+
+    def test_json_is_compressed(self):
+        response = self.client.get('/api/posts/', {'fields': 'title,content'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(json.loads(gzip.decompress(response.content))['results'][0]['title'], 'Compressed')
+
+
+class ImageDerivativeTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _post_with_cover(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), (200, 40, 40)).save(buffer, format='JPEG')
+        return self.create_post(
+            'Pictured', '<p>Body</p>',
+            cover_image=SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        )
+
+    def test_derivatives_are_built_out_of_band_and_used_in_srcset(self):
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_FORMATS=('webp',)):
+            post = self._post_with_cover()
+            self.assertEqual(post.cover_image_variants, {})
+            response = self.client.get(f'/blog/{post.slug}/')
+            self.assertNotContains(response, 'srcset')
+
+            call_command('build_image_derivatives', stdout=io.StringIO())
+            post.refresh_from_db()
+            variants = post.cover_image_variants
+            self.assertEqual(variants['source'], post.cover_image.name)
+            self.assertEqual([width for width, _ in variants['formats']['webp']], [320, 640, 960, 1000])
+            self.assertTrue(variants['placeholder'].startswith('data:image/webp;base64,'))
+
+            response = self.client.get(f'/blog/{post.slug}/')
+            self.assertContains(response, '<source type="image/webp" srcset="/media/derivatives/blog_covers/cover')
+            data = self.client.get('/api/posts/').json()['results'][0]
+            self.assertIn('320w', data['cover_image_srcset']['webp'])
+
+            # Rebuilding is a no-op until the image changes
+            self.assertEqual(images.refresh_all(), 0)
+
+
+class IdempotentLikeTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Likeable', 'Body')
+        self.url = f'/api/posts/{self.post.slug}/like/'
+
+    def test_put_and_delete_are_idempotent(self):
+        for _ in range(2):
+            self.assertEqual(self.client.put(self.url).json(), {'liked': True, 'like_count': 1})
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+        for _ in range(2):
+            self.assertEqual(self.client.delete(self.url).json(), {'liked': False, 'like_count': 0})
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    def test_toggle_wraps_like_and_unlike(self):
+        page_url = f'/blog/{self.post.slug}/like/'
+        self.assertEqual(self.client.post(page_url).json(), {'liked': True, 'like_count': 1})
+        self.assertEqual(self.client.post(self.url).json(), {'liked': False, 'like_count': 0})
+        self.assertEqual(self.client.put(page_url).json(), {'liked': True, 'like_count': 1})
+
+    def test_like_is_one_insert_and_one_counter_update(self):
+        Like.objects.create(post=self.post, session_id='other')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(likes.like(self.post.pk, 'abc'), (True, 2))
+        statements = [q['sql'] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn('COUNT(', ' '.join(statements).upper())
+
+        # A duplicate like from a racing request is ignored, not an IntegrityError
+        self.assertEqual(likes.like(self.post.pk, 'abc'), (False, 2))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+    def test_likes_invalidate_only_the_post_page(self):
+        for url in (f'/blog/{self.post.slug}/', '/blog/'):
+            self.client.get(url)
+            self.assertIsNone(self.client.get(url).context, url)
+        likes.like(self.post.pk, 'abc')
+        self.assertIsNotNone(self.client.get(f'/blog/{self.post.slug}/').context)
+        # Listings keep their cached copy until it expires
+        self.assertIsNone(self.client.get('/blog/').context)
+
+
+class VisitorIdTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Visited', 'Body')
+
+    def test_like_sets_signed_cookie_without_a_session_row(self):
+        url = f'/api/posts/{self.post.slug}/like/'
+        response = self.client.put(url)
+        self.assertIn('blog_visitor', response.cookies)
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+        # The cookie identifies the same visitor on the next request
+        self.assertEqual(self.client.put(url).json(), {'liked': True, 'like_count': 1})
+        self.assertEqual(Like.objects.get(post=self.post).session_id, self.client.cookies['blog_visitor'].value.split(':')[0])
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.put(f'/api/posts/{self.post.slug}/like/')
+        self.client.cookies['blog_visitor'] = 'a' * 32 + ':forged'
+        self.assertFalse(self.client.get(f'/api/posts/{self.post.slug}/').json()['user_liked'])
+
+    def test_legacy_session_key_is_adopted(self):
+        Like.objects.create(post=self.post, session_id='k' * 32)
+        self.client.cookies['sessionid'] = 'k' * 32
+        response = self.client.get(f'/api/posts/{self.post.slug}/')
+        self.assertTrue(response.json()['user_liked'])
+        self.assertIn('blog_visitor', response.cookies)
+
+    def test_repeat_views_by_one_visitor_count_once(self):
+        self.client.put(f'/api/posts/{self.post.slug}/like/')
+        url = self.post.get_absolute_url()
+        for _ in range(3):
+            self.client.get(url)
+        self.assertEqual(view_counter.pending_views(self.post.pk), 1)
+
+    def test_cached_page_varies_on_liked(self):
+        url = self.post.get_absolute_url()
+        self.client.get(url)
+        self.client.put(f'/api/posts/{self.post.slug}/like/')
+        self.assertContains(self.client.get(url), '>Liked<')
+
+        # Another visitor still gets the shared, un-liked copy
+        self.assertNotContains(Client().get(url), '>Liked<')
+
+
+class JobQueueTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staging = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def test_dedup_key_merges_waiting_jobs_and_priority_orders_claims(self):
+        low = jobs.enqueue('send_contact_email', {'message_id': 1}, dedup_key='mail:1')
+        again = jobs.enqueue('send_contact_email', {'message_id': 1}, priority=7, dedup_key='mail:1')
+        self.assertEqual(again.pk, low.pk)
+        self.assertEqual(again.priority, 7)
+        urgent = jobs.enqueue('send_contact_email', {'message_id': 2}, priority=9)
+
+        self.assertEqual(jobs.claim('w1').pk, urgent.pk)
+        claimed = jobs.claim('w1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (low.pk, Job.RUNNING, 1))
+        self.assertIsNone(jobs.claim('w1'))
+
+        # Once the job is running, the same work can be queued again
+        self.assertNotEqual(jobs.enqueue('send_contact_email', {'message_id': 1}, dedup_key='mail:1').pk, low.pk)
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        def flaky(**kwargs):
+            raise RuntimeError('mail server down')
+
+        job = jobs.enqueue('send_contact_email', {'message_id': 1}, max_attempts=2)
+        with mock.patch.dict(jobs._tasks, {'send_contact_email': flaky}), self.assertLogs('BlogApp.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim('w1')), Job.QUEUED)
+            job.refresh_from_db()
+            self.assertGreater(job.run_at, timezone.now())
+            self.assertIn('mail server down', job.last_error)
+            self.assertIsNone(jobs.claim('w1'))
+
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            self.assertEqual(jobs.run(jobs.claim('w1')), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_admin_retry_keeps_one_queued_job_per_dedup_key(self):
+        waiting = jobs.enqueue('send_contact_email', {'message_id': 1}, dedup_key='mail:1')
+        failed = [
+            Job.objects.create(task='send_contact_email', status=Job.FAILED, dedup_key=key)
+            for key in ('mail:1', 'mail:2', 'mail:2', None)
+        ]
+        admin = User.objects.create_superuser(username='admin', password='pw')
+        self.client.force_login(admin)
+        response = self.client.post('/admin/BlogApp/job/', {
+            'action': 'retry_now', '_selected_action': [job.pk for job in failed],
+        }, follow=True)
+        self.assertContains(response, '2 jobs queued again. 2 skipped')
+        queued = set(Job.objects.filter(status=Job.QUEUED).values_list('pk', flat=True))
+        self.assertEqual(queued, {waiting.pk, failed[2].pk, failed[3].pk})
+
+    def test_stale_lease_is_requeued(self):
+        job = jobs.enqueue('send_contact_email', {'message_id': 1})
+        jobs.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_contact_mail_is_sent_by_the_worker(self):
+        message = ContactMessage.objects.create(name='Ann', email='ann@example.com', subject='Hello', message='Hi there')
+        with self.settings(CONTACT_EMAIL='owner@example.com'):
+            jobs.enqueue('send_contact_email', {'message_id': message.pk}, priority=5)
+            self.assertEqual(len(mail.outbox), 0)
+            call_command('run_worker', '--once', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'New Contact Form: Hello')
+
+    def test_cover_upload_is_stored_by_the_worker(self):
+        User.objects.create_user(username='author', password='testpass123', is_staff=True)
+        self.client.login(username='author', password='testpass123')
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 200), (20, 120, 40)).save(buffer, format='JPEG')
+        with self.settings(JOB_STAGING_DIR=self.staging, MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_FORMATS=('webp',)):
+            self.client.post('/dashboard/new/', {
+                'title': 'Uploaded', 'content': 'Body', 'is_published': 'on',
+                'cover_image': SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            })
+            post = BlogPost.objects.get(title='Uploaded')
+            self.assertFalse(post.cover_image)
+
+            self.assertEqual(jobs.work(once=True), 2)
+        post.refresh_from_db()
+        self.assertTrue(post.cover_image.name.startswith('blog_covers/cover'))
+        self.assertEqual(post.cover_image_variants['source'], post.cover_image.name)
+
+
+class StaticExportTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.out = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.out, ignore_errors=True)
+        self.category = Category.objects.create(name='Python')
+        self.other = Category.objects.create(name='Travel')
+        self.posts = [
+            self.create_post(f'Post {n}', f'<p>Body {n}</p>', category=self.category if n < 10 else self.other)
+            for n in range(12)
+        ]
+
+    def _export(self, **kwargs):
+        return static_export.export(self.out, workers=1, **kwargs)
+
+    def _read(self, path):
+        with open(os.path.join(self.out, path)) as f:
+            return f.read()
+
+    def test_export_writes_path_based_pages_and_rewrites_links(self):
+        result = self._export()
+        self.assertEqual(result.failed, 0)
+        for path in ('index.html', 'blog/index.html', 'blog/page/2/index.html', 'blog/category/python/page/2/index.html',
+                     'blog/category/travel/index.html', 'blog/post-3/index.html', 'about/index.html'):
+            self.assertTrue(os.path.isfile(os.path.join(self.out, path)), path)
+
+        listing = self._read('blog/category/python/index.html')
+        self.assertIn('href="/blog/category/python/page/2/"', listing)
+        self.assertIn('href="/blog/category/travel/"', listing)
+        self.assertNotRegex(listing, r'name="csrfmiddlewaretoken" value="[^"]')
+
+        # Rendering for the export is not a visit
+        self.assertEqual(view_counter.pending_views(self.posts[3].pk), 0)
+
+    def test_rebuild_only_touches_pages_showing_the_edited_post(self):
+        self._export()
+        again = self._export()
+        self.assertEqual((again.rendered, again.written), (0, 0))
+
+        travel = self.posts[11]
+        travel.title = 'Travel notes'
+        travel.save()
+        result = self._export()
+        self.assertIn('Travel notes', self._read('blog/category/travel/index.html'))
+        self.assertIn('Travel notes', self._read(f'blog/{travel.slug}/index.html'))
+        # Unrelated listings and posts are left alone
+        total = sum(len(files) for _, _, files in os.walk(self.out)) - 1
+        self.assertLess(result.rendered, total // 2)
+        self.assertEqual(result.written, result.rendered - result.unchanged)
+
+    def test_new_cover_variants_change_the_post_fingerprint(self):
+        post = self.posts[2]
+        before = {page.url: page.fingerprint for page in static_export.plan()}
+        BlogPost.objects.filter(pk=post.pk).update(cover_image_variants={'webp': {'640': 'covers/post-2-640.webp'}})
+        after = {page.url: page.fingerprint for page in static_export.plan()}
+        self.assertNotEqual(before[f'/blog/{post.slug}/'], after[f'/blog/{post.slug}/'])
+        self.assertEqual(before['/about/'], after['/about/'])
+
+    def test_unpublished_post_page_is_removed(self):
+        self._export()
+        post = self.posts[0]
+        post.is_published = False
+        post.save()
+        result = self._export()
+        self.assertGreaterEqual(result.removed, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.out, f'blog/{post.slug}/index.html')))
+
+
+class TaxonomyPostCountTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.python = Category.objects.create(name='Python')
+        self.travel = Category.objects.create(name='Travel')
+        self.django = Tag.objects.create(name='Django')
+        self.tips = Tag.objects.create(name='Tips')
+
+    def _counts(self):
+        return (
+            dict(Category.objects.values_list('name', 'post_count')),
+            dict(Tag.objects.values_list('name', 'post_count')),
+        )
+
+    def test_counts_follow_publishing_moves_tagging_and_deletes(self):
+        draft = self.create_post('Draft', 'Body', category=self.python, is_published=False)
+        draft.tags.add(self.django)
+        self.assertEqual(self._counts(), ({'Python': 0, 'Travel': 0}, {'Django': 0, 'Tips': 0}))
+
+        draft.is_published = True
+        draft.save()
+        self.assertEqual(self._counts(), ({'Python': 1, 'Travel': 0}, {'Django': 1, 'Tips': 0}))
+
+        draft.category = self.travel
+        draft.save()
+        draft.tags.set([self.tips])
+        self.assertEqual(self._counts(), ({'Python': 0, 'Travel': 1}, {'Django': 0, 'Tips': 1}))
+
+        self.django.posts.add(draft)
+        self.tips.posts.clear()
+        self.assertEqual(self._counts(), ({'Python': 0, 'Travel': 1}, {'Django': 1, 'Tips': 0}))
+
+        draft.delete()
+        self.assertEqual(self._counts(), ({'Python': 0, 'Travel': 0}, {'Django': 0, 'Tips': 0}))
+
+    def test_sidebar_and_tag_api_read_stored_counts(self):
+        post = self.create_post('Live', 'Body', category=self.python)
+        post.tags.add(self.django)
+        # Drift from a write that bypasses signals is repaired by the command
+        Tag.objects.update(post_count=7)
+        call_command('recount_taxonomy_counters', stdout=io.StringIO())
+        self.assertEqual(self._counts(), ({'Python': 1, 'Travel': 0}, {'Django': 1, 'Tips': 0}))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tags/')
+        self.assertEqual([(t['name'], t['post_count']) for t in response.json()], [('Django', 1)])
+        self.assertFalse(any('JOIN' in q['sql'] and 'blogapp_tag' in q['sql'] for q in queries))
+        self.assertContains(self.client.get('/blog/'), 'Python <span class="badge bg-primary rounded-pill float-end">1</span>')
+
+
+class BenchmarkTest(BlogTestCase):
+    def test_every_route_has_a_scenario(self):
+        self.assertEqual(benchmark.uncovered_routes(), [])
+
+    def test_seeded_routes_report_percentiles(self):
+        benchmark.seed({'posts': 30, 'categories': 3, 'tags': 8, 'comments': 60, 'likes': 500})
+        self.assertEqual(Like.objects.count(), 500)
+        dataset = benchmark.load_dataset()
+
+        report = benchmark.run(dataset, requests=6, concurrency=1, warmup=1, only={'blog_list', 'post-like PUT', 'delete_comment'})
+        self.assertEqual(set(report['routes']), {'blog_list', 'post-like PUT', 'delete_comment POST'})
+        for result in report['routes'].values():
+            self.assertEqual(result['requests'], 6)
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+
+    def test_compare_flags_regressions_past_thresholds(self):
+        baseline = {'routes': {'home': {'p95_ms': 10.0, 'throughput_rps': 100.0, 'errors': 0}}}
+        current = {'routes': {'home': {'p95_ms': 12.5, 'throughput_rps': 95.0, 'errors': 0}}}
+        self.assertEqual(benchmark.compare(baseline, current, {'p95_ms': 30, 'throughput_rps': 10}), [])
+
+        regressions = benchmark.compare(baseline, current, {'p95_ms': 20})
+        self.assertEqual([(r['route'], r['metric'], r['change_pct']) for r in regressions], [('home', 'p95_ms', 25.0)])
+        # Changes below the noise floor are ignored
+        self.assertEqual(benchmark.compare(baseline, current, {'p95_ms': 20}, min_delta_ms=5), [])
+
+
+class PerfInstrumentationTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+        self.staff = User.objects.create_user(username='perfstaff', password='pw', is_staff=True)
+        self.post = self.create_post('Measured', 'Body', author=self.staff)
+        self.post.tags.add(Tag.objects.create(name='Timing'))
+
+    def test_fingerprint_collapses_literals_and_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT *  FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+
+    def test_server_timing_is_sent_to_staff_only(self):
+        url = f'/blog/{self.post.slug}/'
+        self.assertNotIn('Server-Timing', self.client.get(url))
+
+        self.client.force_login(self.staff)
+        timing = self.client.get(url)['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_repeated_and_nplusone_queries_are_flagged(self):
+        self.client.force_login(self.staff)
+        self.client.get(f'/blog/{self.post.slug}/')
+        row = next(row for row in perf_stats() if row['endpoint'] == 'blog_detail')
+        self.assertEqual(row['requests'], 1)
+        self.assertGreater(row['avg_queries'], 0)
+        # {% if post.tags.all %} then {% for tag in post.tags.all %}
+        repeated = [problem for problem in row['problems'] if 'blogapp_tag' in problem['fingerprint'].lower()]
+        self.assertEqual([problem['kind'] for problem in repeated], ['repeated'])
+        self.assertEqual(repeated[0]['template'], 'blog_detail.html')
+
+        for number in range(6):
+            self.create_post(f'Loop {number}', 'Body', author=self.staff, is_published=False)
+        with self.settings(PERF_NPLUSONE_THRESHOLD=3):
+            recorder = Recorder()
+            with connection.execute_wrapper(recorder):
+                for post in BlogPost.objects.all():
+                    post.author.username
+        (problem,) = recorder.problems()
+        self.assertEqual((problem['kind'], problem['count']), ('n+1', 7))
+        self.assertTrue(problem['location'].startswith('BlogApp/tests.py:'))
+
+    def test_disabled_instrumentation_is_not_installed(self):
+        self.client.force_login(self.staff)
+        with self.settings(PERF_INSTRUMENTATION=False):
+            with mock.patch('BlogApp.instrumentation._patch_template_render') as patch:
+                response = self.client.get('/dashboard/perf/')
+        patch.assert_not_called()
+        self.assertNotIn('Server-Timing', response)
+        self.assertContains(response, 'Instrumentation is off')
+        self.assertEqual(perf_stats(), [])
+
+    def test_slow_requests_are_logged(self):
+        with self.settings(PERF_SLOW_REQUEST_MS=0):
+            with self.assertLogs('BlogApp.perf', 'WARNING') as logs:
+                self.client.get('/about/')
+        self.assertIn('Slow request GET /about/ (about)', logs.output[0])
+
+    def test_dashboard_is_staff_only(self):
+        response = self.client.get('/dashboard/perf/')
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(self.staff)
+        self.client.get('/about/')
+        response = self.client.get('/dashboard/perf/')
+        self.assertContains(response, '<code>about</code>', html=False)
+
+        response = self.client.post('/dashboard/perf/')
+        self.assertRedirects(response, '/dashboard/perf/', fetch_redirect_response=False)
+        self.assertEqual([row['endpoint'] for row in perf_stats()], ['perf_dashboard'])
+
+
+class PostArchiveTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='archivist', password='pw', is_staff=True)
+        self.category = Category.objects.create(name='History')
+        self.post = self.create_post(
+            'Old Times', '# Then\n\nOnce upon a time.', author=self.author, category=self.category,
+        )
+        self.post.tags.add(Tag.objects.create(name='past'), Tag.objects.create(name='stories'))
+
+    def _export(self):
+        stream = io.StringIO()
+        archive.write_jsonl(archive.export_records(), stream)
+        stream.seek(0)
+        return stream
+
+    def test_jsonl_round_trip_is_idempotent(self):
+        exported = self._export().getvalue()
+        BlogPost.objects.all().delete()
+        result = archive.import_posts(archive.read_jsonl(exported.splitlines()))
+        self.assertEqual((result.created, result.updated, result.failed), (1, 0, 0))
+
+        post = BlogPost.objects.get(slug='old-times')
+        self.assertEqual(post.created_at, self.post.created_at)
+        self.assertEqual(post.published_at, self.post.published_at)
+        self.assertEqual(sorted(post.tags.values_list('name', flat=True)), ['past', 'stories'])
+        self.assertEqual(post.content_html, self.post.content_html)
+        self.assertEqual(post.reading_time, self.post.reading_time)
+        self.assertEqual(Category.objects.get().post_count, 1)
+        self.assertEqual(list(search_posts(BlogPost.objects.all(), 'stories')), [post])
+
+        result = archive.import_posts(archive.read_jsonl(self._export()))
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 0, 1))
+
+    def test_markdown_records_without_slugs_resolve_in_batches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for number in range(30):
+                # Every title collides with the existing post's slug
+                Path(directory, f'{number:02}.md').write_text(
+                    f'---\ntitle: Old Times\ntags: [past, new-{number % 3}]\nis_published: true\n---\n\nPart {number}.\n'
+                )
+            Path(directory, 'broken.md').write_text('no front matter')
+
+            with CaptureQueriesContext(connection) as queries:
+                result = archive.import_posts(
+                    archive.read_markdown(directory), author='archivist', batch_size=50, refresh_related=False,
+                )
+            self.assertEqual((result.created, result.failed), (30, 1))
+            self.assertIn('broken.md: Missing front matter', result.errors[0])
+            # Constant per batch, not per post
+            self.assertLess(len(queries), 30)
+            self.assertTrue(BlogPost.objects.filter(slug='old-times-30').exists())
+            self.assertEqual(Tag.objects.get(name='past').post_count, 31)
+
+            again = archive.import_posts(archive.read_markdown(directory), author='archivist', refresh_related=False)
+        self.assertEqual((again.created, again.unchanged), (0, 30))
+        self.assertEqual(BlogPost.objects.count(), 31)
+
+    def test_changed_records_are_updated(self):
+        record = json.loads(self._export().getvalue())
+        record.update(title='Older Times', tags=['past'], category='Myths', content='Long ago.')
+        result = archive.import_posts(iter([('edit', record), ('bad', {'title': 'No author', 'author': 'ghost'})]))
+        self.assertEqual((result.updated, result.failed), (1, 1))
+        self.assertEqual(result.errors, ["bad: Unknown author 'ghost'"])
+
+        post = BlogPost.objects.get(pk=self.post.pk)
+        self.assertEqual((post.title, post.category.name), ('Older Times', 'Myths'))
+        self.assertEqual(list(post.tags.values_list('name', flat=True)), ['past'])
+        self.assertIn('Long ago.', post.content_html)
+        self.assertEqual(Category.objects.get(name='History').post_count, 0)
+
+    def test_import_refreshes_related_posts_of_imported_posts_only(self):
+        record = next(archive.export_records())
+        record.update(slug='new-times', title='New Times', tags=['past'])
+        with mock.patch.object(related, 'rebuild_all') as rebuild_all:
+            result = archive.import_posts(iter([('new', record)]), batch_size=1)
+        self.assertEqual(result.created, 1)
+        rebuild_all.assert_not_called()
+        imported = BlogPost.objects.get(slug='new-times')
+        self.assertEqual(list(related.related_posts(imported)), [self.post])
+        self.assertEqual(list(related.related_posts(self.post)), [imported])
+
+    def test_markdown_front_matter_round_trip(self):
+        record = next(archive.export_records())
+        self.assertEqual(archive.parse_markdown(archive.to_markdown(record)), record)
+
+
+class CommentPaginationTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='moderator', password='pw', is_staff=True)
+        self.post = self.create_post('Viral', 'Body', author=self.staff)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, name=f'Reader {n}', email=f'r{n}@example.com', text=f'Comment {n}')
+            for n in range(25)
+        )
+        Comment.objects.create(post=self.post, name='Pending', email='p@example.com', text='Hold', is_approved=False)
+
+    def test_detail_page_renders_the_first_page_only(self):
+        response = self.client.get(f'/blog/{self.post.slug}/')
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PAGE_SIZE)
+        self.assertNotIn('Pending', [comment.name for comment in comments])
+        self.assertContains(response, f'/api/posts/{self.post.slug}/comments/?cursor={comments.next_cursor}')
+
+    def test_api_pages_through_comments_with_cursors(self):
+        url = f'/api/posts/{self.post.slug}/comments/'
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 20)
+        self.assertNotIn('email', first['results'][0])
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        names = [comment['name'] for comment in first['results'] + second['results']]
+        self.assertEqual(len(set(names)), 25)
+        self.assertNotIn('Pending', names)
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).json()['results'][0]['name'], 'Pending')
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/posts/missing/comments/').status_code, 404)
+
+    def test_comment_list_filters_by_post_slug_or_id(self):
+        by_slug = self.client.get('/api/comments/', {'post': self.post.slug}).json()
+        by_id = self.client.get('/api/comments/', {'post': self.post.pk}).json()
+        self.assertEqual(by_slug['count'], 25)
+        self.assertEqual(by_slug['results'], by_id['results'])
+
+
+class PlanRegressionTest(BlogTestCase):
+    """Every query the hot routes run against a large table uses an index for both lookup and order"""
+
+    HOT_TABLES = (
+        'BlogApp_blogpost', 'BlogApp_blogpost_tags', 'BlogApp_comment',
+        'BlogApp_like', 'BlogApp_savedpost', 'BlogApp_relatedpost',
+    )
+    # SQL fragment -> why that plan is accepted
+    ALLOWED = {
+        '"total_posts"': 'site stats aggregate the whole table and are cached',
+        '"BlogApp_blogpost_tags"."tag_id" =': 'tag listings sort the matched posts; the through table has no dates',
+    }
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'No plan checks for {connection.vendor}')
+        super().setUp()
+        self.staff = User.objects.create_user(username='editor', password='pw', is_staff=True)
+        category = Category.objects.create(name='Django')
+        tag = Tag.objects.create(name='ORM')
+        for n in range(6):
+            post = self.create_post(
+                f'Indexes {n}', 'Plans and indexes', author=self.staff, category=category,
+                is_published=n < 5, is_featured=n < 2,
+            )
+            post.tags.add(tag)
+            Comment.objects.create(post=post, name='Reader', email='r@example.com', text='Useful')
+            Like.objects.create(post=post, session_id=f'visitor-{n}')
+        self.post = BlogPost.objects.filter(is_published=True).first()
+        SavedPost.objects.create(user=self.staff, post=self.post)
+        related.rebuild_all()
+
+    def assertPlansClean(self, client, url):
+        cache.clear()
+        with captured_selects() as queries:
+            response = client.get(url)
+        self.assertLess(response.status_code, 400, url)
+
+        hot = {table.lower() for table in self.HOT_TABLES}
+        for sql, params in queries:
+            table = re.search(r'\bFROM "(\w+)"', sql)
+            if not table or table.group(1).lower() not in hot:
+                continue
+            if any(fragment in sql for fragment in self.ALLOWED):
+                continue
+            plan = explain(sql, params)
+            problems = plan_problems(plan, self.HOT_TABLES, connection.vendor)
+            self.assertFalse(problems, f'{url}: {problems}\n{sql}\n' + '\n'.join(plan))
+
+    def test_public_pages(self):
+        for url in ('/', '/blog/', '/blog/?cursor=', '/blog/?category=django', '/blog/?tag=orm',
+                    f'/blog/{self.post.slug}/'):
+            with self.subTest(url=url):
+                self.assertPlansClean(self.client, url)
+
+    def test_dashboard_pages(self):
+        self.client.force_login(self.staff)
+        for url in ('/dashboard/', '/dashboard/posts/', '/dashboard/saved/'):
+            with self.subTest(url=url):
+                self.assertPlansClean(self.client, url)
+
+    def test_api_routes(self):
+        slug = self.post.slug
+        for url in ('/api/posts/', '/api/posts/?featured=true', '/api/posts/?cursor=',
+                    f'/api/posts/{slug}/', f'/api/posts/{slug}/related/', f'/api/posts/{slug}/comments/',
+                    '/api/comments/', '/api/categories/', '/api/tags/', '/api/stats/'):
+            with self.subTest(url=url):
+                self.assertPlansClean(self.client, url)
+
+    def test_plan_problems_reads_both_vendors(self):
+        tables = ['BlogApp_blogpost']
+        self.assertEqual(plan_problems(['SCAN BlogApp_blogpost'], tables), ['full scan of BlogApp_blogpost'])
+        self.assertEqual(plan_problems(['SCAN BlogApp_blogpost USING INDEX blogapp_post_published_idx'], tables), [])
+        self.assertEqual(plan_problems(['USE TEMP B-TREE FOR ORDER BY'], tables), ['sort'])
+        self.assertEqual(plan_problems(['SCAN BlogApp_tag'], tables), [])
+        postgres = [
+            'Limit  (cost=0.15..1.20 rows=10 width=8)',
+            '  ->  Sort  (cost=1.10..1.12 rows=10 width=8)',
+            '        ->  Seq Scan on "BlogApp_blogpost"  (cost=0.00..1.05 rows=5 width=8)',
+        ]
+        self.assertEqual(plan_problems(postgres, tables, 'postgresql'), ['sort', 'full scan of BlogApp_blogpost'])
+
+
+class ReplicaRoutingTest(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Replicated', 'Body')
+
+    def route(self, method, path, cookies=None):
+        """The read alias a request is given, and its response"""
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        seen = {}
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            seen['alias'] = ReplicaRouter().db_for_read(BlogPost)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(request)
+        return seen['alias'], response
+
+    def test_read_only_views_read_from_the_replica(self):
+        with override_settings(DATABASE_READ_REPLICA='reader'):
+            for path in ('/', '/blog/', f'/blog/{self.post.slug}/', '/api/posts/',
+                         f'/api/posts/{self.post.slug}/', '/api/stats/'):
+                with self.subTest(path=path):
+                    self.assertEqual(self.route('get', path)[0], 'reader')
+            self.assertIsNone(self.route('get', '/dashboard/')[0])
+            self.assertIsNone(self.route('post', f'/blog/{self.post.slug}/')[0])
+        self.assertIsNone(self.route('get', '/blog/')[0])
+
+    def test_writers_are_pinned_to_the_primary(self):
+        with override_settings(DATABASE_READ_REPLICA='reader', DATABASE_REPLICA_PIN_SECONDS=7):
+            _, response = self.route('post', f'/api/posts/{self.post.slug}/like/')
+            self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 7)
+            self.assertNotIn(PIN_COOKIE, self.route('get', '/blog/')[1].cookies)
+            self.assertIsNone(self.route('get', '/blog/', {PIN_COOKIE: '1'})[0])
+
+    def test_database_cache_stays_on_the_primary(self):
+        cache_model = DatabaseCache('kishorelinblog_cache', {}).cache_model_class
+        router = ReplicaRouter()
+        state = _RequestState()
+        state.alias = 'reader'
+        token = _state.set(state)
+        try:
+            self.assertEqual(router.db_for_read(cache_model), 'default')
+            self.assertEqual(router.db_for_write(cache_model), 'default')
+            # Storing a cached page is not a write the rest of the request must see
+            self.assertEqual(router.db_for_read(BlogPost), 'reader')
+        finally:
+            _state.reset(token)
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        router = ReplicaRouter()
+        state = _RequestState()
+        state.alias = 'reader'
+        token = _state.set(state)
+        try:
+            with override_settings(DATABASE_READ_REPLICA='reader'):
+                self.assertEqual(router.db_for_read(BlogPost), 'reader')
+                self.assertEqual(router.db_for_write(BlogPost), 'default')
+                self.assertIsNone(router.db_for_read(BlogPost))
+        finally:
+            _state.reset(token)
+        self.assertIsNone(router.db_for_read(BlogPost))
@@ -0,0 +1,158 @@
+"""
+Time-series counts for the dashboard.
+
+Each series is one ``GROUP BY Trunc*`` query over a calendar-aligned range;
+buckets with no rows are filled with zeros in Python, so months are real
+calendar months rather than 30-day steps.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+METRICS = {
+    'posts': ('BlogPost', 'created_at'),
+    'comments': ('Comment', 'created_at'),
+    'likes': ('Like', 'created_at'),
+}
+
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Buckets shown when no explicit range is requested
+DEFAULT_SPAN = {'day': 30, 'week': 12, 'month': 6}
+
+MAX_BUCKETS = 1000
+
+LABEL_FORMATS = {'day': '%b %d', 'week': '%b %d', 'month': '%b %Y'}
+
+
+class TimeSeriesError(ValueError):
+    pass
+
+
+def bucket_start(value, bucket):
+    """Start of the bucket containing the aware datetime ``value``"""
+    value = timezone.localtime(value).replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'week':
+        value -= timedelta(days=value.weekday())
+    elif bucket == 'month':
+        value = value.replace(day=1)
+    return value
+
+
+def next_bucket(value, bucket):
+    if bucket == 'day':
+        return _local(value.date() + timedelta(days=1))
+    if bucket == 'week':
+        return _local(value.date() + timedelta(days=7))
+    if value.month == 12:
+        return _local(value.date().replace(year=value.year + 1, month=1))
+    return _local(value.date().replace(month=value.month + 1))
+
+
+def _local(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _previous_buckets(value, bucket, count):
+    """Start of the bucket ``count`` buckets before the one containing ``value``"""
+    start = bucket_start(value, bucket)
+    if bucket == 'day':
+        return _local(start.date() - timedelta(days=count))
+    if bucket == 'week':
+        return _local(start.date() - timedelta(weeks=count))
+    months = start.year * 12 + start.month - 1 - count
+    return _local(start.date().replace(year=months // 12, month=months % 12 + 1))
+
+
+def parse_range(start, end, bucket):
+    """
+    Turn optional ``YYYY-MM-DD`` strings into an aware [start, end) range.
+
+    ``end`` is inclusive of that whole day. Without ``start`` the range
+    covers the last DEFAULT_SPAN buckets up to and including ``end``.
+    """
+    if bucket not in BUCKETS:
+        raise TimeSeriesError(f"Unknown bucket '{bucket}', expected one of: {', '.join(BUCKETS)}")
+    if end:
+        end_date = parse_date(end)
+        if end_date is None:
+            raise TimeSeriesError("'to' must be a date in YYYY-MM-DD format")
+        end_dt = _local(end_date + timedelta(days=1))
+    else:
+        end_dt = timezone.now()
+
+    if start:
+        start_date = parse_date(start)
+        if start_date is None:
+            raise TimeSeriesError("'from' must be a date in YYYY-MM-DD format")
+        start_dt = bucket_start(_local(start_date), bucket)
+    else:
+        start_dt = _previous_buckets(end_dt - timedelta(microseconds=1), bucket, DEFAULT_SPAN[bucket] - 1)
+
+    if start_dt >= end_dt:
+        raise TimeSeriesError("'from' must be before 'to'")
+    return start_dt, end_dt
+
+
+def time_series(metric, bucket='month', start=None, end=None):
+    """
+    Count ``metric`` rows per ``bucket`` in [start, end).
+
+    Returns a list of ``{'bucket', 'label', 'count'}`` dicts in date order,
+    including empty buckets.
+    """
+    from django.apps import apps
+
+    if metric not in METRICS:
+        raise TimeSeriesError(f"Unknown metric '{metric}', expected one of: {', '.join(METRICS)}")
+    if bucket not in BUCKETS:
+        raise TimeSeriesError(f"Unknown bucket '{bucket}', expected one of: {', '.join(BUCKETS)}")
+    if start is None or end is None:
+        start, end = parse_range(None, None, bucket)
+
+    periods = []
+    current = bucket_start(start, bucket)
+    while current < end:
+        if len(periods) >= MAX_BUCKETS:
+            raise TimeSeriesError(f'Range too large: more than {MAX_BUCKETS} buckets')
+        periods.append(current)
+        current = next_bucket(current, bucket)
+
+    model_name, field = METRICS[metric]
+    model = apps.get_model('BlogApp', model_name)
+
+    rows = (
+        model.objects.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+        .annotate(period=BUCKETS[bucket](field))
+        .values('period')
+        .annotate(count=Count('pk'))
+        .order_by('period')
+    )
+    counts = {bucket_start(row['period'], bucket).date(): row['count'] for row in rows}
+
+    return [
+        {
+            'bucket': period.date().isoformat(),
+            'label': period.strftime(LABEL_FORMATS[bucket]),
+            'count': counts.get(period.date(), 0),
+        }
+        for period in periods
+    ]
+
+
+def monthly_post_stats(months=DEFAULT_SPAN['month']):
+    """Posts created per calendar month for the dashboard chart"""
+    end = timezone.now()
+    start = _previous_buckets(end, 'month', months - 1)
+    return [
+        {'month': point['label'], 'count': point['count']}
+        for point in time_series('posts', 'month', start, end)
+    ]
@@ -22,6 +22,7 @@ urlpatterns = [
     path('dashboard/edit/<int:id>/', views.post_edit, name='post_edit'),
     path('dashboard/delete/<int:id>/', views.post_delete, name='post_delete'),
     path('dashboard/saved/', views.saved_posts_list, name='saved_posts_list'),
+    path('dashboard/perf/', views.perf_dashboard, name='perf_dashboard'),
     
     # Comment management (staff only)
     path('comment/delete/<int:comment_id>/', views.delete_comment, name='delete_comment'),
@@ -2,18 +2,30 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.db.models import Q, Count, Sum
 from django.core.paginator import Paginator
 from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_http_methods
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from . import likes
 from .models import BlogPost, Comment, Like, SavedPost, ContactMessage, Category, Tag, AboutPage, ContactPage
 from .forms import BlogPostForm, CommentForm, ContactForm
+from .instrumentation import enabled as perf_enabled, perf_stats, reset_stats as reset_perf_stats
+from .jobs import enqueue
+from .page_cache import cache_anonymous_page
+from .related import related_posts as get_related_posts
+from .rendering import highlight_css
+from .pagination import InvalidCursor, paginate_keyset
+from .search import search_posts
+from .stats import get_site_stats
+from .tasks import stage_upload
+from .timeseries import monthly_post_stats
+from .view_counter import record_view
+from .visitors import ensure_visitor_id, get_visitor_id, should_count_view
 
 
 def is_author(user):
@@ -66,40 +78,51 @@ def user_logout(request):
 
 # Public Views
 
+# Also used by static_export to tell which pages show a post
+HOME_FEATURED_POSTS = 3
+HOME_LATEST_POSTS = 6
+BLOG_LIST_PAGE_SIZE = 9
+# Comments rendered with the post; the rest load from /api/posts/<slug>/comments/
+COMMENTS_PAGE_SIZE = 20
+
+
+@cache_anonymous_page(lambda request: ['home'])
 def home(request):
     """Homepage with featured and latest posts"""
-    featured_posts = BlogPost.objects.filter(is_published=True, is_featured=True)[:3]
+    featured_posts = BlogPost.objects.filter(is_published=True, is_featured=True).select_related(
+        'category'
+    ).defer('content')[:HOME_FEATURED_POSTS]
     # Get featured post IDs for exclusion
     featured_ids = list(featured_posts.values_list('id', flat=True))
-    latest_posts = BlogPost.objects.filter(is_published=True).exclude(id__in=featured_ids)[:6]
+    latest_posts = BlogPost.objects.filter(is_published=True).exclude(id__in=featured_ids).select_related(
+        'category'
+    ).defer('content')[:HOME_LATEST_POSTS]
     
     # Get stats for hero section
-    total_posts = BlogPost.objects.filter(is_published=True).count()
-    total_views = BlogPost.objects.filter(is_published=True).aggregate(Sum('view_count'))['view_count__sum'] or 0
-    total_likes = Like.objects.count()
+    site_stats = get_site_stats()
     
     context = {
         'featured_posts': featured_posts,
         'latest_posts': latest_posts,
-        'total_posts': total_posts,
-        'total_views': total_views,
-        'total_likes': total_likes,
+        'total_posts': site_stats['published_posts'],
+        'total_views': site_stats['total_views'],
+        'total_likes': site_stats['total_likes'],
     }
     return render(request, 'home.html', context)
 
 
+@cache_anonymous_page(lambda request: ['list'])
 def blog_list(request):
     """Blog listing with search and filters"""
-    posts = BlogPost.objects.filter(is_published=True).select_related('author', 'category').prefetch_related('tags')
+    # Cards show the stored excerpt, so the body is never loaded
+    posts = BlogPost.objects.filter(is_published=True).select_related(
+        'author', 'category'
+    ).prefetch_related('tags').defer('content')
     
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        posts = posts.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(tags__name__icontains=search_query)
-        ).distinct()
+        posts = search_posts(posts, search_query)
     
     # Filter by category
     category_slug = request.GET.get('category', '')
@@ -122,17 +145,25 @@ def blog_list(request):
         month_ago = timezone.now() - timedelta(days=30)
         posts = posts.filter(created_at__gte=month_ago)
     
-    # Pagination
-    paginator = Paginator(posts, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (?cursor= switches to keyset pagination: no COUNT, no OFFSET)
+    cursor_mode = 'cursor' in request.GET
+    if cursor_mode:
+        try:
+            page_obj = paginate_keyset(posts, request.GET.get('cursor'), BLOG_LIST_PAGE_SIZE)
+        except InvalidCursor:
+            page_obj = paginate_keyset(posts, None, BLOG_LIST_PAGE_SIZE)
+    else:
+        paginator = Paginator(posts, BLOG_LIST_PAGE_SIZE)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
-    # Get categories and tags for sidebar
-    categories = Category.objects.annotate(post_count=Count('posts')).filter(post_count__gt=0)
-    popular_tags = Tag.objects.annotate(post_count=Count('posts')).filter(post_count__gt=0).order_by('-post_count')[:10]
+    # Get categories and tags for sidebar (stored published-post counts, see counters.py)
+    categories = Category.objects.filter(post_count__gt=0)
+    popular_tags = Tag.objects.filter(post_count__gt=0).order_by('-post_count')[:10]
     
     context = {
         'page_obj': page_obj,
+        'cursor_mode': cursor_mode,
         'categories': categories,
         'popular_tags': popular_tags,
         'search_query': search_query,
@@ -143,36 +174,54 @@ def blog_list(request):
     return render(request, 'blog_list.html', context)
 
 
+def _count_cached_view(request, meta):
+    # Cache hits never reach blog_detail, so count the view here
+    if should_count_view(request, meta['post_id']):
+        record_view(meta['post_id'])
+
+
+def _liked_variant(request, slug):
+    # Visitors who liked the post see "Liked", so they get their own cached copy
+    visitor_id = get_visitor_id(request)
+    if visitor_id and Like.objects.filter(post__slug=slug, session_id=visitor_id).exists():
+        return 'liked'
+    return ''
+
+
+@cache_anonymous_page(lambda request, slug: [f'post:{slug}'], on_hit=_count_cached_view, variant=_liked_variant)
 def blog_detail(request, slug):
     """Blog post detail page"""
     post = get_object_or_404(BlogPost, slug=slug, is_published=True)
+
+    # Rows written without save() (bulk imports, raw updates) are rendered on first view
+    if post.render_content():
+        BlogPost.objects.filter(pk=post.pk).update(
+            content_html=post.content_html, content_hash=post.content_hash, updated_at=timezone.now(),
+        )
     
-    # Increment view count (only for non-author visitors)
-    if not (request.user.is_authenticated and request.user.is_staff):
+    # Increment view count (only for non-author visitors, once per visitor per window)
+    if not (request.user.is_authenticated and request.user.is_staff) and should_count_view(request, post.pk):
         post.increment_views()
     
-    # Get related posts
-    related_posts = BlogPost.objects.filter(
-        is_published=True
-    ).exclude(id=post.id).filter(
-        Q(category=post.category) | Q(tags__in=post.tags.all())
-    ).distinct()[:3]
+    # Get related posts (precomputed, see related.py)
+    related_posts = get_related_posts(post)
     
-    # Check if user liked this post
+    # Check if this visitor liked this post
     user_liked = False
-    if request.session.session_key:
-        user_liked = Like.objects.filter(post=post, session_id=request.session.session_key).exists()
+    visitor_id = get_visitor_id(request)
+    if visitor_id:
+        user_liked = Like.objects.filter(post=post, session_id=visitor_id).exists()
     
     # Check if user saved this post
     user_saved = False
     if request.user.is_authenticated:
         user_saved = SavedPost.objects.filter(user=request.user, post=post).exists()
     
-    # Get comments (staff can see all, others only approved)
-    if request.user.is_authenticated and request.user.is_staff:
-        comments = Comment.objects.filter(post=post).order_by('-created_at')
-    else:
-        comments = Comment.objects.filter(post=post, is_approved=True).order_by('-created_at')
+    # Newest comments first (staff can see all, others only approved); the rest load on demand
+    comments = Comment.objects.filter(post=post)
+    if not (request.user.is_authenticated and request.user.is_staff):
+        comments = comments.filter(is_approved=True)
+    comments = paginate_keyset(comments, page_size=COMMENTS_PAGE_SIZE)
     
     # Comment form
     if request.method == 'POST':
@@ -188,6 +237,7 @@ def blog_detail(request, slug):
     
     context = {
         'post': post,
+        'highlight_css': highlight_css(),
         'related_posts': related_posts,
         'comments': comments,
         'comment_form': comment_form,
@@ -195,29 +245,29 @@ def blog_detail(request, slug):
         'user_saved': user_saved,
         'like_count': post.get_like_count(),
     }
-    return render(request, 'blog_detail.html', context)
+    response = render(request, 'blog_detail.html', context)
+    response.page_cache_meta = {'post_id': post.pk}
+    return response
 
 
-@require_POST
+@require_http_methods(['POST', 'PUT', 'DELETE'])
 def like_post(request, slug):
-    """Like/unlike a post using session ID"""
-    post = get_object_or_404(BlogPost, slug=slug, is_published=True)
+    """Like (PUT), unlike (DELETE) or toggle (POST) a post using the visitor ID"""
+    post = get_object_or_404(BlogPost.objects.only('pk'), slug=slug, is_published=True)
     
-    if not request.session.session_key:
-        request.session.create()
-    
-    session_id = request.session.session_key
-    like, created = Like.objects.get_or_create(post=post, session_id=session_id)
-    
-    if not created:
-        like.delete()
+    visitor_id = ensure_visitor_id(request)
+    if request.method == 'PUT':
+        _, like_count = likes.like(post.pk, visitor_id)
+        liked = True
+    elif request.method == 'DELETE':
+        _, like_count = likes.unlike(post.pk, visitor_id)
         liked = False
     else:
-        liked = True
+        liked, like_count = likes.toggle(post.pk, visitor_id)
     
     return JsonResponse({
         'liked': liked,
-        'like_count': post.get_like_count()
+        'like_count': like_count
     })
 
 
@@ -255,15 +305,14 @@ def delete_comment(request, comment_id):
     return redirect('blog_detail', slug=post_slug)
 
 
+@cache_anonymous_page(lambda request: ['about'])
 def about(request):
     """About/Portfolio page"""
     # Get About page content from database
     about_page = AboutPage.get_instance()
     
     # Get some stats for the about page
-    total_posts = BlogPost.objects.filter(is_published=True).count()
-    total_views = BlogPost.objects.filter(is_published=True).aggregate(Sum('view_count'))['view_count__sum'] or 0
-    total_likes = Like.objects.count()
+    site_stats = get_site_stats()
     
     # Parse topics from text field (one per line)
     topics_list = []
@@ -281,9 +330,9 @@ def about(request):
     
     context = {
         'about_page': about_page,
-        'total_posts': total_posts,
-        'total_views': total_views,
-        'total_likes': total_likes,
+        'total_posts': site_stats['published_posts'],
+        'total_views': site_stats['total_views'],
+        'total_likes': site_stats['total_likes'],
         'topics_list': topics_list,
     }
     return render(request, 'about.html', context)
@@ -299,18 +348,9 @@ def contact(request):
         if form.is_valid():
             contact_message = form.save()
             
-            # Send email notification (if configured)
+            # Send email notification (if configured) from the background worker
             if hasattr(settings, 'CONTACT_EMAIL'):
-                try:
-                    send_mail(
-                        f'New Contact Form: {contact_message.subject}',
-                        f'From: {contact_message.name} ({contact_message.email})\n\n{contact_message.message}',
-                        settings.DEFAULT_FROM_EMAIL,
-                        [settings.CONTACT_EMAIL],
-                        fail_silently=True,
-                    )
-                except Exception:
-                    pass
+                enqueue('send_contact_email', {'message_id': contact_message.pk}, priority=5)
             
             messages.success(request, 'Thank you for your message! I will get back to you soon.')
             return redirect('contact')
@@ -331,12 +371,7 @@ def contact(request):
 def dashboard(request):
     """Admin dashboard with analytics"""
     # Get statistics
-    total_posts = BlogPost.objects.count()
-    published_posts = BlogPost.objects.filter(is_published=True).count()
-    draft_posts = BlogPost.objects.filter(is_published=False).count()
-    total_views = BlogPost.objects.filter(is_published=True).aggregate(Sum('view_count'))['view_count__sum'] or 0
-    total_likes = Like.objects.count()
-    total_comments = Comment.objects.count()
+    site_stats = get_site_stats()
     
     # Recent posts
     recent_posts = BlogPost.objects.all().order_by('-created_at')[:5]
@@ -344,39 +379,23 @@ def dashboard(request):
     # Popular posts
     popular_posts = BlogPost.objects.filter(is_published=True).order_by('-view_count')[:5]
     
-    # Monthly stats for chart
-    now = timezone.now()
-    monthly_stats = []
-    for i in range(6):  # Last 6 months
-        month_start = now.replace(day=1) - timedelta(days=30 * i)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        month_posts = BlogPost.objects.filter(
-            created_at__gte=month_start,
-            created_at__lte=month_end
-        ).count()
-        
-        monthly_stats.append({
-            'month': month_start.strftime('%b %Y'),
-            'count': month_posts
-        })
-    
-    monthly_stats.reverse()
+    # Monthly stats for chart (last 6 calendar months, one query)
+    monthly_stats = monthly_post_stats()
     
     # Posts by status
     posts_by_status = {
-        'published': published_posts,
-        'drafts': draft_posts,
-        'featured': BlogPost.objects.filter(is_featured=True).count(),
+        'published': site_stats['published_posts'],
+        'drafts': site_stats['draft_posts'],
+        'featured': site_stats['featured_posts'],
     }
     
     context = {
-        'total_posts': total_posts,
-        'published_posts': published_posts,
-        'draft_posts': draft_posts,
-        'total_views': total_views,
-        'total_likes': total_likes,
-        'total_comments': total_comments,
+        'total_posts': site_stats['total_posts'],
+        'published_posts': site_stats['published_posts'],
+        'draft_posts': site_stats['draft_posts'],
+        'total_views': site_stats['total_views'],
+        'total_likes': site_stats['total_likes'],
+        'total_comments': site_stats['total_comments'],
         'recent_posts': recent_posts,
         'popular_posts': popular_posts,
         'monthly_stats': monthly_stats,
@@ -394,8 +413,15 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
-            form.save_m2m()  # Save many-to-many relationships (tags)
+            # The cover image is stored by the background worker, not in this request
+            upload = request.FILES.get('cover_image')
+            post.cover_image = None
+            # One transaction, so related posts are scored once for the post and its tags
+            with transaction.atomic():
+                post.save()
+                form.save_m2m()  # Save many-to-many relationships (tags)
+            if upload:
+                stage_upload(post, 'cover_image', upload)
             messages.success(request, f'Post "{post.title}" created successfully!')
             return redirect('post_edit', id=post.id)
         else:
@@ -424,11 +450,14 @@ def post_edit(request, id):
         form = BlogPostForm(request.POST, request.FILES, instance=post)
         if form.is_valid():
             post = form.save(commit=False)
-            # If no new image uploaded, keep the existing one
-            if not request.FILES.get('cover_image'):
-                post.cover_image = BlogPost.objects.get(id=id).cover_image
-            post.save()
-            form.save_m2m()
+            # Keep the existing image; a new upload is stored by the background worker
+            upload = request.FILES.get('cover_image')
+            post.cover_image = BlogPost.objects.get(id=id).cover_image
+            with transaction.atomic():
+                post.save()
+                form.save_m2m()
+            if upload:
+                stage_upload(post, 'cover_image', upload)
             messages.success(request, f'Post "{post.title}" updated successfully!')
             return redirect('post_edit', id=post.id)
         else:
@@ -477,7 +506,7 @@ def post_list_admin(request):
     
     search_query = request.GET.get('search', '')
     if search_query:
-        posts = posts.filter(Q(title__icontains=search_query) | Q(content__icontains=search_query))
+        posts = search_posts(posts, search_query)
     
     # Pagination
     paginator = Paginator(posts, 15)
@@ -495,7 +524,9 @@ def post_list_admin(request):
 @login_required
 def saved_posts_list(request):
     """List user's saved posts"""
-    saved_posts = SavedPost.objects.filter(user=request.user).order_by('-saved_at')
+    saved_posts = SavedPost.objects.filter(user=request.user).select_related(
+        'post'
+    ).defer('post__content').order_by('-saved_at')
     
     paginator = Paginator(saved_posts, 10)
     page_number = request.GET.get('page')
@@ -503,3 +534,23 @@ def saved_posts_list(request):
     
     return render(request, 'dashboard/saved_posts.html', {'page_obj': page_obj})
 
+
+@login_required
+@user_passes_test(is_author)
+def perf_dashboard(request):
+    """Request timings, query counts and N+1 suspects per endpoint for this process"""
+    if request.method == 'POST':
+        reset_perf_stats()
+        messages.success(request, 'Performance statistics reset.')
+        return redirect('perf_dashboard')
+
+    rows = perf_stats()
+    context = {
+        'rows': rows,
+        'enabled': perf_enabled(),
+        'has_problems': any(row['problems'] for row in rows),
+        'slow_request_ms': getattr(settings, 'PERF_SLOW_REQUEST_MS', 500),
+        'nplusone_threshold': getattr(settings, 'PERF_NPLUSONE_THRESHOLD', 5),
+    }
+    return render(request, 'dashboard/perf.html', context)
+
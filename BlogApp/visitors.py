@@ -0,0 +1,97 @@
+"""
+Anonymous visitor identity without the session store.
+
+Likes used to call ``request.session.create()``, writing a
+``django_session`` row per liker that then had to be loaded on every
+request just to tell whether the visitor had liked a post. Instead an
+anonymous visitor gets a random id in a signed cookie the first time they
+engage (like a post). The id is what ``Like.session_id`` stores and what
+view de-duplication keys on; reading it is a signature check, not a query.
+
+Visitors who liked posts before this existed still carry their old session
+cookie, whose value is the session key their likes were stored under. It
+is adopted as their visitor id once, so those likes keep working.
+"""
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+SALT = 'blog.visitor'
+
+_ID_RE = re.compile(r'^[a-z0-9]{32}$')
+
+
+def _cookie_name():
+    return getattr(settings, 'VISITOR_COOKIE_NAME', 'blog_visitor')
+
+
+def _django_request(request):
+    # DRF's Request proxies attribute reads, not writes, to the HttpRequest
+    return getattr(request, '_request', request)
+
+
+def get_visitor_id(request):
+    """The visitor id carried by the request, or None"""
+    request = _django_request(request)
+    if hasattr(request, '_visitor_id'):
+        return request._visitor_id
+    visitor_id = request.get_signed_cookie(_cookie_name(), default=None, salt=SALT)
+    if visitor_id is None or not _ID_RE.match(visitor_id):
+        visitor_id = None
+        legacy = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+        if _ID_RE.match(legacy):
+            visitor_id = legacy
+            request._new_visitor_id = True
+    request._visitor_id = visitor_id
+    return visitor_id
+
+
+def ensure_visitor_id(request):
+    """The visitor id, creating one (set as a cookie on the response) if needed"""
+    request = _django_request(request)
+    visitor_id = get_visitor_id(request)
+    if visitor_id is None:
+        visitor_id = uuid.uuid4().hex
+        request._visitor_id = visitor_id
+        request._new_visitor_id = True
+    return visitor_id
+
+
+def should_count_view(request, post_id):
+    """
+    False if this visitor's view of the post was already counted recently.
+
+    Visitors without an id are always counted; pages rendered by
+    ``static_export`` are not visits.
+    """
+    if getattr(request, 'is_static_export', False):
+        return False
+    visitor_id = get_visitor_id(request)
+    if visitor_id is None:
+        return True
+    window = getattr(settings, 'VIEW_DEDUP_WINDOW', 1800)
+    return cache.add(f'viewed:{post_id}:{visitor_id}', True, window)
+
+
+class VisitorMiddleware:
+    """Set the signed visitor cookie on responses that created or adopted an id"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(request, '_new_visitor_id', False) and request._visitor_id:
+            response.set_signed_cookie(
+                _cookie_name(),
+                request._visitor_id,
+                salt=SALT,
+                max_age=getattr(settings, 'VISITOR_COOKIE_AGE', 60 * 60 * 24 * 365 * 2),
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
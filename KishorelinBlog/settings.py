@@ -63,11 +63,15 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise for static files (add before other middleware)
+    'BlogApp.instrumentation.PerfMiddleware',  # Query/template timing, N+1 detection and Server-Timing
+    'BlogApp.compression.CompressionMiddleware',  # gzip/brotli for HTML and JSON (static files are precompressed by WhiteNoise)
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware (should be early)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'BlogApp.db_routing.ReplicaRoutingMiddleware',  # Read-only views read from the replica; writers are pinned to the primary
+    'BlogApp.visitors.VisitorMiddleware',  # Signed visitor-id cookie for anonymous likes and view de-duplication
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -150,6 +154,22 @@ else:
         }
     }
 
+# Read replica (see BlogApp/db_routing.py): read-only public views read from it when set
+REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+DATABASE_READ_REPLICA = None
+if REPLICA_DATABASE_URL and dj_database_url:
+    DATABASE_READ_REPLICA = 'replica'
+    DATABASES[DATABASE_READ_REPLICA] = dj_database_url.parse(
+        REPLICA_DATABASE_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    # Tests read "replica" rows through the primary's connection
+    DATABASES[DATABASE_READ_REPLICA]['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['BlogApp.db_routing.ReplicaRouter']
+# Seconds a client reads from the primary after it writes, to cover replication lag
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -236,6 +256,79 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'noreply@kishorelinblog.com'
 # CONTACT_EMAIL = 'your-email@example.com'  # Uncomment and set for production
 
+# Post view counts are buffered per worker and written in batches
+# (see BlogApp/view_counter.py). Spill after this many seconds or views; the
+# job worker folds spilled views into the posts as often.
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', '10'))
+VIEW_COUNT_FLUSH_THRESHOLD = int(os.environ.get('VIEW_COUNT_FLUSH_THRESHOLD', '100'))
+
+# Site statistics (home, about, dashboards, /api/stats/) are cached for this
+# many seconds; post/like/comment changes invalidate them immediately.
+SITE_STATS_CACHE_TTL = int(os.environ.get('SITE_STATS_CACHE_TTL', '60'))
+
+# Cache used for site stats and the anonymous page cache. Page cache
+# invalidation is stored in the cache itself, so every worker process must
+# share it: outside DEBUG the default is the database cache (its table is
+# created by `manage.py createcachetable` in start.sh). The per-process
+# LocMemCache is only the default for the single-process dev server.
+if DEBUG:
+    _DEFAULT_CACHE = ('django.core.cache.backends.locmem.LocMemCache', 'kishorelinblog')
+else:
+    _DEFAULT_CACHE = ('django.core.cache.backends.db.DatabaseCache', 'kishorelinblog_cache')
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', _DEFAULT_CACHE[0]),
+        'LOCATION': os.environ.get('CACHE_LOCATION', _DEFAULT_CACHE[1]),
+    }
+}
+
+# Anonymous full-page cache lifetime in seconds (see BlogApp/page_cache.py)
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', '300'))
+
+# Pygments style used for server-side code highlighting in post bodies
+PYGMENTS_STYLE = os.environ.get('PYGMENTS_STYLE', 'monokai')
+
+# Response compression (see BlogApp/compression.py); brotli is used when installed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '500'))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Responsive image derivatives built by `manage.py build_image_derivatives` (see BlogApp/images.py)
+IMAGE_DERIVATIVE_FORMATS = tuple(os.environ.get('IMAGE_DERIVATIVE_FORMATS', 'avif,webp').split(','))
+IMAGE_DERIVATIVE_QUALITY = int(os.environ.get('IMAGE_DERIVATIVE_QUALITY', '80'))
+
+# Anonymous visitor id (signed cookie; see BlogApp/visitors.py)
+VISITOR_COOKIE_NAME = os.environ.get('VISITOR_COOKIE_NAME', 'blog_visitor')
+VISITOR_COOKIE_AGE = int(os.environ.get('VISITOR_COOKIE_AGE', 60 * 60 * 24 * 365 * 2))
+# Seconds during which repeat views of a post by the same visitor are not counted
+VIEW_DEDUP_WINDOW = int(os.environ.get('VIEW_DEDUP_WINDOW', 1800))
+
+# Background jobs (see BlogApp/jobs.py), run by `manage.py run_worker`
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+# Retry delay in seconds, doubled after each failure up to the maximum
+JOB_RETRY_BACKOFF = int(os.environ.get('JOB_RETRY_BACKOFF', '30'))
+JOB_RETRY_BACKOFF_MAX = int(os.environ.get('JOB_RETRY_BACKOFF_MAX', '21600'))
+# Seconds before a job held by a worker that died is handed out again
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '600'))
+JOB_POLL_INTERVAL = int(os.environ.get('JOB_POLL_INTERVAL', '2'))
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
+# Uploads wait here (on the same box as the worker) until they are stored
+JOB_STAGING_DIR = os.environ.get('JOB_STAGING_DIR', str(BASE_DIR / 'job_staging'))
+
+# Output of `manage.py export_static` (see BlogApp/static_export.py)
+STATIC_EXPORT_DIR = os.environ.get('STATIC_EXPORT_DIR', str(BASE_DIR / 'static_export'))
+
+# Per-request instrumentation (see BlogApp/instrumentation.py and /dashboard/perf/).
+# It wraps every query and template render, so it is off unless DEBUG or enabled here
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', str(DEBUG)) == 'True'
+# Who gets the Server-Timing header: 'staff' (and everyone when DEBUG), 'all' or 'off'
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'staff')
+# Requests slower than this, or running more queries, are logged on BlogApp.perf
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', '500'))
+PERF_SLOW_REQUEST_QUERIES = int(os.environ.get('PERF_SLOW_REQUEST_QUERIES', '50'))
+# One query shape run this many times in a request is an N+1 suspect
+PERF_NPLUSONE_THRESHOLD = int(os.environ.get('PERF_NPLUSONE_THRESHOLD', '5'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -36,6 +36,10 @@ echo ""
 echo "Running database migrations..."
 python manage.py migrate --noinput
 
+echo ""
+echo "Creating cache table (if needed)..."
+python manage.py createcachetable
+
 echo ""
 echo "Creating superuser (if needed)..."
 python create_superuser.py || true
@@ -44,6 +48,20 @@ echo ""
 echo "Collecting static files..."
 python manage.py collectstatic --noinput || true
 
+# The job worker (mail, uploads, image derivatives, view-count folding) is
+# started here, next to gunicorn, and nowhere else: the Procfile runs this
+# script too instead of declaring a worker process. It is restarted if it
+# exits, and logs to the same output as gunicorn.
+echo ""
+echo "Starting background job worker..."
+(
+    while true; do
+        python manage.py run_worker || echo "⚠️  Job worker exited with status $?"
+        echo "Restarting job worker in 5 seconds..."
+        sleep 5
+    done
+) &
+
 echo ""
 echo "========================================="
 echo "Starting Gunicorn server..."